@@ -0,0 +1,752 @@
+#!/usr/bin/env -S uv run --script
+# /// script
+# requires-python = ">=3.11"
+# dependencies = ["numpy"]
+# ///
+"""Benchmarks for openwo.py hot paths.
+
+Usage: bench_openwo.py [NAME ...] [--scale S ...] [--json FILE]
+       bench_openwo.py --generate FILE [--scale S]
+
+With no NAME every benchmark runs. --json writes the recorded results
+(currently the ``cli`` suite) for regression tracking.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Callable, Iterator
+from unittest import mock
+
+import openwo
+
+BENCHMARKS: dict[str, Callable[[], None]] = {}
+RESULTS: list[dict] = []
+
+WORDS = [
+    "alternating", "band", "barbell", "bench", "bent-over", "bridge", "cable",
+    "close-grip", "crunch", "curl", "deadlift", "decline", "dumbbell",
+    "extension", "fly", "front", "hammer", "incline", "kettlebell", "lateral",
+    "lunge", "plank", "press", "pull", "push", "raise", "reverse", "row",
+    "seated", "shrug", "single-arm", "squat", "standing", "twist", "wide-grip",
+]
+
+
+def benchmark(fn: Callable[[], None]) -> Callable[[], None]:
+    BENCHMARKS[fn.__name__] = fn
+    return fn
+
+
+def best_of(
+    fn: Callable[[], object], repeat: int = 3, setup: Callable[[], object] | None = None,
+) -> float:
+    """Best wall-clock time of ``repeat`` calls, in seconds; ``setup`` runs untimed before each."""
+    best = float("inf")
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def record(suite: str, case: str, seconds: float, **extra: object) -> None:
+    """Keep one timing for --json output."""
+    RESULTS.append({"suite": suite, "case": case, "ms": round(seconds * 1e3, 3), **extra})
+
+
+def fake_names(n: int, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    return [
+        " ".join(rng.choice(WORDS).title() for _ in range(rng.randint(2, 4))) + f" {i}"
+        for i in range(n)
+    ]
+
+
+def workout_db(n: int) -> sqlite3.Connection:
+    """In-memory DB with one workout of ``n`` active exercises."""
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    conn.executescript("""
+        CREATE TABLE workoutExercise (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            workoutId INTEGER NOT NULL,
+            exerciseId INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            isActive BOOLEAN NOT NULL DEFAULT 1,
+            UNIQUE(workoutId, position)
+        );
+    """)
+    conn.executemany(
+        "INSERT INTO workoutExercise (workoutId, exerciseId, position) VALUES (1, ?, ?)",
+        ((i, i) for i in range(1, n + 1)),
+    )
+    conn.commit()
+    return conn
+
+
+SCHEMA = """
+    CREATE TABLE exercise (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        description TEXT NOT NULL DEFAULT '',
+        instructions TEXT NOT NULL DEFAULT '',
+        tip TEXT NOT NULL DEFAULT '',
+        externalId TEXT,
+        hasWeight BOOLEAN NOT NULL DEFAULT 0,
+        counterUnit TEXT NOT NULL DEFAULT 'reps',
+        defaultValue INTEGER NOT NULL DEFAULT 10,
+        isDailyChallenge BOOLEAN NOT NULL DEFAULT 0,
+        level TEXT, category TEXT, force TEXT, mechanic TEXT, equipment TEXT,
+        primaryMuscles TEXT, secondaryMuscles TEXT
+    );
+    CREATE TABLE workout (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        description TEXT NOT NULL DEFAULT ''
+    );
+    CREATE TABLE workoutExercise (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        workoutId INTEGER NOT NULL REFERENCES workout(id) ON DELETE CASCADE,
+        exerciseId INTEGER NOT NULL REFERENCES exercise(id) ON DELETE CASCADE,
+        position INTEGER NOT NULL,
+        counterUnit TEXT NOT NULL DEFAULT 'reps',
+        counterValue INTEGER,
+        counterLabel TEXT,
+        restSeconds INTEGER NOT NULL DEFAULT 30,
+        sets INTEGER NOT NULL DEFAULT 1,
+        isDailyChallenge BOOLEAN NOT NULL DEFAULT 0,
+        hasWeight BOOLEAN NOT NULL DEFAULT 0,
+        isActive BOOLEAN NOT NULL DEFAULT 1,
+        UNIQUE(workoutId, position)
+    );
+    CREATE TABLE session (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        sessionType TEXT NOT NULL,
+        date TEXT NOT NULL,
+        startedAt TEXT NOT NULL,
+        durationSeconds INTEGER NOT NULL,
+        isPartial BOOLEAN NOT NULL DEFAULT 0,
+        feedback TEXT
+    );
+    CREATE TABLE dailyChallenge (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        date TEXT NOT NULL UNIQUE,
+        setsCompleted INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE TABLE exerciseLog (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        sessionId INTEGER NOT NULL REFERENCES session(id) ON DELETE CASCADE,
+        workoutExerciseId INTEGER NOT NULL REFERENCES workoutExercise(id) ON DELETE CASCADE,
+        weight REAL,
+        failed INTEGER NOT NULL DEFAULT 0,
+        achievedValue INTEGER,
+        UNIQUE(sessionId, workoutExerciseId)
+    );
+"""
+
+
+def history_db(path: Path, logs: int, per_session: int = 10, seed: int = 0) -> sqlite3.Connection:
+    """File DB with 3 workouts of ``per_session`` exercises and ``logs`` log rows."""
+    rng = random.Random(seed)
+    conn = sqlite3.connect(str(path))
+    conn.row_factory = sqlite3.Row
+    conn.executescript(SCHEMA)
+    n_ex = 3 * per_session
+    conn.executemany(
+        "INSERT INTO exercise (id, name, hasWeight) VALUES (?, ?, 1)",
+        ((i, f"Exercise {i}") for i in range(1, n_ex + 1)),
+    )
+    conn.executemany("INSERT INTO workout (id, name) VALUES (?, ?)", [(1, "A"), (2, "B"), (3, "C")])
+    conn.executemany(
+        "INSERT INTO workoutExercise (id, workoutId, exerciseId, position, hasWeight) VALUES (?, ?, ?, ?, 1)",
+        ((i, (i - 1) // per_session + 1, i, (i - 1) % per_session + 1) for i in range(1, n_ex + 1)),
+    )
+    start = date(2015, 1, 1)
+    sessions = logs // per_session
+    conn.executemany(
+        "INSERT INTO session (id, sessionType, date, startedAt, durationSeconds, isPartial) VALUES (?, ?, ?, ?, 3000, ?)",
+        (
+            (i, "dayABC"[i % 3 * 2:i % 3 * 2 + 2], d, d + "T07:00:00", int(rng.random() < 0.05))
+            for i in range(1, sessions + 1)
+            for d in [(start + timedelta(days=i * 2 // 3)).isoformat()]
+        ),
+    )
+    conn.executemany(
+        "INSERT INTO exerciseLog (sessionId, workoutExerciseId, weight) VALUES (?, ?, ?)",
+        (
+            (i, (i % 3) * per_session + j, 20 + (i // 50) + rng.random() * 5)
+            for i in range(1, sessions + 1)
+            for j in range(1, per_session + 1)
+        ),
+    )
+    conn.commit()
+    return conn
+
+
+# ── Synthetic Databases ───────────────────────────────────────────────
+
+EQUIPMENT = ["barbell", "dumbbell", "cable", "machine", "kettlebells", "bands", "body only"]
+MUSCLES = [
+    "abdominals", "biceps", "calves", "chest", "forearms", "glutes", "hamstrings",
+    "lats", "lower back", "middle back", "quadriceps", "shoulders", "traps", "triceps",
+]
+LEVELS = ["beginner", "intermediate", "expert"]
+
+# Rows generated per scale. ``history`` is the number of inactive
+# workoutExercise rows per workout left behind by earlier swaps/removes.
+SCALES: dict[str, dict[str, int]] = {
+    "small": dict(exercises=200, workouts=5, per_workout=8, history=4, sessions=2_000),
+    "medium": dict(exercises=2_000, workouts=20, per_workout=10, history=20, sessions=20_000),
+    "large": dict(exercises=20_000, workouts=100, per_workout=12, history=100, sessions=100_000),
+}
+
+
+def catalog_entries(n: int, seed: int = 0, start: int = 1) -> list[dict]:
+    """``n`` free-exercise-db style entries with unique names."""
+    rng = random.Random(seed)
+    return [
+        {
+            "id": f"synthetic_{i}",
+            "name": name,
+            "tip": f"Keep the {rng.choice(MUSCLES)} tight.",
+            "hasWeight": rng.random() < 0.6,
+            "level": rng.choice(LEVELS),
+            "category": "strength",
+            "force": rng.choice(["push", "pull", "static"]),
+            "mechanic": rng.choice(["compound", "isolation"]),
+            "equipment": rng.choice(EQUIPMENT),
+            "primaryMuscles": rng.sample(MUSCLES, 1),
+            "secondaryMuscles": rng.sample(MUSCLES, rng.randint(0, 2)),
+        }
+        for i, name in enumerate(fake_names(n, seed), start)
+    ]
+
+
+def generate_db(
+    path: Path,
+    exercises: int,
+    workouts: int,
+    per_workout: int,
+    history: int,
+    sessions: int,
+    seed: int = 0,
+) -> None:
+    """Write a schema-v6 app database to ``path``; same arguments, same bytes of data.
+
+    Each workout has ``per_workout`` active rows and ``history`` inactive
+    ones. Sessions cycle through the workouts every other day; the older
+    half log the inactive rows in place of the first active ones, the way
+    history looks after swaps. About two days in three have a challenge.
+    """
+    rng = random.Random(seed)
+    conn = sqlite3.connect(str(path))
+    conn.executescript(SCHEMA)
+    conn.executemany(
+        """INSERT INTO exercise (id, name, tip, externalId, hasWeight, level, category,
+               force, mechanic, equipment, primaryMuscles, secondaryMuscles, instructions)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+        (
+            (i, e["name"], e["tip"], e["id"], int(e["hasWeight"]), e["level"], e["category"],
+             e["force"], e["mechanic"], e["equipment"], json.dumps(e["primaryMuscles"]),
+             json.dumps(e["secondaryMuscles"]), f"Step one of {e['name']}. Step two.")
+            for i, e in enumerate(catalog_entries(exercises, seed), 1)
+        ),
+    )
+    conn.executemany(
+        "INSERT INTO workout (id, name) VALUES (?, ?)",
+        ((w, f"Workout {w}") for w in range(1, workouts + 1)),
+    )
+    active: dict[int, list[int]] = {}
+    inactive: dict[int, list[int]] = {}
+    rows = []
+    we_id = 0
+    for w in range(1, workouts + 1):
+        for kind, count in ((inactive, history), (active, per_workout)):
+            ids = kind.setdefault(w, [])
+            for pos in range(1, count + 1):
+                we_id += 1
+                ids.append(we_id)
+                is_active = kind is active
+                rows.append((
+                    we_id, w, rng.randint(1, exercises), pos if is_active else -we_id,
+                    rng.choice((8, 10, 12)), rng.choice((2, 3, 4)), int(is_active),
+                ))
+    conn.executemany(
+        """INSERT INTO workoutExercise (id, workoutId, exerciseId, position, counterValue,
+               sets, isActive, hasWeight) VALUES (?, ?, ?, ?, ?, ?, ?, 1)""",
+        rows,
+    )
+    start = date(2010, 1, 1)
+    conn.executemany(
+        "INSERT INTO session (id, sessionType, date, startedAt, durationSeconds, isPartial) VALUES (?, ?, ?, ?, ?, ?)",
+        (
+            (i, f"workout{(i - 1) % workouts + 1}", d, d + "T07:00:00",
+             rng.randint(1800, 4200), int(rng.random() < 0.05))
+            for i in range(1, sessions + 1)
+            for d in [(start + timedelta(days=i * 2)).isoformat()]
+        ),
+    )
+
+    def session_logs() -> Iterator[tuple]:
+        for i in range(1, sessions + 1):
+            w = (i - 1) % workouts + 1
+            ids = active[w]
+            if i <= sessions // 2:
+                old = inactive[w][:per_workout]
+                ids = old + ids[len(old):]
+            for we in ids:
+                yield i, we, round(20 + i * 40 / sessions + rng.random() * 5, 1), int(rng.random() < 0.1)
+
+    conn.executemany(
+        "INSERT INTO exerciseLog (sessionId, workoutExerciseId, weight, failed) VALUES (?, ?, ?, ?)",
+        session_logs(),
+    )
+    conn.executemany(
+        "INSERT INTO dailyChallenge (date, setsCompleted) VALUES (?, ?)",
+        (
+            ((start + timedelta(days=d)).isoformat(), rng.randint(1, 3))
+            for d in range(sessions * 2)
+            if rng.random() < 0.66
+        ),
+    )
+    conn.executescript("""
+        CREATE TABLE grdb_migrations (identifier TEXT NOT NULL PRIMARY KEY);
+        INSERT INTO grdb_migrations VALUES ('v1'), ('v2'), ('v3'), ('v4'), ('v5'), ('v6');
+    """)
+    conn.commit()
+    conn.close()
+
+
+def legacy_move(conn: sqlite3.Connection, from_pos: int, to_pos: int) -> None:
+    """The previous reorder: two UPDATEs per row via temporary positions."""
+    rows = conn.execute(
+        "SELECT id, position FROM workoutExercise WHERE workoutId = 1 AND isActive = 1 ORDER BY position"
+    ).fetchall()
+    ordered = list(rows)
+    item = ordered.pop(from_pos - 1)
+    ordered.insert(to_pos - 1, item)
+    offset = len(rows) + 100
+    for i, r in enumerate(ordered):
+        conn.execute("UPDATE workoutExercise SET position = ? WHERE id = ?", (offset + i, r["id"]))
+    for i, r in enumerate(ordered):
+        conn.execute("UPDATE workoutExercise SET position = ? WHERE id = ?", (i + 1, r["id"]))
+
+
+# ── Benchmarks ────────────────────────────────────────────────────────
+
+@benchmark
+def fuzzy() -> None:
+    """Trigram shortlist + difflib vs difflib over every name.
+
+    ``build`` is paid once per catalog change; later runs pay ``load``
+    (reading the cached index) plus ``trigram`` per query.
+    """
+    queries = ["dumbel curl", "benchpress incline", "kettlebel swing", "plnk"]
+    print(
+        f"{'Names':>8} {'difflib':>10} {'build':>10} {'load':>10} "
+        f"{'trigram':>10} {'same':>5}"
+    )
+    for n in (1_000, 10_000, 100_000):
+        names = fake_names(n)
+        t_build = best_of(lambda: openwo.TrigramIndex(names), repeat=1)
+        index = openwo.TrigramIndex(names)
+        blob = openwo.marshal.dumps(index.to_data())
+        t_load = best_of(lambda: openwo.TrigramIndex.from_data(openwo.marshal.loads(blob)))
+
+        def via_difflib() -> list[list[str]]:
+            return [openwo.difflib.get_close_matches(q, names, n=3, cutoff=0.4) for q in queries]
+
+        def via_trigram() -> list[list[str]]:
+            out = []
+            for q in queries:
+                shortlist = [names[i] for i in index.candidates(q)]
+                out.append(openwo.difflib.get_close_matches(q, shortlist, n=3, cutoff=0.4))
+            return out
+
+        same = sum(a == b for a, b in zip(via_difflib(), via_trigram()))
+        t_diff = best_of(via_difflib, repeat=1) / len(queries)
+        t_tri = best_of(via_trigram) / len(queries)
+        print(
+            f"{n:>8} {t_diff * 1e3:>8.1f}ms {t_build * 1e3:>8.1f}ms {t_load * 1e3:>8.1f}ms "
+            f"{t_tri * 1e3:>8.2f}ms {same:>3}/{len(queries)}"
+        )
+
+
+@benchmark
+def positions() -> None:
+    """Move the last row to the front: per-row UPDATEs vs set-based shift."""
+    print(f"{'Rows':>8} {'legacy':>10} {'set-based':>10}")
+    for n in (1_000, 5_000, 20_000):
+        conn = workout_db(n)
+
+        def legacy() -> None:
+            legacy_move(conn, n, 1)
+            conn.rollback()
+
+        def set_based() -> None:
+            openwo.move_position(conn, 1, n, 1)
+            conn.rollback()
+
+        t_old = best_of(legacy)
+        t_new = best_of(set_based)
+        print(f"{n:>8} {t_old * 1e3:>8.1f}ms {t_new * 1e3:>8.1f}ms")
+
+
+@benchmark
+def stats() -> None:
+    """Stats aggregates on a 1M-row exerciseLog, plus the per-exercise loop."""
+    with tempfile.TemporaryDirectory() as tmp:
+        t0 = time.perf_counter()
+        conn = history_db(Path(tmp) / "history.sqlite", logs=1_000_000)
+        print(f"generated 1M logs in {time.perf_counter() - t0:.1f}s")
+
+        def per_exercise() -> None:
+            # One weightHistory query per exercise, as the app's chart does
+            for (ex_id,) in conn.execute("SELECT id FROM exercise").fetchall():
+                openwo.stats_weight_history(conn, ex_id)
+
+        cases = {
+            "weights (per exercise)": per_exercise,
+            "weights (one pass)": lambda: openwo.stats_weight_history(conn),
+            "sessions weekly": lambda: openwo.stats_session_counts(conn, "weekly"),
+            "sessions monthly": lambda: openwo.stats_session_counts(conn, "monthly"),
+            "bests": lambda: openwo.stats_personal_bests(conn),
+            "challenges": lambda: openwo.stats_challenge_history(conn, 2020),
+            "last weights": lambda: openwo.stats_last_weights(conn, 1),
+        }
+        for label, fn in cases.items():
+            print(f"{label:<24} {best_of(fn, repeat=1) * 1e3:>9.1f}ms")
+        conn.close()
+
+
+@benchmark
+def summaries() -> None:
+    """Stats refresh on a 1M-row exerciseLog: full build, then one new session."""
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = history_db(Path(tmp) / "history.sqlite", logs=1_000_000)
+        conn.isolation_level = None
+
+        def refresh(full: bool = False) -> None:
+            conn.execute("BEGIN")
+            openwo.refresh_stats(conn, full=full)
+            conn.execute("COMMIT")
+
+        t_full = best_of(lambda: refresh(full=True), repeat=1)
+        print(f"{'full refresh':<24} {t_full * 1e3:>9.1f}ms")
+
+        def append_session() -> None:
+            sid = conn.execute(
+                "INSERT INTO session (sessionType, date, startedAt, durationSeconds) "
+                "VALUES ('dA', '2030-01-01', '2030-01-01T07:00:00', 3000)"
+            ).lastrowid
+            conn.executemany(
+                "INSERT INTO exerciseLog (sessionId, workoutExerciseId, weight) VALUES (?, ?, 50)",
+                ((sid, j) for j in range(1, 11)),
+            )
+
+        append_session()
+        t_inc = best_of(refresh, repeat=1)
+        print(f"{'incremental (10 logs)':<24} {t_inc * 1e3:>9.1f}ms")
+
+        cases = {
+            "weights": lambda: openwo.stats_weight_history(conn),
+            "volume": lambda: openwo.stats_weekly_volume(conn),
+            "sessions weekly": lambda: openwo.stats_session_counts(conn, "weekly"),
+            "bests": lambda: openwo.stats_personal_bests(conn),
+            "last weights": lambda: openwo.stats_last_weights(conn, 1),
+        }
+        print(f"{'':<24} {'summary':>11} {'live':>11}")
+        for label, fn in cases.items():
+            t_summary = best_of(fn, repeat=1)
+            append_session()  # leaves the summaries behind, forcing the live path
+            t_live = best_of(fn, repeat=1)
+            refresh()
+            print(f"{label:<24} {t_summary * 1e3:>9.1f}ms {t_live * 1e3:>9.1f}ms")
+        conn.close()
+
+
+@benchmark
+def streaks() -> None:
+    """Run-length streaks: NumPy diff vs the pure-Python fallback, and per DB."""
+    rng = random.Random(0)
+    print(f"{'Days':>10} {'python':>10} {'numpy':>10}")
+    for n in (1_000, 100_000, 1_000_000):
+        days = sorted(rng.sample(range(n * 2), n))
+        with mock.patch.object(openwo, "np", None):
+            t_py = best_of(lambda: openwo.day_runs(days))
+        t_np = best_of(lambda: openwo.day_runs(days)) if openwo.np is not None else float("nan")
+        print(f"{n:>10} {t_py * 1e3:>8.2f}ms {t_np * 1e3:>8.2f}ms")
+    with tempfile.TemporaryDirectory() as tmp:
+        # About ten years of sessions: one user's database
+        conn = history_db(Path(tmp) / "history.sqlite", logs=50_000)
+        conn.executemany(
+            "INSERT INTO dailyChallenge (date, setsCompleted) VALUES (?, ?)",
+            (((date(2015, 1, 1) + timedelta(days=i)).isoformat(), rng.choice((1, 2, 3, 3)))
+             for i in range(3650)),
+        )
+        t_streaks = best_of(lambda: openwo.stats_streaks(conn))
+        t_heatmap = best_of(lambda: openwo.stats_heatmap(conn, 2020))
+        print(f"per database: streaks {t_streaks * 1e3:.2f}ms, heatmap {t_heatmap * 1e3:.2f}ms")
+        conn.close()
+
+
+@benchmark
+def shell() -> None:
+    """One `show` per fresh process vs the same command inside `openwo shell`."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "history.sqlite"
+        history_db(path, logs=100_000).close()
+        script = Path(openwo.__file__)
+        cmd = [sys.executable, str(script), "--db", str(path), "show", "A"]
+        t_cold = best_of(lambda: subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL))
+        conn = openwo.connect(path)
+        parser = openwo.build_parser()
+        with open(os.devnull, "w") as devnull, mock.patch("sys.stdout", devnull):
+            t_warm = best_of(lambda: openwo.shell_line(conn, parser, path, "show A"))
+        conn.close()
+        print(f"{'process per command':<24} {t_cold * 1e3:>9.1f}ms")
+        print(f"{'shell':<24} {t_warm * 1e3:>9.1f}ms")
+
+
+@benchmark
+def tuning() -> None:
+    """Read-only URI connections and SQLite PRAGMA profiles on a 1M-row log."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "history.sqlite"
+        history_db(path, logs=1_000_000).close()
+        parser = openwo.build_parser()
+
+        def open_conn(read_only: bool, profile: str | None) -> sqlite3.Connection:
+            conn = openwo.connect(path, read_only=read_only)
+            if profile is None:  # SQLite defaults: 2 MiB cache, no mmap, file temp store
+                conn.execute("PRAGMA cache_size = -2000")
+                conn.execute("PRAGMA mmap_size = 0")
+                conn.execute("PRAGMA temp_store = DEFAULT")
+            else:
+                openwo.apply_profile(conn, profile)
+            return conn
+
+        t_rw = best_of(lambda: open_conn(False, "read").close())
+        t_ro = best_of(lambda: open_conn(True, "read").close())
+        print(f"{'connect read-write':<24} {t_rw * 1e3:>9.2f}ms")
+        print(f"{'connect mode=ro':<24} {t_ro * 1e3:>9.2f}ms")
+
+        show = parser.parse_args(["show", "A"])
+        workloads = {
+            "show A": lambda conn: openwo.run_command(conn, show, path),
+            "stats weights": openwo.stats_weight_history,
+            "stats sessions": lambda conn: openwo.stats_session_counts(conn, "weekly"),
+            "stats bests": openwo.stats_personal_bests,
+            "export (iterate)": lambda conn: sum(1 for _ in openwo.iter_export(conn)),
+        }
+        profiles = [None, "read", "scan"]
+        print(f"{'':<24}" + "".join(f"{p or 'default':>11}" for p in profiles))
+        for label, fn in workloads.items():
+            times = []
+            for profile in profiles:
+                conn = open_conn(True, profile)
+                with open(os.devnull, "w") as devnull, mock.patch("sys.stdout", devnull):
+                    times.append(best_of(lambda: fn(conn), repeat=3))
+                conn.close()
+            print(f"{label:<24}" + "".join(f"{t * 1e3:>9.1f}ms" for t in times))
+
+
+@benchmark
+def working_copy() -> None:
+    """Committed edits: rollback journal on the file vs a WAL working copy."""
+    with tempfile.TemporaryDirectory() as tmp, \
+            mock.patch.dict("os.environ", {"XDG_DATA_HOME": tmp}):
+        path = Path(tmp) / "history.sqlite"
+        history_db(path, logs=100_000).close()
+        edits = 200
+
+        def run(conn: sqlite3.Connection) -> float:
+            t0 = time.perf_counter()
+            for i in range(edits):
+                conn.execute("BEGIN")
+                openwo.move_position(conn, 1, 10, 1)
+                conn.commit()
+            return (time.perf_counter() - t0) / edits
+
+        conn = openwo.connect(path)
+        t_delete = run(conn)
+        conn.close()
+        t0 = time.perf_counter()
+        copy = openwo.checkout(path)
+        t_checkout = time.perf_counter() - t0
+        conn = openwo.connect(copy, wal=True)
+        t_wal = run(conn)
+        conn.close()
+        openwo._backup_done = True
+        t0 = time.perf_counter()
+        openwo.publish(path, copy, force=True)
+        t_publish = time.perf_counter() - t0
+        print(f"{'edit, journal=DELETE':<24} {t_delete * 1e3:>9.2f}ms")
+        print(f"{'edit, WAL working copy':<24} {t_wal * 1e3:>9.2f}ms")
+        print(f"{'checkout':<24} {t_checkout * 1e3:>9.1f}ms")
+        print(f"{'publish':<24} {t_publish * 1e3:>9.1f}ms")
+
+
+# Scales the ``cli`` suite runs at; set from --scale.
+CLI_SCALES = ["small", "medium"]
+
+
+def run_cli(parser: argparse.ArgumentParser, path: Path, argv: list[str]) -> None:
+    """One command the way main() runs it, minus interpreter start-up."""
+    args = parser.parse_args(["--db", str(path), *argv])
+    openwo._backup_done = False
+    conn = openwo.connect(
+        path, read_only=not openwo.command_writes(args), profile=openwo.command_profile(args),
+    )
+    try:
+        openwo.prepare_schema(conn, args, path)
+        openwo.run_command(conn, args, path)
+    finally:
+        conn.close()
+
+
+def cli_cases(conn: sqlite3.Connection, scale: dict[str, int], tmp: Path) -> dict:
+    """label -> (argv or callable(conn), mutates) for one generated database."""
+    names = fake_names(scale["exercises"])
+    first = conn.execute(
+        """SELECT e.name FROM workoutExercise we JOIN exercise e ON e.id = we.exerciseId
+           WHERE we.workoutId = 1 AND we.isActive = 1 ORDER BY we.position LIMIT 2"""
+    ).fetchall()
+    imports = tmp / "import.ndjson"
+    with open(imports, "w") as f:
+        # Half already in the catalog (skipped), half new
+        half = scale["exercises"] // 2
+        for e in catalog_entries(half) + catalog_entries(half, seed=1, start=scale["exercises"]):
+            f.write(json.dumps(e) + "\n")
+
+    def typo(conn: sqlite3.Connection) -> None:
+        try:
+            openwo.resolve_exercise(conn, names[0][:-3] + "xq")
+        except SystemExit:
+            pass
+
+    n = scale["per_workout"]
+    return {
+        "resolve exercise": (lambda conn: openwo.resolve_exercise(conn, names[-1].lower()), False),
+        "resolve (suggestions)": (typo, False),
+        "resolve workout": (lambda conn: openwo.resolve_workout(conn, "workout 1"), False),
+        "show": (["show"], False),
+        "show --all ndjson": (["show", "--all", "--format", "ndjson"], False),
+        "exercises query": (["exercises", "curl press"], False),
+        "exercises --muscle": (["exercises", "--muscle", "chest"], False),
+        "swap (dry run)": (["swap", "Workout 1", first[0][0], names[-1]], False),
+        "swap": (["swap", "Workout 1", first[0][0], names[-1], "--execute"], True),
+        "add": (["add", "Workout 1", names[-2], "--execute"], True),
+        "remove": (["remove", "Workout 1", first[1][0], "--execute"], True),
+        "reorder": (["reorder", "Workout 1", "--move", str(n), "--to", "1", "--execute"], True),
+        "import-exercises": (["import-exercises", str(imports), "--execute"], True),
+        "backups create": (["backups", "create"], True),
+        "export": (["export", "--output", str(tmp / "export.ndjson")], False),
+        "stats bests": (["stats", "bests"], False),
+    }
+
+
+@benchmark
+def cli() -> None:
+    """Every subcommand against generated databases (see SCALES, --scale)."""
+    parser = openwo.build_parser()
+    for scale_name in CLI_SCALES:
+        scale = SCALES[scale_name]
+        with tempfile.TemporaryDirectory() as tmp_name, \
+                mock.patch.dict("os.environ", {"XDG_DATA_HOME": tmp_name, "XDG_CACHE_HOME": tmp_name}), \
+                open(os.devnull, "w") as devnull, \
+                mock.patch("sys.stdout", devnull), mock.patch("sys.stderr", devnull):
+            tmp = Path(tmp_name)
+            base, work = tmp / "base.sqlite", tmp / "work.sqlite"
+            t_gen = best_of(lambda: generate_db(base, **scale), repeat=1)
+            t_migrate = best_of(lambda: run_cli(parser, base, ["migrate", "--execute"]), repeat=1)
+            conn = openwo.connect(base, read_only=True)
+            logs = conn.execute("SELECT COUNT(*) FROM exerciseLog").fetchone()[0]
+            cases = cli_cases(conn, scale, tmp)
+            conn.close()
+
+            def reset() -> None:
+                shutil.copyfile(base, work)
+
+            # Mutations snapshot first; seed the store so those are incremental, as in use
+            reset()
+            run_cli(parser, work, ["backups", "create"])
+
+            timings = {"generate": t_gen, "migrate": t_migrate}
+            for label, (cmd, mutates) in cases.items():
+                if callable(cmd):
+                    # A fresh connection each time, so per-connection caches start cold
+                    conns: list[sqlite3.Connection] = []
+                    timings[label] = best_of(
+                        lambda: cmd(conns[-1]),
+                        setup=lambda: conns.append(openwo.connect(base, read_only=True)),
+                    )
+                    for conn in conns:
+                        conn.close()
+                else:
+                    timings[label] = best_of(
+                        lambda: run_cli(parser, work if mutates else base, cmd),
+                        setup=reset if mutates else None,
+                    )
+
+        print(f"-- {scale_name}: {logs:,} logs, {scale['exercises']:,} exercises --")
+        for label, t in timings.items():
+            print(f"{label:<24} {t * 1e3:>9.1f}ms")
+            record("cli", label, t, scale=scale_name, logs=logs, **scale)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Benchmarks for openwo.py")
+    ap.add_argument("names", nargs="*", metavar="NAME", help=f"Benchmarks to run ({', '.join(BENCHMARKS)})")
+    ap.add_argument("--scale", nargs="+", choices=list(SCALES), help="Database sizes for the cli suite")
+    ap.add_argument("--json", metavar="FILE", help="Write recorded results as JSON")
+    ap.add_argument("--generate", metavar="FILE", help="Only write a synthetic database (first --scale)")
+    opts = ap.parse_args()
+
+    if opts.scale:
+        CLI_SCALES[:] = opts.scale
+    if opts.generate:
+        path = Path(opts.generate)
+        if path.exists():
+            sys.exit(f"Refusing to overwrite {path}")
+        generate_db(path, **SCALES[CLI_SCALES[0]])
+        print(f"Wrote {CLI_SCALES[0]} database to {path}")
+        return
+
+    names = opts.names or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            sys.exit(f"Unknown benchmark: {name} (choose from {', '.join(BENCHMARKS)})")
+        print(f"\n== {name} ==")
+        BENCHMARKS[name]()
+
+    if opts.json:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+        report = {
+            "commit": commit or None,
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "machine": platform.machine(),
+            "results": RESULTS,
+        }
+        Path(opts.json).write_text(json.dumps(report, indent=2) + "\n")
+        print(f"\nWrote {len(RESULTS)} result(s) to {opts.json}")
+
+
+if __name__ == "__main__":
+    main()
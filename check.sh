@@ -28,7 +28,7 @@ run_xcode() {
 run_python() {
     echo "=== Running Python tests ==="
     cd "$ROOT"
-    uv run --with pytest pytest test_openwo.py -v
+    uv run --with pytest --with numpy pytest test_openwo.py -v
 }
 
 case "${1:-all}" in
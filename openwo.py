@@ -1,4 +1,8 @@
 #!/usr/bin/env -S uv run --script
+# /// script
+# requires-python = ">=3.11"
+# dependencies = ["numpy"]
+# ///
 """CLI for OpenWO workout management.
 
 Operates directly on the iCloud-synced SQLite database.
@@ -6,14 +10,38 @@ All mutations are dry-run by default — pass --execute to apply.
 """
 
 import argparse
+import bisect
+import csv
 import difflib
+import fcntl
+import glob
+import hashlib
+import heapq
+import io
+import itertools
 import json
-import shutil
+import marshal
+import os
+import re
+import shlex
 import sqlite3
 import sys
-from datetime import datetime
+import tempfile
+import time
+import traceback
+import zlib
+from array import array
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager, nullcontext, redirect_stderr, redirect_stdout
+from datetime import date, datetime, timedelta
 from pathlib import Path
-from typing import NoReturn
+from typing import IO, ContextManager, Iterable, Iterator, NoReturn
+
+try:
+    import numpy as np
+except ImportError:  # run as plain python3: streaks fall back to pure Python
+    np = None
 
 # ── DB Discovery ──────────────────────────────────────────────────────
 
@@ -37,181 +65,950 @@ def discover_db(explicit: str | None) -> Path:
     )
 
 
-def connect(path: Path) -> sqlite3.Connection:
-    conn = sqlite3.connect(str(path))
+# Compiled statements kept per connection; the shell reuses them across commands
+STATEMENT_CACHE_SIZE = 512
+
+# Per-connection PRAGMAs by command class (see command_profile). cache_size
+# is in KiB when negative. mmap is left off for writers: the file lives in
+# iCloud Drive and writes should go through the regular journaled path.
+# Large sorts (stats, export) run faster spilling to temp files than in a
+# memory temp store, so only the small-query classes use MEMORY
+# (bench_openwo.py tuning).
+SQLITE_PROFILES = {
+    "read": {"cache_size": -8192, "mmap_size": 64 << 20, "temp_store": "MEMORY"},
+    "scan": {"cache_size": -65536, "mmap_size": 1 << 30, "temp_store": "FILE"},
+    "write": {"cache_size": -8192, "mmap_size": 0, "temp_store": "MEMORY"},
+    "bulk": {"cache_size": -262144, "mmap_size": 0, "temp_store": "FILE"},
+}
+
+
+def db_uri(path: Path, **params: str) -> str:
+    """``file:`` URI for ``path``, percent-encoded, with query ``params``."""
+    query = "&".join(f"{k}={v}" for k, v in params.items())
+    return path.resolve().as_uri() + (f"?{query}" if query else "")
+
+
+def apply_profile(conn: sqlite3.Connection, profile: str) -> None:
+    for pragma, value in SQLITE_PROFILES[profile].items():
+        conn.execute(f"PRAGMA {pragma} = {value}")
+
+
+def connect(
+    path: Path, read_only: bool = False, profile: str = "write", wal: bool = False,
+) -> sqlite3.Connection:
+    """Open the app database.
+
+    Read-only connections use a ``mode=ro`` URI: they never create a journal
+    or take a write lock on the synced file, and leave journal_mode alone.
+    ``wal`` is for local working copies (see checkout), never the iCloud file.
+    """
+    if read_only:
+        conn = sqlite3.connect(
+            db_uri(path, mode="ro"), uri=True, cached_statements=STATEMENT_CACHE_SIZE,
+        )
+    elif wal:
+        conn = sqlite3.connect(str(path), cached_statements=STATEMENT_CACHE_SIZE)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+    else:
+        conn = sqlite3.connect(str(path), cached_statements=STATEMENT_CACHE_SIZE)
+        conn.execute("PRAGMA journal_mode = DELETE")
     conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA journal_mode = DELETE")
     conn.execute("PRAGMA foreign_keys = ON")
+    apply_profile(conn, profile)
     return conn
 
 
 # ── Migration ─────────────────────────────────────────────────────────
 
-def ensure_is_active_column(conn: sqlite3.Connection) -> None:
-    cols = [r["name"] for r in conn.execute("PRAGMA table_info(workoutExercise)")]
-    if "isActive" not in cols:
+# The CLI's own schema additions, numbered in PRAGMA user_version (the app's
+# GRDB migrator tracks v1–v6 in grdb_migrations and leaves it alone). A
+# current database costs one integer read at startup. Migrations run only
+# for commands that write; read-only commands never take a write lock and
+# work without the derived tables.
+
+HOT_INDEXES = """
+    CREATE INDEX IF NOT EXISTS exerciseLog_workoutExerciseId ON exerciseLog(workoutExerciseId);
+    CREATE INDEX IF NOT EXISTS workoutExercise_exerciseId ON workoutExercise(exerciseId);
+    CREATE INDEX IF NOT EXISTS session_date ON session(date, isPartial);
+"""
+
+
+def _has_is_active(conn: sqlite3.Connection) -> bool:
+    return any(
+        r["name"] == "isActive" for r in conn.execute("PRAGMA table_info(workoutExercise)")
+    )
+
+
+def _add_is_active(conn: sqlite3.Connection) -> None:
+    # The app adds it in its own v6; older databases get it here
+    if not _has_is_active(conn):
         conn.execute(
             "ALTER TABLE workoutExercise ADD COLUMN isActive BOOLEAN NOT NULL DEFAULT 1"
         )
-        conn.commit()
+
+
+def _add_hot_indexes(conn: sqlite3.Connection) -> None:
+    for stmt in HOT_INDEXES.split(";"):
+        if stmt.strip():
+            conn.execute(stmt)
+
+
+# Version N is MIGRATIONS[N - 1]. Each runs in its own transaction; the
+# helpers from later sections are looked up when the migration runs.
+MIGRATIONS = [
+    ("workoutExercise.isActive", _add_is_active),
+    ("indexes for export, stats and log lookups", _add_hot_indexes),
+    ("muscle/equipment lookup tables", lambda conn: create_lookup_tables(conn)),
+    ("exercise search index", lambda conn: create_search_index(conn)),
+    ("operation journal", lambda conn: create_journal_tables(conn)),
+    ("triggers keeping the lookup tables current", lambda conn: create_lookup_tables(conn)),
+]
+
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def pending_migrations(conn: sqlite3.Connection) -> list[tuple[int, str]]:
+    version = schema_version(conn)
+    return [(v, name) for v, (name, _) in enumerate(MIGRATIONS, 1) if v > version]
+
+
+def migrate(conn: sqlite3.Connection, db_path: Path) -> list[tuple[int, str]]:
+    """Apply pending migrations in order, after a backup. Returns them."""
+    pending = pending_migrations(conn)
+    if pending:
+        backup_db(db_path)
+    for version, name in pending:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            MIGRATIONS[version - 1][1](conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return pending
+
+
+def require_schema(conn: sqlite3.Connection) -> None:
+    """Check a read-only command can run without migrating."""
+    if schema_version(conn) == 0 and not _has_is_active(conn):
+        die("Database predates workoutExercise.isActive. Run: openwo migrate --execute")
+
+
+def command_writes(args: argparse.Namespace) -> bool:
+    """Whether ``args`` may modify the database (and so may migrate it)."""
+    if args.command in (
+        "swap", "add", "remove", "reorder", "batch", "import-exercises", "migrate", "doctor",
+        "compact", "apply", "undo",
+    ):
+        return args.execute
+    if args.command == "backups":
+        return args.backups_command == "restore" and args.execute
+    if args.command == "stats":
+        return args.stats_command == "refresh"
+    return args.command == "rebuild-lookups"
+
+
+def command_profile(args: argparse.Namespace) -> str:
+    """SQLITE_PROFILES entry for ``args``, unless --tuning picks one."""
+    if args.tuning:
+        return args.tuning
+    if args.command in ("import-exercises", "rebuild-lookups") or (
+        args.command == "stats" and args.stats_command == "refresh"
+    ):
+        return "bulk"
+    if args.command in ("export", "stats"):
+        return "scan"
+    return "write" if command_writes(args) else "read"
+
+
+def prepare_schema(conn: sqlite3.Connection, args: argparse.Namespace, db_path: Path) -> None:
+    if args.command == "migrate":
+        return
+    if not command_writes(args):
+        require_schema(conn)
+    elif applied := migrate(conn, db_path):
+        print(f"Schema: migrated to version {applied[-1][0]}.")
+
+
+def cmd_migrate(conn: sqlite3.Connection, args: argparse.Namespace, db_path: Path) -> None:
+    pending = pending_migrations(conn)
+    print(f"Schema version {schema_version(conn)} of {len(MIGRATIONS)}.")
+    if not pending:
+        print("Up to date.")
+        return
+    for version, name in pending:
+        print(f"  {version}: {name}")
+    if not args.execute:
+        print("\nDry run — pass --execute to apply.")
+        return
+    migrate(conn, db_path)
+    print(f"Applied {len(pending)} migration(s).")
 
 
 # ── Backup ────────────────────────────────────────────────────────────
 
+# Snapshots are read page by page straight from the database under a read
+# transaction and stored content-addressed (zlib-compressed, keyed by SHA-1)
+# in a local store database, so consecutive snapshots only compress and add
+# the pages that changed. Pruning always drops the oldest snapshots, so
+# pageUse only records the last snapshot using each page (NULL while the
+# newest one does): a snapshot touches just the pages that changed since
+# the previous one, and a prune finds dead pages through an index.
+
+BACKUP_PAGES_PER_STEP = 256
+BACKUP_BATCH = 500  # page hashes looked up per statement
+BACKUP_KEEP = 30  # default for the automatic prune after each backup
+
 _backup_done = False
 
 
-def backup_db(db_path: Path) -> Path:
+def _data_dir() -> Path:
+    base = os.environ.get("XDG_DATA_HOME") or Path.home() / ".local/share"
+    return Path(base) / "openwo"
+
+
+def _db_key(db_path: Path) -> str:
+    """Stable local file stem for ``db_path``: its name plus a path hash."""
+    resolved = db_path.resolve()
+    return f"{resolved.stem}-{hashlib.sha1(str(resolved).encode()).hexdigest()[:16]}"
+
+
+def backup_store_path(db_path: Path) -> Path:
+    """Local store holding every snapshot of ``db_path``."""
+    return _data_dir() / "backups" / f"{_db_key(db_path)}.sqlite"
+
+
+def open_backup_store(db_path: Path) -> sqlite3.Connection:
+    path = backup_store_path(db_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    store = sqlite3.connect(str(path))
+    store.row_factory = sqlite3.Row
+    store.executescript("""
+        CREATE TABLE IF NOT EXISTS page (
+            hash BLOB PRIMARY KEY,
+            data BLOB NOT NULL
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS snapshot (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            createdAt TEXT NOT NULL,
+            note TEXT NOT NULL DEFAULT '',
+            pageSize INTEGER NOT NULL,
+            pageCount INTEGER NOT NULL,
+            newPages INTEGER NOT NULL,
+            storedBytes INTEGER NOT NULL,  -- compressed size of the new pages
+            pages BLOB NOT NULL  -- zlib(concatenated 20-byte page hashes)
+        );
+    """)
+    if not _has_table(store, "pageUse"):
+        # Kept apart from page so updating it never rewrites page data
+        with store:
+            store.execute(
+                "CREATE TABLE pageUse (hash BLOB PRIMARY KEY, lastSnapshot INTEGER) WITHOUT ROWID"
+            )
+            store.execute("CREATE INDEX pageUse_lastSnapshot ON pageUse(lastSnapshot)")
+            last: dict[bytes, int | None] = {}
+            snaps = store.execute("SELECT id, pages FROM snapshot ORDER BY id").fetchall()
+            for snap in snaps:
+                last.update(dict.fromkeys(_snapshot_hashes(snap), snap["id"]))
+            if snaps:
+                last.update(dict.fromkeys(_snapshot_hashes(snaps[-1])))
+            store.executemany("INSERT INTO pageUse (hash, lastSnapshot) VALUES (?, ?)", last.items())
+    return store
+
+
+def _batches(items: list, size: int = BACKUP_BATCH) -> Iterator[list]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _stored_hashes(store: sqlite3.Connection, digests: list[bytes]) -> set[bytes]:
+    """The ``digests`` already in the store, in batched lookups."""
+    found: set[bytes] = set()
+    for batch in _batches(digests):
+        found.update(r[0] for r in store.execute(
+            f"SELECT hash FROM pageUse WHERE hash IN ({', '.join('?' * len(batch))})", batch,
+        ))
+    return found
+
+
+def _progress(status: int, remaining: int, total: int) -> None:
+    if sys.stderr.isatty() and total:
+        done = total - remaining
+        print(f"\r  copying {done}/{total} pages", end="", file=sys.stderr)
+
+
+def _read_pages(src: sqlite3.Connection, db_path: Path) -> Iterator[bytes]:
+    """The pages of ``db_path`` as of ``src``'s open read transaction."""
+    page_size = src.execute("PRAGMA page_size").fetchone()[0]
+    count = src.execute("PRAGMA page_count").fetchone()[0]
+    if src.execute("PRAGMA journal_mode").fetchone()[0] == "wal":
+        # Committed pages may still sit in the -wal file of a working copy
+        data = memoryview(src.serialize())
+        for i in range(0, len(data), page_size):
+            yield bytes(data[i:i + page_size])
+        return
+    # In rollback-journal mode the read lock keeps writers from committing,
+    # so the file itself is a consistent copy while it is held
+    with open(db_path, "rb") as f:
+        for _ in range(count):
+            yield f.read(page_size)
+
+
+def take_snapshot(db_path: Path, store: sqlite3.Connection, note: str = "") -> sqlite3.Row:
+    """Copy ``db_path`` into ``store`` and return the new snapshot row.
+
+    Pages are hashed as they are read and only unseen ones are compressed
+    and stored; no intermediate copy of the database is written.
+    """
+    src = sqlite3.connect(db_uri(db_path, mode="ro"), uri=True, isolation_level=None)
+    try:
+        src.execute("BEGIN")
+        src.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchone()  # takes the read lock
+        page_size = src.execute("PRAGMA page_size").fetchone()[0]
+        total = src.execute("PRAGMA page_count").fetchone()[0]
+        pages = _read_pages(src, db_path)
+        previous = store.execute("SELECT id, pages FROM snapshot ORDER BY id DESC LIMIT 1").fetchone()
+        before = set(_snapshot_hashes(previous)) if previous else set()
+        hashes = bytearray()
+        used: set[bytes] = set()
+        count = new = stored = 0
+        with store:
+            while batch := list(itertools.islice(pages, BACKUP_BATCH)):
+                digests = [hashlib.sha1(page).digest() for page in batch]
+                # Pages of the previous snapshot are stored; look up only the rest
+                known = before | used
+                known |= _stored_hashes(store, [d for d in digests if d not in known])
+                for digest, page in zip(digests, batch):
+                    if digest in known:
+                        continue
+                    data = zlib.compress(page)
+                    store.execute("INSERT INTO page (hash, data) VALUES (?, ?)", (digest, data))
+                    known.add(digest)
+                    new += 1
+                    stored += len(data)
+                used.update(digests)
+                hashes += b"".join(digests)
+                count += len(batch)
+                _progress(0, total - count, total)
+            if previous:
+                store.executemany(
+                    "UPDATE pageUse SET lastSnapshot = ? WHERE hash = ?",
+                    ((previous["id"], digest) for digest in before - used),
+                )
+            store.executemany(
+                """
+                INSERT INTO pageUse (hash, lastSnapshot) VALUES (?, NULL)
+                ON CONFLICT (hash) DO UPDATE SET lastSnapshot = NULL
+                """,
+                ((digest,) for digest in used - before),
+            )
+            snap_id = store.execute(
+                """
+                INSERT INTO snapshot
+                  (createdAt, note, pageSize, pageCount, newPages, storedBytes, pages)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    datetime.now().isoformat(timespec="seconds"),
+                    note, page_size, count, new, stored, zlib.compress(bytes(hashes)),
+                ),
+            ).lastrowid
+    finally:
+        src.close()
+    if sys.stderr.isatty():
+        print("\r\033[K", end="", file=sys.stderr)
+    return store.execute("SELECT * FROM snapshot WHERE id = ?", (snap_id,)).fetchone()
+
+
+def _snapshot_hashes(snap: sqlite3.Row) -> list[bytes]:
+    blob = zlib.decompress(snap["pages"])
+    return [blob[i:i + 20] for i in range(0, len(blob), 20)]
+
+
+def restore_snapshot(store: sqlite3.Connection, snap: sqlite3.Row, conn: sqlite3.Connection) -> None:
+    """Rebuild ``snap`` and copy it over ``conn``'s database with the backup API."""
+    with tempfile.TemporaryDirectory() as tmp:
+        copy_path = Path(tmp) / "restore.sqlite"
+        with open(copy_path, "wb") as f:
+            for digest in _snapshot_hashes(snap):
+                row = store.execute("SELECT data FROM page WHERE hash = ?", (digest,)).fetchone()
+                if row is None:
+                    die(f"Backup store is missing a page of snapshot {snap['id']}.")
+                f.write(zlib.decompress(row["data"]))
+        # Nothing else can touch the rebuilt copy, so SQLite may skip locking
+        src = sqlite3.connect(db_uri(copy_path, mode="ro", immutable="1"), uri=True)
+        try:
+            if src.execute("PRAGMA integrity_check").fetchone()[0] != "ok":
+                die(f"Snapshot {snap['id']} failed the integrity check.")
+            src.backup(conn, pages=BACKUP_PAGES_PER_STEP, progress=_progress)
+        finally:
+            src.close()
+
+
+def prune_snapshots(
+    store: sqlite3.Connection, keep: int | None, max_age_days: int | None,
+    execute: bool = True, vacuum: bool = True,
+) -> list[sqlite3.Row]:
+    """Drop snapshots outside the retention policy and their orphaned pages.
+
+    The newest snapshot is always kept. Pages last used before the oldest
+    remaining snapshot are found through pageUse's index; ``vacuum`` also
+    returns the freed space to the disk.
+    """
+    snaps = store.execute("SELECT id, createdAt FROM snapshot ORDER BY id DESC").fetchall()
+    cutoff = (
+        (datetime.now() - timedelta(days=max_age_days)).isoformat(timespec="seconds")
+        if max_age_days is not None else None
+    )
+    doomed = [
+        s for i, s in enumerate(snaps)
+        if i > 0 and (
+            (keep is not None and i >= keep)
+            or (cutoff is not None and s["createdAt"] < cutoff)
+        )
+    ]
+    if not doomed or not execute:
+        return doomed
+
+    with store:
+        store.executemany("DELETE FROM snapshot WHERE id = ?", [(s["id"],) for s in doomed])
+        oldest = store.execute("SELECT MIN(id) FROM snapshot").fetchone()[0]
+        store.execute(
+            "DELETE FROM page WHERE hash IN (SELECT hash FROM pageUse WHERE lastSnapshot < ?)",
+            (oldest,),
+        )
+        store.execute("DELETE FROM pageUse WHERE lastSnapshot < ?", (oldest,))
+    if vacuum:
+        store.execute("VACUUM")
+    return doomed
+
+
+def backup_keep() -> int | None:
+    """Snapshots kept by the automatic prune: OPENWO_BACKUP_KEEP, 0 for no prune."""
+    value = os.environ.get("OPENWO_BACKUP_KEEP", "").strip()
+    if not value:
+        return BACKUP_KEEP
+    try:
+        keep = int(value)
+    except ValueError:
+        keep = -1
+    if keep < 0:
+        die(f"OPENWO_BACKUP_KEEP must be a whole number (0 turns the prune off), not {value!r}.")
+    return keep or None
+
+
+def backup_db(db_path: Path) -> int | None:
+    """Snapshot the database once per process, before the first mutation."""
     global _backup_done
     if _backup_done:
-        return db_path
-    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
-    bak = db_path.with_suffix(f".sqlite.bak.{stamp}")
-    shutil.copy2(db_path, bak)
-    print(f"Backup: {bak}")
+        return None
+    with phase("backup"):
+        store = open_backup_store(db_path)
+        try:
+            snap = take_snapshot(db_path, store)
+            if (keep := backup_keep()) is not None:
+                # Freed pages are reused by later snapshots; VACUUM is left
+                # to an explicit `openwo backups prune`
+                prune_snapshots(store, keep, None, vacuum=False)
+        finally:
+            store.close()
+    print(
+        f"Backup: snapshot {snap['id']} "
+        f"({snap['newPages']}/{snap['pageCount']} new pages) in {backup_store_path(db_path)}"
+    )
     _backup_done = True
-    return bak
+    return snap["id"]
+
+
+# ── Working Copy ──────────────────────────────────────────────────────
+
+# `openwo checkout` copies the iCloud database to local disk, where later
+# commands edit it in WAL mode with synchronous=NORMAL instead of writing
+# through rollback journals to the synced file. `openwo publish` writes it
+# back with the backup API into a sibling temp file and one atomic rename.
+# Conflicts are detected from the source file's mtime, size and header
+# change counter, which SQLite bumps on every commit in rollback mode (the
+# persistent counterpart of PRAGMA data_version).
+
+def working_copy_path(db_path: Path) -> Path:
+    return _data_dir() / "working" / f"{_db_key(db_path)}.sqlite"
+
+
+def _working_meta_path(copy: Path) -> Path:
+    return copy.with_suffix(".json")
+
+
+def source_state(db_path: Path) -> dict:
+    """What publish compares against checkout to detect the app's writes."""
+    st = os.stat(db_path)
+    with open(db_path, "rb") as f:
+        header = f.read(100)
+    return {
+        "mtime_ns": st.st_mtime_ns,
+        "size": st.st_size,
+        "changeCounter": int.from_bytes(header[24:28], "big"),
+    }
+
+
+def find_working_copy(db_path: Path) -> Path | None:
+    copy = working_copy_path(db_path)
+    return copy if copy.exists() and _working_meta_path(copy).exists() else None
+
+
+def checkout(db_path: Path) -> Path:
+    """Copy ``db_path`` to a local WAL working copy and return its path."""
+    copy = working_copy_path(db_path)
+    copy.parent.mkdir(parents=True, exist_ok=True)
+    # Taken first: a commit during the copy then reads as a conflict, never
+    # as a silently lost change.
+    state = source_state(db_path)
+    tmp = copy.with_suffix(".tmp")
+    tmp.unlink(missing_ok=True)
+    src = sqlite3.connect(db_uri(db_path, mode="ro"), uri=True)
+    dst = sqlite3.connect(str(tmp))
+    try:
+        src.backup(dst, pages=BACKUP_PAGES_PER_STEP, progress=_progress)
+        dst.execute("PRAGMA journal_mode = WAL")
+    finally:
+        src.close()
+        dst.close()
+    tmp.replace(copy)
+    meta = {
+        "source": str(db_path.resolve()),
+        "checkedOutAt": datetime.now().isoformat(timespec="seconds"),
+        **state,
+    }
+    _working_meta_path(copy).write_text(json.dumps(meta, indent=2))
+    return copy
+
+
+def working_copy_conflict(db_path: Path, copy: Path) -> bool:
+    meta = json.loads(_working_meta_path(copy).read_text())
+    state = source_state(db_path)
+    return any(meta[k] != v for k, v in state.items())
+
+
+def discard_working_copy(copy: Path) -> None:
+    for path in (copy, Path(f"{copy}-wal"), Path(f"{copy}-shm"), _working_meta_path(copy)):
+        path.unlink(missing_ok=True)
+
+
+def publish(db_path: Path, copy: Path, force: bool = False) -> None:
+    """Replace ``db_path`` with the working copy in one rename, then drop the copy."""
+    src = sqlite3.connect(str(copy))
+    try:
+        if src.execute("PRAGMA integrity_check").fetchone()[0] != "ok":
+            die(f"Working copy {copy} failed the integrity check; nothing was published.")
+        backup_db(db_path)
+        # Same directory as the target, so the rename cannot cross filesystems
+        tmp = db_path.with_name(f".{db_path.name}.publish")
+        tmp.unlink(missing_ok=True)
+        dst = sqlite3.connect(str(tmp))
+        try:
+            src.backup(dst, pages=BACKUP_PAGES_PER_STEP, progress=_progress)
+            dst.execute("PRAGMA journal_mode = DELETE")
+        finally:
+            dst.close()
+    finally:
+        src.close()
+    with open(tmp, "rb+") as f:
+        os.fsync(f.fileno())
+    if not force and working_copy_conflict(db_path, copy):
+        tmp.unlink()
+        die("The database changed while publishing; nothing was published.")
+    os.replace(tmp, db_path)
+    discard_working_copy(copy)
+
+
+def target_db(args: argparse.Namespace, db_path: Path) -> tuple[Path, bool]:
+    """The file a command should open: the working copy while one exists."""
+    if args.command in ("checkout", "publish", "discard"):
+        return db_path, False
+    copy = find_working_copy(db_path)
+    if copy is None:
+        return db_path, False
+    print(f"Working copy: {copy} (openwo publish to write it back)", file=sys.stderr)
+    return copy, True
+
+
+# ── Name Index ────────────────────────────────────────────────────────
+
+class NameIndex:
+    """Case-insensitive lookup over the ``name`` column of a table.
+
+    Exact matches go through a dict. Substring matches run ``str.find``
+    over one NUL-joined haystack of lowercased names, so the scan happens
+    in C instead of a Python loop over rows.
+    """
+
+    def __init__(self, rows: list[tuple[int, str]]) -> None:
+        self.ids = [r[0] for r in rows]
+        self.names = [r[1] for r in rows]
+        lowered = [n.lower() for n in self.names]
+        self.exact: dict[str, list[int]] = {}
+        for i, name in enumerate(lowered):
+            self.exact.setdefault(name, []).append(i)
+        self.starts: list[int] = []
+        offset = 0
+        for name in lowered:
+            self.starts.append(offset)
+            offset += len(name) + 1
+        self.haystack = "\0".join(lowered)
+        self.trigrams: TrigramIndex | None = None  # built on first fuzzy lookup
+
+    def find_exact(self, q: str) -> list[int]:
+        """Row indexes whose lowercased name equals ``q``."""
+        return self.exact.get(q, [])
+
+    def find_substring(self, q: str) -> list[int]:
+        """Row indexes whose lowercased name contains ``q``, in id order."""
+        if not self.ids or "\0" in q:
+            return []
+        hits: list[int] = []
+        pos = self.haystack.find(q)
+        while pos != -1:
+            i = bisect.bisect_right(self.starts, pos) - 1
+            hits.append(i)
+            # Skip to the next name so each row is reported once
+            if i + 1 >= len(self.starts):
+                break
+            pos = self.haystack.find(q, self.starts[i + 1])
+        return hits
+
+    def fingerprint(self) -> str:
+        """Digest of the indexed ids and names, used to validate caches."""
+        h = hashlib.sha1(array("q", self.ids).tobytes())
+        h.update(self.haystack.encode())
+        return h.hexdigest()
+
+
+_name_indexes: dict[str, tuple[sqlite3.Connection, tuple[int, int], NameIndex]] = {}
+
+
+def _db_version(conn: sqlite3.Connection) -> tuple[int, int]:
+    """Changes whenever this or any other connection modifies the database."""
+    return (conn.execute("PRAGMA data_version").fetchone()[0], conn.total_changes)
+
+
+def name_index(conn: sqlite3.Connection, table: str) -> NameIndex:
+    """Return the cached NameIndex for ``table``, rebuilding it if stale."""
+    version = _db_version(conn)
+    cached = _name_indexes.get(table)
+    if cached and cached[0] is conn and cached[1] == version:
+        return cached[2]
+    rows = conn.execute(f"SELECT id, name FROM {table} ORDER BY id").fetchall()
+    index = NameIndex([(r[0], r[1]) for r in rows])
+    _name_indexes[table] = (conn, version, index)
+    return index
+
+
+# ── Fuzzy Suggestions ─────────────────────────────────────────────────
+
+# Below this many names difflib over the full list is fast enough and exact.
+FUZZY_INDEX_MIN = 2000
+FUZZY_CANDIDATES = 100
+
+
+def trigrams(text: str) -> set[str]:
+    padded = f"  {text.lower()} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    """Inverted index from character trigrams to row indexes.
+
+    Only used to pick a shortlist of candidates; the final ranking is still
+    done by difflib so suggestions read the same as before.
+    """
+
+    def __init__(self, names: list[str]) -> None:
+        postings: dict[str, list[int]] = {}
+        self.sizes = array("i")
+        for i, name in enumerate(names):
+            grams = trigrams(name)
+            self.sizes.append(len(grams))
+            for gram in grams:
+                postings.setdefault(gram, []).append(i)
+        self.postings = {g: array("i", ids) for g, ids in postings.items()}
+
+    def to_data(self) -> dict:
+        """Plain data for the cache file; no classes, so any process can read it."""
+        return {
+            "sizes": self.sizes.tobytes(),
+            "postings": {g: ids.tobytes() for g, ids in self.postings.items()},
+        }
+
+    @classmethod
+    def from_data(cls, data: dict) -> "TrigramIndex":
+        index = cls.__new__(cls)
+        index.sizes = array("i", data["sizes"])
+        index.postings = {g: array("i", ids) for g, ids in data["postings"].items()}
+        return index
+
+    def candidates(self, query: str, limit: int = FUZZY_CANDIDATES) -> list[int]:
+        """Row indexes with the highest trigram Dice similarity to ``query``."""
+        grams = trigrams(query)
+        counts = Counter(itertools.chain.from_iterable(
+            self.postings.get(g, ()) for g in grams
+        ))
+        n = len(grams)
+        sizes = self.sizes
+        best = heapq.nlargest(
+            limit, counts.items(), key=lambda kv: kv[1] / (n + sizes[kv[0]])
+        )
+        return [i for i, _ in best]
+
+
+def _cache_dir() -> Path:
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "openwo"
+
+
+def _db_file(conn: sqlite3.Connection) -> str:
+    """Filesystem path of the main database, or "" for in-memory databases."""
+    return conn.execute("PRAGMA database_list").fetchone()[2] or ""
+
+
+def _trigram_cache_path(conn: sqlite3.Connection, table: str) -> Path | None:
+    db_file = _db_file(conn)
+    if not db_file:
+        return None
+    key = hashlib.sha1(db_file.encode()).hexdigest()[:16]
+    return _cache_dir() / f"{key}-{table}.trigrams"
+
+
+def trigram_index(conn: sqlite3.Connection, table: str, index: NameIndex) -> TrigramIndex:
+    """Load the trigram index for ``table`` from the local cache or build it.
+
+    The cache lives outside the iCloud container and is keyed on a
+    fingerprint of the names, so any rename, insert or delete rebuilds it.
+    """
+    if index.trigrams is not None:
+        return index.trigrams
+    index.trigrams = _load_trigram_index(conn, table, index)
+    return index.trigrams
+
+
+def _load_trigram_index(conn: sqlite3.Connection, table: str, index: NameIndex) -> TrigramIndex:
+    path = _trigram_cache_path(conn, table)
+    fingerprint = index.fingerprint()
+    if path and path.exists():
+        try:
+            cached = marshal.loads(path.read_bytes())
+            if cached["fingerprint"] == fingerprint:
+                return TrigramIndex.from_data(cached)
+        except Exception:
+            pass  # unreadable, truncated or from an older version: a cache miss
+    trigram = TrigramIndex(index.names)
+    if path:
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # A unique temp name, as fleet workers may write the same cache at once
+            with tempfile.NamedTemporaryFile(dir=path.parent, suffix=".tmp", delete=False) as f:
+                f.write(marshal.dumps({"fingerprint": fingerprint, **trigram.to_data()}))
+            Path(f.name).replace(path)
+        except OSError:
+            pass
+    return trigram
+
+
+def suggest_names(conn: sqlite3.Connection, table: str, index: NameIndex, query: str) -> list[str]:
+    """Up to three "Did you mean" names for ``query``."""
+    if len(index.names) < FUZZY_INDEX_MIN:
+        return difflib.get_close_matches(query, index.names, n=3, cutoff=0.4)
+    shortlist = trigram_index(conn, table, index).candidates(query)
+    names = [index.names[i] for i in shortlist]
+    return difflib.get_close_matches(query, names, n=3, cutoff=0.4)
 
 
 # ── Exercise Resolution ──────────────────────────────────────────────
 
-def resolve_exercise(conn: sqlite3.Connection, query: str) -> sqlite3.Row:
-    """Resolve a query string to exactly one exercise row."""
-    rows = conn.execute("SELECT * FROM exercise").fetchall()
+def _resolve(conn: sqlite3.Connection, table: str, query: str) -> sqlite3.Row:
+    """Resolve ``query`` to one row: exact, then unique substring, else die."""
+    with phase("resolve"):
+        return _resolve_row(conn, table, query)
+
+
+def _resolve_row(conn: sqlite3.Connection, table: str, query: str) -> sqlite3.Row:
+    index = name_index(conn, table)
     q = query.lower()
 
     # Exact match (case-insensitive)
-    exact = [r for r in rows if r["name"].lower() == q]
+    exact = index.find_exact(q)
     if len(exact) == 1:
-        return exact[0]
+        return conn.execute(
+            f"SELECT * FROM {table} WHERE id = ?", (index.ids[exact[0]],)
+        ).fetchone()
 
     # Substring match
-    subs = [r for r in rows if q in r["name"].lower()]
+    subs = index.find_substring(q)
     if len(subs) == 1:
-        return subs[0]
+        return conn.execute(
+            f"SELECT * FROM {table} WHERE id = ?", (index.ids[subs[0]],)
+        ).fetchone()
     if len(subs) > 1:
         die(
-            f"Ambiguous exercise \"{query}\" — matches:\n"
-            + "\n".join(f"  - {r['name']}" for r in subs)
+            f"Ambiguous {table} \"{query}\" — matches:\n"
+            + "\n".join(f"  - {index.names[i]}" for i in subs)
         )
 
     # No match — suggest closest
-    names = [r["name"] for r in rows]
-    close = difflib.get_close_matches(query, names, n=3, cutoff=0.4)
-    msg = f"No exercise matching \"{query}\"."
+    close = suggest_names(conn, table, index, query)
+    msg = f"No {table} matching \"{query}\"."
     if close:
         msg += "\nDid you mean:\n" + "\n".join(f"  - {n}" for n in close)
     die(msg)
 
 
+def resolve_exercise(conn: sqlite3.Connection, query: str) -> sqlite3.Row:
+    """Resolve a query string to exactly one exercise row."""
+    return _resolve(conn, "exercise", query)
+
+
 def resolve_workout(conn: sqlite3.Connection, query: str) -> sqlite3.Row:
     """Resolve a query string to exactly one workout row."""
-    rows = conn.execute("SELECT * FROM workout").fetchall()
-    q = query.lower()
+    return _resolve(conn, "workout", query)
 
-    exact = [r for r in rows if r["name"].lower() == q]
-    if len(exact) == 1:
-        return exact[0]
 
-    subs = [r for r in rows if q in r["name"].lower()]
-    if len(subs) == 1:
-        return subs[0]
-    if len(subs) > 1:
-        die(
-            f"Ambiguous workout \"{query}\" — matches:\n"
-            + "\n".join(f"  - {r['name']}" for r in subs)
-        )
+# ── Catalog Search ────────────────────────────────────────────────────
 
-    names = [r["name"] for r in rows]
-    close = difflib.get_close_matches(query, names, n=3, cutoff=0.4)
-    msg = f"No workout matching \"{query}\"."
-    if close:
-        msg += "\nDid you mean:\n" + "\n".join(f"  - {n}" for n in close)
-    die(msg)
+# External-content FTS5 index over the exercise catalog, kept current by
+# triggers so rows written by the app are indexed too. Muscles are indexed
+# from their JSON text; the tokenizer drops the brackets and quotes. The
+# index is created by migration 4; until then searches fall back to LIKE.
 
+SEARCH_COLUMNS = (
+    "name", "tip", "instructions", "equipment", "primaryMuscles", "secondaryMuscles",
+)
+# bm25 column weights, in SEARCH_COLUMNS order: name hits rank first
+SEARCH_WEIGHTS = (10.0, 1.0, 0.5, 2.0, 3.0, 1.5)
 
-# ── Helpers ───────────────────────────────────────────────────────────
+_EXERCISE_COLUMNS = """
+    e.id, e.name, e.equipment, e.primaryMuscles, e.secondaryMuscles,
+    e.level, e.category, e.force, e.mechanic
+"""
 
-def die(msg: str) -> NoReturn:
-    print(f"Error: {msg}", file=sys.stderr)
-    sys.exit(1)
 
+def _search_triggers() -> str:
+    cols = ", ".join(SEARCH_COLUMNS)
+    new = ", ".join(f"new.{c}" for c in SEARCH_COLUMNS)
+    old = ", ".join(f"old.{c}" for c in SEARCH_COLUMNS)
+    return f"""
+        CREATE TRIGGER exerciseSearch_ai AFTER INSERT ON exercise BEGIN
+            INSERT INTO exerciseSearch (rowid, {cols}) VALUES (new.id, {new});
+        END;
+        CREATE TRIGGER exerciseSearch_ad AFTER DELETE ON exercise BEGIN
+            INSERT INTO exerciseSearch (exerciseSearch, rowid, {cols})
+            VALUES ('delete', old.id, {old});
+        END;
+        CREATE TRIGGER exerciseSearch_au AFTER UPDATE ON exercise BEGIN
+            INSERT INTO exerciseSearch (exerciseSearch, rowid, {cols})
+            VALUES ('delete', old.id, {old});
+            INSERT INTO exerciseSearch (rowid, {cols}) VALUES (new.id, {new});
+        END;
+    """
 
-def format_counter(unit: str, value: int) -> str:
-    if unit == "timer":
-        m, s = divmod(value, 60)
-        return f"{m}:{s:02d}"
-    return str(value)
 
+def _has_table(conn: sqlite3.Connection, name: str) -> bool:
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+    ).fetchone() is not None
 
-# ── Commands ──────────────────────────────────────────────────────────
 
-def cmd_show(conn: sqlite3.Connection, args: argparse.Namespace) -> None:
-    if args.workout:
-        workout = resolve_workout(conn, args.workout)
-        workouts = [workout]
-    else:
-        workouts = conn.execute("SELECT * FROM workout ORDER BY id").fetchall()
+def create_search_index(conn: sqlite3.Connection) -> bool:
+    """Create and fill the FTS5 index if missing. False if FTS5 is unavailable.
 
-    for w in workouts:
-        active_filter = "" if args.all else "AND we.isActive = 1"
-        rows = conn.execute(
+    Runs inside the caller's transaction.
+    """
+    if _has_table(conn, "exerciseSearch"):
+        return True
+    try:
+        conn.execute(
             f"""
-            SELECT e.name, we.position, we.sets, we.counterUnit, we.counterValue,
-                   we.counterLabel, we.restSeconds, we.hasWeight, we.isActive
-            FROM workoutExercise we
-            JOIN exercise e ON e.id = we.exerciseId
-            WHERE we.workoutId = ? {active_filter}
-            ORDER BY we.position
-            """,
-            (w["id"],),
-        ).fetchall()
+            CREATE VIRTUAL TABLE exerciseSearch USING fts5(
+                {", ".join(SEARCH_COLUMNS)},
+                content = 'exercise', content_rowid = 'id'
+            )
+            """
+        )
+    except sqlite3.OperationalError:
+        return False
+    for stmt in _search_triggers().split("END;")[:-1]:
+        conn.execute(stmt + "END;")
+    conn.execute("INSERT INTO exerciseSearch (exerciseSearch) VALUES ('rebuild')")
+    return True
 
-        print(f"\n{'='*60}")
-        print(f"  {w['name']}")
-        print(f"{'='*60}")
-        if not rows:
-            print("  (no exercises)")
-            continue
 
-        # Header
-        print(f"  {'#':<4} {'Exercise':<32} {'Sets':>4} {'Reps/Time':>10} {'Rest':>5} {'Wt':>3}")
-        print(f"  {'─'*4} {'─'*32} {'─'*4} {'─'*10} {'─'*5} {'─'*3}")
-        for r in rows:
-            active_mark = "" if r["isActive"] else " [inactive]"
-            counter_str = format_counter(r["counterUnit"], r["counterValue"])
-            if r["counterLabel"]:
-                counter_str = r["counterLabel"]
-            wt = "Y" if r["hasWeight"] else ""
-            print(
-                f"  {r['position']:<4} {r['name'] + active_mark:<32} "
-                f"{r['sets']:>4} {counter_str:>10} "
-                f"{r['restSeconds']:>4}s {wt:>3}"
-            )
-    print()
+def ensure_search_index(conn: sqlite3.Connection) -> bool:
+    """create_search_index() in its own transaction."""
+    if _has_table(conn, "exerciseSearch"):
+        return True
+    conn.execute("BEGIN")
+    try:
+        created = create_search_index(conn)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return created
 
 
-def cmd_exercises(conn: sqlite3.Connection, args: argparse.Namespace) -> None:
-    conditions = ["1=1"]
-    params: list = []
+def fts_query(text: str) -> str | None:
+    """Turn free text into an FTS5 query: every word, as a prefix, must match."""
+    words = re.findall(r"\w+", text.lower())
+    if not words:
+        return None
+    return " ".join(f'"{w}"*' for w in words)
 
-    if args.query:
+
+def search_exercises(
+    conn: sqlite3.Connection, query: str | None, muscle: str | None, equipment: str | None,
+) -> list[sqlite3.Row]:
+    """Ranked catalog search through the FTS5 index."""
+    lookup = lookup_conditions(conn, muscle, equipment)
+    if lookup is None:
+        return []
+    conditions, params = lookup
+    match = fts_query(query) if query else None
+    if not match:
+        where = " AND ".join(conditions) or "1=1"
+        return conn.execute(
+            f"SELECT {_EXERCISE_COLUMNS} FROM exercise e WHERE {where} ORDER BY e.name",
+            params,
+        ).fetchall()
+    weights = ", ".join(str(w) for w in SEARCH_WEIGHTS)
+    return conn.execute(
+        f"""
+        SELECT {_EXERCISE_COLUMNS}
+        FROM exerciseSearch s
+        JOIN exercise e ON e.id = s.rowid
+        WHERE {" AND ".join(["exerciseSearch MATCH ?", *conditions])}
+        ORDER BY bm25(exerciseSearch, {weights}), e.name
+        """,
+        [match, *params],
+    ).fetchall()
+
+
+def filter_exercises(
+    conn: sqlite3.Connection, query: str | None, muscle: str | None, equipment: str | None,
+) -> list[sqlite3.Row]:
+    """Substring name filtering for SQLite builds without FTS5."""
+    lookup = lookup_conditions(conn, muscle, equipment)
+    if lookup is None:
+        return []
+    conditions, params = lookup
+    if query:
         conditions.append("LOWER(e.name) LIKE ?")
-        params.append(f"%{args.query.lower()}%")
-    if args.muscle:
-        conditions.append(
-            "(LOWER(e.primaryMuscles) LIKE ? OR LOWER(e.secondaryMuscles) LIKE ?)"
-        )
-        params.extend([f"%{args.muscle.lower()}%"] * 2)
-    if args.equipment:
-        conditions.append("LOWER(e.equipment) LIKE ?")
-        params.append(f"%{args.equipment.lower()}%")
+        params.append(f"%{query.lower()}%")
 
-    where = " AND ".join(conditions)
-    rows = conn.execute(
+    where = " AND ".join(conditions) or "1=1"
+    return conn.execute(
         f"""
-        SELECT e.id, e.name, e.equipment, e.primaryMuscles, e.secondaryMuscles,
-               e.level, e.category, e.force, e.mechanic
+        SELECT {_EXERCISE_COLUMNS}
         FROM exercise e
         WHERE {where}
         ORDER BY e.name
@@ -219,379 +1016,3196 @@ def cmd_exercises(conn: sqlite3.Connection, args: argparse.Namespace) -> None:
         params,
     ).fetchall()
 
-    if not rows:
-        print("No exercises found.")
+
+# ── Muscle / Equipment Lookups ────────────────────────────────────────
+
+# exercise.primaryMuscles/secondaryMuscles hold JSON arrays and equipment a
+# free-form string. These derived tables hold one lowercased row per link so
+# filters and analytics can use indexed joins instead of LIKE over JSON.
+# They are created by migration 3, kept current by triggers on exercise (so
+# rows the app writes are covered too; migration 6 adds them to older
+# tables) and can be rebuilt with `openwo rebuild-lookups`.
+
+LOOKUP_SCHEMA = """
+    CREATE TABLE exerciseMuscle (
+        exerciseId INTEGER NOT NULL REFERENCES exercise(id) ON DELETE CASCADE,
+        muscle TEXT NOT NULL,
+        isPrimary BOOLEAN NOT NULL,
+        PRIMARY KEY (muscle, exerciseId, isPrimary)
+    ) WITHOUT ROWID;
+    CREATE INDEX exerciseMuscle_exerciseId ON exerciseMuscle(exerciseId);
+    CREATE TABLE exerciseEquipment (
+        exerciseId INTEGER NOT NULL REFERENCES exercise(id) ON DELETE CASCADE,
+        equipment TEXT NOT NULL,
+        PRIMARY KEY (equipment, exerciseId)
+    ) WITHOUT ROWID;
+    CREATE INDEX exerciseEquipment_exerciseId ON exerciseEquipment(exerciseId);
+"""
+
+
+# Read-only stand-ins for the lookup tables, derived straight from the
+# exercise rows, for databases that have not been migrated yet.
+LOOKUP_VIEWS = {
+    "exerciseMuscle": """(
+        SELECT e.id AS exerciseId, LOWER(TRIM(j.value)) AS muscle
+        FROM exercise e, json_each(e.primaryMuscles) j
+        WHERE json_valid(e.primaryMuscles) AND TRIM(j.value) != ''
+        UNION
+        SELECT e.id, LOWER(TRIM(j.value))
+        FROM exercise e, json_each(e.secondaryMuscles) j
+        WHERE json_valid(e.secondaryMuscles) AND TRIM(j.value) != ''
+    )""",
+    "exerciseEquipment": """(
+        SELECT id AS exerciseId, LOWER(TRIM(equipment)) AS equipment
+        FROM exercise WHERE TRIM(IFNULL(equipment, '')) != ''
+    )""",
+}
+
+
+def _lookup_inserts(row: str) -> str:
+    """Statements adding the lookup rows of the exercise ``row`` (new/old)."""
+    muscles = "".join(
+        f"""
+            INSERT OR IGNORE INTO exerciseMuscle (exerciseId, muscle, isPrimary)
+            SELECT {row}.id, LOWER(TRIM(j.value)), {is_primary}
+            FROM json_each(CASE WHEN json_valid({row}.{column}) THEN {row}.{column} END) j
+            WHERE TRIM(j.value) != '';"""
+        for column, is_primary in (("primaryMuscles", 1), ("secondaryMuscles", 0))
+    )
+    return muscles + f"""
+            INSERT OR IGNORE INTO exerciseEquipment (exerciseId, equipment)
+            SELECT {row}.id, LOWER(TRIM({row}.equipment))
+            WHERE TRIM(IFNULL({row}.equipment, '')) != '';"""
+
+
+def _lookup_triggers() -> str:
+    deletes = """
+            DELETE FROM exerciseMuscle WHERE exerciseId = old.id;
+            DELETE FROM exerciseEquipment WHERE exerciseId = old.id;"""
+    return f"""
+        CREATE TRIGGER exerciseLookup_ai AFTER INSERT ON exercise BEGIN{_lookup_inserts("new")}
+        END;
+        CREATE TRIGGER exerciseLookup_ad AFTER DELETE ON exercise BEGIN{deletes}
+        END;
+        CREATE TRIGGER exerciseLookup_au
+        AFTER UPDATE OF id, primaryMuscles, secondaryMuscles, equipment ON exercise
+        BEGIN{deletes}{_lookup_inserts("new")}
+        END;
+    """
+
+
+def lookups_maintained(conn: sqlite3.Connection) -> bool:
+    """Whether the lookup tables exist and are kept current by their triggers."""
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'exerciseLookup_ai'"
+    ).fetchone() is not None
+
+
+def create_lookup_tables(conn: sqlite3.Connection) -> None:
+    """Create and fill the lookup tables and their triggers if missing.
+
+    Tables from before the triggers are refilled, since the app may have
+    written exercises since. Runs inside the caller's transaction.
+    """
+    if lookups_maintained(conn):
+        return
+    if not _has_table(conn, "exerciseMuscle"):
+        for stmt in LOOKUP_SCHEMA.split(";"):
+            if stmt.strip():
+                conn.execute(stmt)
+    for stmt in _lookup_triggers().split("END;")[:-1]:
+        conn.execute(stmt + "END;")
+    sync_lookups(conn)
+
+
+def ensure_lookup_tables(conn: sqlite3.Connection) -> None:
+    """create_lookup_tables() in its own transaction."""
+    if lookups_maintained(conn):
         return
+    conn.execute("BEGIN")
+    try:
+        create_lookup_tables(conn)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def sync_lookups(conn: sqlite3.Connection, ids: list[int] | None = None) -> None:
+    """Recompute lookup rows for ``ids`` (every exercise if None).
+
+    Runs inside the caller's transaction.
+    """
+    if ids is None:
+        scope, params = "1=1", []
+        conn.execute("DELETE FROM exerciseMuscle")
+        conn.execute("DELETE FROM exerciseEquipment")
+    else:
+        scope, params = "e.id IN (SELECT value FROM json_each(?))", [json.dumps(ids)]
+        for table in ("exerciseMuscle", "exerciseEquipment"):
+            conn.execute(
+                f"DELETE FROM {table} WHERE exerciseId IN (SELECT value FROM json_each(?))",
+                params,
+            )
+    for column, is_primary in (("primaryMuscles", 1), ("secondaryMuscles", 0)):
+        conn.execute(
+            f"""
+            INSERT OR IGNORE INTO exerciseMuscle (exerciseId, muscle, isPrimary)
+            SELECT e.id, LOWER(TRIM(j.value)), {is_primary}
+            FROM exercise e, json_each(e.{column}) j
+            WHERE {scope} AND json_valid(e.{column}) AND TRIM(j.value) != ''
+            """,
+            params,
+        )
+    conn.execute(
+        f"""
+        INSERT OR IGNORE INTO exerciseEquipment (exerciseId, equipment)
+        SELECT e.id, LOWER(TRIM(e.equipment))
+        FROM exercise e
+        WHERE {scope} AND TRIM(IFNULL(e.equipment, '')) != ''
+        """,
+        params,
+    )
+
+
+def match_vocabulary(values: list[str], text: str) -> list[str]:
+    """Values in which every word of ``text`` starts some word."""
+    words = re.findall(r"\w+", text.lower())
+    return [
+        v for v in values
+        if all(any(t.startswith(w) for t in re.findall(r"\w+", v)) for w in words)
+    ]
+
+
+def lookup_conditions(
+    conn: sqlite3.Connection, muscle: str | None, equipment: str | None,
+) -> tuple[list[str], list] | None:
+    """SQL conditions on ``e.id`` for the muscle/equipment filters.
+
+    Filters are matched against the small vocabulary of known values first,
+    so "back" selects both "lower back" and "middle back" through the index.
+    Returns None when a filter matches no known value.
+    """
+    conditions: list[str] = []
+    params: list = []
+    if not muscle and not equipment:
+        return conditions, params
+    for text, table, column in (
+        (muscle, "exerciseMuscle", "muscle"),
+        (equipment, "exerciseEquipment", "equipment"),
+    ):
+        if not text:
+            continue
+        if not lookups_maintained(conn):
+            table = LOOKUP_VIEWS[table]
+        vocab = [r[0] for r in conn.execute(f"SELECT DISTINCT {column} FROM {table}")]
+        values = match_vocabulary(vocab, text)
+        if not values:
+            return None
+        marks = ", ".join("?" * len(values))
+        conditions.append(
+            f"e.id IN (SELECT exerciseId FROM {table} WHERE {column} IN ({marks}))"
+        )
+        params.extend(values)
+    return conditions, params
+
+
+def cmd_rebuild_lookups(conn: sqlite3.Connection, args: argparse.Namespace) -> None:
+    ensure_lookup_tables(conn)
+    conn.execute("BEGIN")
+    try:
+        sync_lookups(conn)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    muscles = conn.execute("SELECT COUNT(*) FROM exerciseMuscle").fetchone()[0]
+    equipment = conn.execute("SELECT COUNT(*) FROM exerciseEquipment").fetchone()[0]
+    print(f"Indexed {muscles} muscle link(s) and {equipment} equipment link(s).")
+
+
+# ── Helpers ───────────────────────────────────────────────────────────
+
+def die(msg: str) -> NoReturn:
+    print(f"Error: {msg}", file=sys.stderr)
+    sys.exit(1)
+
+
+def format_bytes(n: float) -> str:
+    for unit in ("B", "KB", "MB"):
+        if n < 1024:
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} GB"
+
+
+def format_counter(unit: str, value: int) -> str:
+    if unit == "timer":
+        m, s = divmod(value, 60)
+        return f"{m}:{s:02d}"
+    return str(value)
+
+
+def write_records(
+    records: Iterable[dict], fmt: str, out: IO[str], fields: list[str],
+) -> int:
+    """Stream dicts as ndjson, csv or a json array. Returns the record count."""
+    n = 0
+    if fmt == "csv":
+        writer = csv.DictWriter(out, fieldnames=fields, extrasaction="ignore")
+        writer.writeheader()
+        for n, rec in enumerate(records, 1):
+            writer.writerow(rec)
+    elif fmt == "json":
+        out.write("[")
+        for n, rec in enumerate(records, 1):
+            out.write(("," if n > 1 else "") + "\n  " + json.dumps(rec))
+        out.write("\n]\n" if n else "]\n")
+    else:
+        for n, rec in enumerate(records, 1):
+            out.write(json.dumps(rec) + "\n")
+    return n
+
+
+# ── Profiling ─────────────────────────────────────────────────────────
+
+# --profile / --trace-sql. Wall time is split into phases (innermost phase
+# wins, so each is self time); transactions are recognised from the traced
+# BEGIN/COMMIT/ROLLBACK. SQLite only reports when a statement starts, so a
+# statement's time runs until the next statement or phase change and
+# includes the Python code consuming its rows.
+
+SQL_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|\bNULL\b")
+SQL_PARAM_LISTS = re.compile(r"\?(?:\s*,\s*\?)+")
+PROFILE_TOP_STATEMENTS = 15
+
+
+def normalize_sql(sql: str) -> str:
+    """Statement text with literals replaced by ``?``, for grouping expanded SQL."""
+    sql = SQL_PARAM_LISTS.sub("?, ...", SQL_LITERALS.sub("?", sql))
+    return " ".join(sql.split())
+
+
+def percentile(values: list[float], pct: int) -> float:
+    """Nearest-rank percentile of ``values`` (non-empty)."""
+    ordered = sorted(values)
+    return ordered[max(0, -(-len(ordered) * pct // 100) - 1)]
+
+
+class Profiler:
+    def __init__(self, echo_sql: bool = False) -> None:
+        self.echo_sql = echo_sql
+        self.phases: dict[str, float] = {}
+        self.calls: Counter[str] = Counter()
+        self.statements: dict[str, list[float]] = {}
+        self.stack = ["other"]
+        self.start = self.mark = time.perf_counter()
+        self.total = 0.0
+        self.open: tuple[str, float] | None = None
+
+    def attach(self, conn: sqlite3.Connection) -> None:
+        conn.set_trace_callback(self._on_statement)
+
+    def _account(self, now: float) -> None:
+        name = self.stack[-1]
+        self.phases[name] = self.phases.get(name, 0.0) + now - self.mark
+        self.mark = now
+
+    def _enter(self, name: str, now: float) -> None:
+        self._account(now)
+        self.stack.append(name)
+        self.calls[name] += 1
+
+    def _exit(self, name: str, now: float) -> None:
+        self._account(now)
+        if name in self.stack[1:]:
+            del self.stack[len(self.stack) - 1 - self.stack[::-1].index(name)]
+
+    def _close_statement(self, now: float) -> None:
+        if self.open is None:
+            return
+        sql, started = self.open
+        self.open = None
+        self.statements.setdefault(sql, []).append(now - started)
+        if sql.startswith(("COMMIT", "ROLLBACK", "END")):
+            self._exit("transaction", now)
+
+    def _on_statement(self, sql: str) -> None:
+        now = time.perf_counter()
+        self._close_statement(now)
+        if self.echo_sql:
+            print(f"[sql] {' '.join(sql.split())}", file=sys.stderr)
+        key = normalize_sql(sql)
+        if key.upper().startswith("BEGIN"):
+            self._enter("transaction", now)
+        self.open = (key, now)
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        now = time.perf_counter()
+        self._close_statement(now)
+        self._enter(name, now)
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            self._close_statement(now)
+            self._exit(name, now)
+
+    def finish(self) -> None:
+        now = time.perf_counter()
+        self._close_statement(now)
+        self._account(now)
+        self.total = now - self.start
+
+    def statement_summary(self) -> list[dict]:
+        rows = [
+            {"sql": sql, "count": len(times), "totalMs": sum(times) * 1e3,
+             "p95Ms": percentile(times, 95) * 1e3}
+            for sql, times in self.statements.items()
+        ]
+        return sorted(rows, key=lambda r: -r["totalMs"])
+
+    def to_json(self, argv: list[str]) -> dict:
+        return {
+            "argv": argv,
+            "totalMs": self.total * 1e3,
+            "phases": [
+                {"name": name, "ms": t * 1e3, "calls": self.calls[name]}
+                for name, t in sorted(self.phases.items(), key=lambda kv: -kv[1])
+            ],
+            "statements": self.statement_summary(),
+        }
+
+    def report(self, out: IO[str], phases: bool = True) -> None:
+        if phases:
+            out.write(f"\n{'Phase':<14} {'ms':>10} {'%':>6} {'calls':>6}\n")
+            for name, t in sorted(self.phases.items(), key=lambda kv: -kv[1]):
+                share = 100 * t / self.total if self.total else 0.0
+                out.write(f"{name:<14} {t * 1e3:>10.2f} {share:>5.1f}% {self.calls[name]:>6}\n")
+            out.write(f"{'total':<14} {self.total * 1e3:>10.2f}\n")
+        rows = self.statement_summary()
+        out.write(f"\n{len(rows)} distinct statement(s), {sum(r['count'] for r in rows)} executed\n")
+        out.write(f"{'count':>6} {'total ms':>10} {'p95 ms':>9}  SQL\n")
+        for r in rows[:PROFILE_TOP_STATEMENTS]:
+            sql = r["sql"] if len(r["sql"]) <= 80 else r["sql"][:77] + "..."
+            out.write(f"{r['count']:>6} {r['totalMs']:>10.2f} {r['p95Ms']:>9.3f}  {sql}\n")
+
+
+class _PhaseWriter:
+    """stdout proxy that books writes to the "output" phase."""
+
+    def __init__(self, out: IO[str], profiler: Profiler) -> None:
+        self._out = out
+        self._profiler = profiler
+
+    def write(self, s: str) -> int:
+        with self._profiler.phase("output"):
+            return self._out.write(s)
+
+    def __getattr__(self, name: str):
+        return getattr(self._out, name)
+
+
+_profiler: Profiler | None = None
+_cprofile = None
+
+
+def phase(name: str) -> ContextManager[None]:
+    """Time the block as ``name`` when profiling; a no-op otherwise."""
+    return _profiler.phase(name) if _profiler is not None else nullcontext()
+
+
+def profiling_requested(args: argparse.Namespace) -> bool:
+    return bool(args.profile or args.trace_sql or args.profile_json or args.cprofile)
+
+
+def start_profiling(args: argparse.Namespace) -> Profiler | None:
+    global _profiler, _cprofile
+    if not profiling_requested(args):
+        return None
+    _profiler = Profiler(echo_sql=args.trace_sql)
+    sys.stdout = _PhaseWriter(sys.stdout, _profiler)
+    if args.cprofile:
+        import cProfile
+        _cprofile = cProfile.Profile()
+        _cprofile.enable()
+    return _profiler
+
+
+def stop_profiling(args: argparse.Namespace, argv: list[str]) -> None:
+    global _profiler, _cprofile
+    profiler, _profiler = _profiler, None
+    if profiler is None:
+        return
+    if _cprofile is not None:
+        _cprofile.disable()
+        _cprofile.dump_stats(args.cprofile)
+        _cprofile = None
+    profiler.finish()
+    if isinstance(sys.stdout, _PhaseWriter):
+        sys.stdout = sys.stdout._out
+    if args.profile or args.trace_sql:
+        profiler.report(sys.stderr, phases=args.profile)
+    if args.profile_json:
+        Path(args.profile_json).write_text(json.dumps(profiler.to_json(argv), indent=2) + "\n")
+    if args.cprofile:
+        print(f"cProfile stats written to {args.cprofile} (python -m pstats)", file=sys.stderr)
+
+
+# ── Commands ──────────────────────────────────────────────────────────
+
+SHOW_FIELDS = [
+    "workoutId", "workout", "position", "exerciseId", "exercise", "sets",
+    "counterUnit", "counterValue", "counterLabel", "restSeconds", "hasWeight",
+    "isActive",
+]
+
+
+def iter_show(
+    conn: sqlite3.Connection, workout_id: int | None = None, include_inactive: bool = False,
+) -> Iterator[dict]:
+    """Yield every workout's exercises from one query, ordered by workout and position.
+
+    Workouts with no (active) exercises yield a single record whose exercise
+    fields are None, so callers can still list them.
+    """
+    active = "" if include_inactive else "AND we.isActive = 1"
+    where, params = ("WHERE w.id = ?", (workout_id,)) if workout_id is not None else ("", ())
+    # Plain tuples zipped into dicts; sqlite3.Row -> dict costs more than the query
+    cur = conn.cursor()
+    cur.row_factory = None
+    cur.execute(
+        f"""
+        SELECT w.id AS workoutId, w.name AS workout, we.position, e.id AS exerciseId,
+               e.name AS exercise, we.sets, we.counterUnit, we.counterValue,
+               we.counterLabel, we.restSeconds, we.hasWeight, we.isActive
+        FROM workout w
+        LEFT JOIN workoutExercise we ON we.workoutId = w.id {active}
+        LEFT JOIN exercise e ON e.id = we.exerciseId
+        {where}
+        ORDER BY w.id, we.position
+        """,
+        params,
+    )
+    names = [d[0] for d in cur.description]
+    for r in cur:
+        rec = dict(zip(names, r))
+        if rec["exerciseId"] is not None:
+            rec["hasWeight"] = bool(rec["hasWeight"])
+            rec["isActive"] = bool(rec["isActive"])
+        yield rec
+
+
+def format_show(workout: str, recs: list[dict]) -> str:
+    lines = [f"\n{'='*60}", f"  {workout}", f"{'='*60}"]
+    if recs[0]["exerciseId"] is None:
+        lines.append("  (no exercises)")
+        return "\n".join(lines) + "\n"
+    lines.append(f"  {'#':<4} {'Exercise':<32} {'Sets':>4} {'Reps/Time':>10} {'Rest':>5} {'Wt':>3}")
+    lines.append(f"  {'─'*4} {'─'*32} {'─'*4} {'─'*10} {'─'*5} {'─'*3}")
+    for r in recs:
+        active_mark = "" if r["isActive"] else " [inactive]"
+        counter_str = r["counterLabel"] or format_counter(r["counterUnit"], r["counterValue"])
+        wt = "Y" if r["hasWeight"] else ""
+        lines.append(
+            f"  {r['position']:<4} {r['exercise'] + active_mark:<32} "
+            f"{r['sets']:>4} {counter_str:>10} "
+            f"{r['restSeconds']:>4}s {wt:>3}"
+        )
+    return "\n".join(lines) + "\n"
+
+
+def cmd_show(conn: sqlite3.Connection, args: argparse.Namespace) -> None:
+    workout_id = resolve_workout(conn, args.workout)["id"] if args.workout else None
+    recs = iter_show(conn, workout_id, args.all)
+    out = sys.stdout
+
+    if args.format != "table":
+        write_records(
+            (r for r in recs if r["exerciseId"] is not None), args.format, out, SHOW_FIELDS,
+        )
+        return
+
+    # One write per workout block instead of one per row
+    for (_, name), group in itertools.groupby(recs, key=lambda r: (r["workoutId"], r["workout"])):
+        out.write(format_show(name, list(group)))
+    out.write("\n")
+
+
+def cmd_exercises(conn: sqlite3.Connection, args: argparse.Namespace) -> None:
+    if _has_table(conn, "exerciseSearch"):
+        rows = search_exercises(conn, args.query, args.muscle, args.equipment)
+    else:
+        rows = filter_exercises(conn, args.query, args.muscle, args.equipment)
+
+    if not rows:
+        print("No exercises found.")
+        return
+
+    print(f"\n{'ID':>4}  {'Name':<35} {'Equipment':<15} {'Muscles':<25} {'Level':<12}")
+    print(f"{'─'*4}  {'─'*35} {'─'*15} {'─'*25} {'─'*12}")
+    for r in rows:
+        muscles = r["primaryMuscles"] or ""
+        print(
+            f"{r['id']:>4}  {r['name']:<35} {(r['equipment'] or ''):<15} "
+            f"{muscles:<25} {(r['level'] or ''):<12}"
+        )
+    print(f"\n{len(rows)} exercise(s) found.")
+
+
+# ── Journal ───────────────────────────────────────────────────────────
+
+# Edits record the rows they change in an append-only journal inside the
+# database, as JSON before/after images written in the same transaction as
+# the edit. `openwo undo` reverses operations from those images row by row,
+# so anything written since (logged sets, new sessions) survives, unlike a
+# snapshot restore. The images are captured by TEMP triggers that exist
+# only while a journaled operation runs.
+
+JOURNAL_SCHEMA = """
+    CREATE TABLE operation (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        createdAt TEXT NOT NULL,
+        command TEXT NOT NULL,
+        summary TEXT NOT NULL,
+        undoes INTEGER REFERENCES operation(id)
+    );
+    CREATE TABLE operationRow (
+        id INTEGER PRIMARY KEY,
+        operationId INTEGER NOT NULL REFERENCES operation(id),
+        tableName TEXT NOT NULL,
+        rowId INTEGER NOT NULL,
+        before TEXT,  -- json_object of the row, NULL if the operation inserted it
+        after TEXT    -- NULL if the operation deleted it
+    );
+    CREATE INDEX operationRow_operationId ON operationRow(operationId);
+"""
+
+# Journaled table -> (assignment parking a row clear of unique constraints,
+# rows whose references make deleting one unsafe)
+JOURNAL_TABLES: dict[str, tuple[str | None, tuple[tuple[str, str], ...]]] = {
+    "exercise": (None, (("workoutExercise", "exerciseId"),)),
+    "workoutExercise": ("position = -id", (("exerciseLog", "workoutExerciseId"),)),
+}
+
+
+def create_journal_tables(conn: sqlite3.Connection) -> None:
+    """Create the journal tables if missing; runs inside the caller's transaction."""
+    if _has_table(conn, "operation"):
+        return
+    for stmt in JOURNAL_SCHEMA.split(";"):
+        if stmt.strip():
+            conn.execute(stmt)
+
+
+def _row_image(columns: list[str], alias: str) -> str:
+    """SQL for a json_object of ``columns`` of the row ``alias``."""
+    return "json_object(" + ", ".join(f"'{c}', {alias}.\"{c}\"" for c in columns) + ")"
+
+
+def _table_columns(conn: sqlite3.Connection, table: str) -> list[str]:
+    return [r[1] for r in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def _capture_triggers(conn: sqlite3.Connection) -> list[str]:
+    triggers = []
+    for table in JOURNAL_TABLES:
+        columns = _table_columns(conn, table)
+        old, new = _row_image(columns, "old"), _row_image(columns, "new")
+        for event, row_id, before, after in (
+            ("INSERT", "new.rowid", "NULL", new),
+            ("UPDATE", "old.rowid", old, new),
+            ("DELETE", "old.rowid", old, "NULL"),
+        ):
+            name = f"journal_{table}_{event.lower()}"
+            conn.execute(
+                f"""
+                CREATE TEMP TRIGGER {name} AFTER {event} ON main.{table} BEGIN
+                    INSERT INTO journalCapture (tableName, rowId, before, after)
+                    VALUES ('{table}', {row_id}, {before}, {after});
+                END
+                """
+            )
+            triggers.append(name)
+    return triggers
+
+
+@contextmanager
+def journal(
+    conn: sqlite3.Connection, command: str, summary: str,
+    operation: int | None = None, undoes: int | None = None,
+) -> Iterator[int]:
+    """Record the row changes made inside the block as one operation.
+
+    Runs inside the caller's transaction and yields the operation id; pass
+    ``operation`` to add to one started in an earlier transaction.
+    """
+    create_journal_tables(conn)
+    if operation is None:
+        operation = conn.execute(
+            "INSERT INTO operation (createdAt, command, summary, undoes) VALUES (?, ?, ?, ?)",
+            (datetime.now().isoformat(timespec="seconds"), command, summary, undoes),
+        ).lastrowid
+    conn.execute(
+        """
+        CREATE TEMP TABLE IF NOT EXISTS journalCapture (
+            seq INTEGER PRIMARY KEY, tableName TEXT, rowId INTEGER, before TEXT, after TEXT
+        )
+        """
+    )
+    triggers = _capture_triggers(conn)
+    try:
+        yield operation
+        # Collapse repeated changes to a row (a shift lifts, then drops it)
+        # into its first before and last after image
+        changes: dict[tuple[str, int], list] = {}
+        for table, row_id, before, after in conn.execute(
+            "SELECT tableName, rowId, before, after FROM journalCapture ORDER BY seq"
+        ):
+            if (table, row_id) in changes:
+                changes[table, row_id][1] = after
+            else:
+                changes[table, row_id] = [before, after]
+        conn.executemany(
+            """
+            INSERT INTO operationRow (operationId, tableName, rowId, before, after)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            [(operation, t, r, b, a) for (t, r), (b, a) in changes.items() if b != a],
+        )
+    finally:
+        for name in triggers:
+            conn.execute(f"DROP TRIGGER temp.{name}")
+        conn.execute("DELETE FROM journalCapture")
+
+
+def plan_summary(plan: dict) -> str:
+    """One-line description of an edit plan for the journal."""
+    return " ".join(line.strip() for line in plan["lines"][:2])
+
+
+def undoable_operations(conn: sqlite3.Connection, limit: int) -> list[sqlite3.Row]:
+    """The ``limit`` most recent operations not yet undone, newest first."""
+    return conn.execute(
+        """
+        SELECT * FROM operation
+        WHERE undoes IS NULL
+          AND id NOT IN (SELECT undoes FROM operation WHERE undoes IS NOT NULL)
+        ORDER BY id DESC LIMIT ?
+        """,
+        (limit,),
+    ).fetchall()
+
+
+def undo_conflicts(conn: sqlite3.Connection, rows: list[sqlite3.Row]) -> list[str]:
+    """Reasons the journaled ``rows`` cannot be put back as they were."""
+    conflicts = []
+    images = {table: _row_image(_table_columns(conn, table), "t") for table in JOURNAL_TABLES}
+    for r in rows:
+        table = r["tableName"]
+        current = conn.execute(
+            f"SELECT {images[table]} FROM {table} t WHERE rowid = ?", (r["rowId"],),
+        ).fetchone()
+        if (current[0] if current else None) != r["after"]:
+            conflicts.append(f"{table} {r['rowId']} has changed since")
+        elif r["before"] is None:
+            for child, column in JOURNAL_TABLES[table][1]:
+                if conn.execute(
+                    f"SELECT 1 FROM {child} WHERE {column} = ? LIMIT 1", (r["rowId"],),
+                ).fetchone():
+                    conflicts.append(f"{table} {r['rowId']} is referenced by {child}")
+    return conflicts
+
+
+def undo_operation(conn: sqlite3.Connection, op: sqlite3.Row) -> None:
+    """Put back the rows ``op`` changed, newest change first.
+
+    Runs inside the caller's transaction; dies listing the conflicts if any
+    row was changed again after ``op``.
+    """
+    rows = conn.execute(
+        "SELECT * FROM operationRow WHERE operationId = ? ORDER BY id DESC", (op["id"],),
+    ).fetchall()
+    if conflicts := undo_conflicts(conn, rows):
+        die(
+            f"Cannot undo operation {op['id']} ({op['summary']}):\n"
+            + "\n".join(f"  {c}" for c in conflicts)
+        )
+
+    # Park every surviving row first so restored positions cannot collide
+    for table, (park, _) in JOURNAL_TABLES.items():
+        ids = [r["rowId"] for r in rows if r["tableName"] == table and r["after"] is not None]
+        if park and ids:
+            conn.execute(
+                f"UPDATE {table} SET {park} WHERE rowid IN (SELECT value FROM json_each(?))",
+                (json.dumps(ids),),
+            )
+    for r in rows:
+        table = r["tableName"]
+        if r["before"] is None:
+            conn.execute(f"DELETE FROM {table} WHERE rowid = ?", (r["rowId"],))
+            continue
+        values = json.loads(r["before"])
+        columns = ", ".join(f'"{c}"' for c in values)
+        if r["after"] is None:
+            conn.execute(
+                f"INSERT INTO {table} ({columns}) VALUES ({', '.join('?' * len(values))})",
+                list(values.values()),
+            )
+        else:
+            conn.execute(
+                f"UPDATE {table} SET ({columns}) = ({', '.join('?' * len(values))}) WHERE rowid = ?",
+                [*values.values(), r["rowId"]],
+            )
+
+
+def _describe_change(r: sqlite3.Row) -> str:
+    if r["before"] is None:
+        return f"  + {r['tableName']} {r['rowId']}"
+    if r["after"] is None:
+        return f"  - {r['tableName']} {r['rowId']}"
+    before, after = json.loads(r["before"]), json.loads(r["after"])
+    changed = ", ".join(
+        f"{k} {before.get(k)} → {v}" for k, v in after.items() if before.get(k) != v
+    )
+    return f"  ~ {r['tableName']} {r['rowId']}: {changed}"
+
+
+def cmd_history(conn: sqlite3.Connection, args: argparse.Namespace) -> None:
+    if not _has_table(conn, "operation"):
+        print("No operations recorded.")
+        return
+
+    if args.id is not None:
+        op = conn.execute("SELECT * FROM operation WHERE id = ?", (args.id,)).fetchone()
+        if not op:
+            die(f"No operation with id {args.id}.")
+        print(f"\n{op['id']}  {op['createdAt']}  {op['command']}: {op['summary']}")
+        for r in conn.execute(
+            "SELECT * FROM operationRow WHERE operationId = ? ORDER BY id", (op["id"],),
+        ):
+            print(_describe_change(r))
+        return
+
+    ops = conn.execute(
+        """
+        SELECT o.*, (SELECT COUNT(*) FROM operationRow WHERE operationId = o.id) AS rows,
+               (SELECT MAX(u.id) FROM operation u WHERE u.undoes = o.id) AS undoneBy
+        FROM operation o ORDER BY o.id DESC LIMIT ?
+        """,
+        (args.limit,),
+    ).fetchall()
+    if not ops:
+        print("No operations recorded.")
+        return
+    print(f"\n{'ID':>4}  {'Created':<19} {'Command':<16} {'Rows':>6}  Summary")
+    print(f"{'─'*4}  {'─'*19} {'─'*16} {'─'*6}  {'─'*7}")
+    for op in reversed(ops):
+        status = f"  (undone by {op['undoneBy']})" if op["undoneBy"] else ""
+        print(
+            f"{op['id']:>4}  {op['createdAt']:<19} {op['command']:<16} "
+            f"{op['rows']:>6}  {op['summary']}{status}"
+        )
+
+
+def cmd_undo(conn: sqlite3.Connection, args: argparse.Namespace, db_path: Path) -> None:
+    if args.count < 1:
+        die("Count must be at least 1.")
+    ops = undoable_operations(conn, args.count) if _has_table(conn, "operation") else []
+    if not ops:
+        print("Nothing to undo.")
+        return
+    if len(ops) < args.count:
+        print(f"Only {len(ops)} operation(s) can be undone.")
+
+    print("\nUndo, newest first:")
+    for op in ops:
+        print(f"  {op['id']}  {op['createdAt']}  {op['command']}: {op['summary']}")
+
+    # A dry run rehearses on an in-memory copy, so conflicts are reported
+    # with the later operations already reversed.
+    if args.execute:
+        backup_db(db_path)
+        target = conn
+        target.execute("BEGIN")
+    else:
+        target = _snapshot(conn)
+    try:
+        for op in ops:
+            with journal(target, "undo", f"Undo {op['id']}: {op['summary']}", undoes=op["id"]):
+                undo_operation(target, op)
+        if args.execute:
+            target.commit()
+            print(f"\nUndid {len(ops)} operation(s).")
+        else:
+            print("\nDry run — pass --execute to apply.")
+    except BaseException:
+        target.rollback()
+        raise
+    finally:
+        if target is not conn:
+            target.close()
+
+
+# ── Positions ─────────────────────────────────────────────────────────
+
+# UNIQUE(workoutId, position) is checked row by row during an UPDATE, so a
+# block cannot be shifted by ±1 in place. Instead the block is first lifted
+# above every existing position (inactive rows are parked at -id), then
+# dropped onto its final positions: a fixed number of statements however
+# long the workout is.
+
+def _lift_offset(conn: sqlite3.Connection, workout_id: int) -> int:
+    """An offset that moves any position clear of every row in the workout."""
+    top = conn.execute(
+        "SELECT COALESCE(MAX(position), 0) FROM workoutExercise WHERE workoutId = ?",
+        (workout_id,),
+    ).fetchone()[0]
+    return max(top, 0) + 1
+
+
+def shift_positions(
+    conn: sqlite3.Connection, workout_id: int, start: int, delta: int,
+) -> None:
+    """Shift every active row at ``start`` or later by ``delta``."""
+    offset = _lift_offset(conn, workout_id)
+    conn.execute(
+        """
+        UPDATE workoutExercise SET position = position + ?
+        WHERE workoutId = ? AND isActive = 1 AND position >= ?
+        """,
+        (offset, workout_id, start),
+    )
+    conn.execute(
+        """
+        UPDATE workoutExercise SET position = position - ?
+        WHERE workoutId = ? AND isActive = 1 AND position >= ?
+        """,
+        (offset - delta, workout_id, offset + start),
+    )
+
+
+def move_position(
+    conn: sqlite3.Connection, workout_id: int, from_pos: int, to_pos: int,
+) -> None:
+    """Move the active row at ``from_pos`` to ``to_pos``, shifting the rows between."""
+    offset = _lift_offset(conn, workout_id)
+    lo, hi = sorted((from_pos, to_pos))
+    delta = 1 if to_pos < from_pos else -1
+    conn.execute(
+        """
+        UPDATE workoutExercise SET position = position + ?
+        WHERE workoutId = ? AND isActive = 1 AND position BETWEEN ? AND ?
+        """,
+        (offset, workout_id, lo, hi),
+    )
+    conn.execute(
+        """
+        UPDATE workoutExercise
+        SET position = CASE WHEN position = ? THEN ? ELSE position - ? END
+        WHERE workoutId = ? AND isActive = 1 AND position >= ?
+        """,
+        (from_pos + offset, to_pos, offset - delta, workout_id, offset),
+    )
+
+
+# Each editing command is split into plan_* (validate against the current
+# state, describe the change) and apply_* (issue the SQL, no transaction
+# handling), so cmd_* and cmd_batch share the same logic.
+
+def run_plan(conn: sqlite3.Connection, plan: dict, execute: bool, db_path: Path) -> None:
+    """Print a plan and, with --execute, apply it in its own transaction."""
+    print("\n" + "\n".join(plan["lines"]))
+
+    if not execute:
+        print("\nDry run — pass --execute to apply.")
+        return
+
+    backup_db(db_path)
+    conn.execute("BEGIN")
+    try:
+        with journal(conn, plan["op"], plan_summary(plan)):
+            APPLY[plan["op"]](conn, plan)
+        conn.commit()
+        print("Done.")
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def plan_swap(
+    conn: sqlite3.Connection, workout: sqlite3.Row, old_ex: sqlite3.Row,
+    new_ex: sqlite3.Row, args: argparse.Namespace,
+) -> dict:
+    # Find the active workoutExercise row for the old exercise
+    we_row = conn.execute(
+        """
+        SELECT * FROM workoutExercise
+        WHERE workoutId = ? AND exerciseId = ? AND isActive = 1
+        """,
+        (workout["id"], old_ex["id"]),
+    ).fetchone()
+
+    if not we_row:
+        die(
+            f"\"{old_ex['name']}\" is not an active exercise in "
+            f"\"{workout['name']}\"."
+        )
+
+    # Determine programming for the new row
+    sets = args.sets if args.sets is not None else we_row["sets"]
+    reps = args.reps if args.reps is not None else we_row["counterValue"]
+    rest = args.rest if args.rest is not None else we_row["restSeconds"]
+
+    return {
+        "op": "swap",
+        "lines": [
+            f"Swap in \"{workout['name']}\":",
+            f"  Position {we_row['position']}: {old_ex['name']} → {new_ex['name']}",
+            f"  Sets: {sets}, Reps/Value: {reps}, Rest: {rest}s",
+        ],
+        "workout_id": workout["id"],
+        "we_row": we_row,
+        "exercise": new_ex,
+        "sets": sets,
+        "reps": reps,
+        "rest": rest,
+    }
+
+
+def apply_swap(conn: sqlite3.Connection, plan: dict) -> None:
+    we_row = plan["we_row"]
+    # Mark old row inactive; park position at -id to free the unique constraint
+    conn.execute(
+        "UPDATE workoutExercise SET isActive = 0, position = -id WHERE id = ?",
+        (we_row["id"],),
+    )
+    # Insert new row at same position
+    conn.execute(
+        """
+        INSERT INTO workoutExercise
+          (workoutId, exerciseId, position, counterUnit, counterValue,
+           counterLabel, restSeconds, sets, isDailyChallenge, hasWeight, isActive)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 1)
+        """,
+        (
+            plan["workout_id"],
+            plan["exercise"]["id"],
+            we_row["position"],
+            we_row["counterUnit"],
+            plan["reps"],
+            we_row["counterLabel"],
+            plan["rest"],
+            plan["sets"],
+            we_row["isDailyChallenge"],
+            1 if plan["exercise"]["hasWeight"] else 0,
+        ),
+    )
+
+
+def cmd_swap(conn: sqlite3.Connection, args: argparse.Namespace, db_path: Path) -> None:
+    workout = resolve_workout(conn, args.workout)
+    old_ex = resolve_exercise(conn, args.old)
+    new_ex = resolve_exercise(conn, args.new)
+    run_plan(conn, plan_swap(conn, workout, old_ex, new_ex, args), args.execute, db_path)
+
+
+def plan_add(
+    conn: sqlite3.Connection, workout: sqlite3.Row, exercise: sqlite3.Row,
+    args: argparse.Namespace,
+) -> dict:
+    # Determine position
+    max_pos_row = conn.execute(
+        "SELECT MAX(position) AS mp FROM workoutExercise WHERE workoutId = ? AND isActive = 1",
+        (workout["id"],),
+    ).fetchone()
+    max_pos = max_pos_row["mp"] if max_pos_row and max_pos_row["mp"] is not None else 0
+
+    if args.position is not None:
+        position = args.position
+        if position < 1 or position > max_pos + 1:
+            die(f"Position must be between 1 and {max_pos + 1}.")
+    else:
+        position = max_pos + 1
+
+    sets = args.sets if args.sets is not None else 3
+    counter_unit = "timer" if args.timed else "reps"
+    reps = args.reps if args.reps is not None else (60 if args.timed else 10)
+    rest = args.rest if args.rest is not None else 30
+    has_weight = args.weight if args.weight else bool(exercise["hasWeight"])
+
+    lines = [
+        f"Add to \"{workout['name']}\":",
+        f"  Position {position}: {exercise['name']}",
+        f"  Sets: {sets}, {'Time' if args.timed else 'Reps'}: {reps}, Rest: {rest}s, Weight: {'Y' if has_weight else 'N'}",
+    ]
+    if position <= max_pos:
+        lines.append(f"  (exercises at position {position}+ will shift down)")
+
+    return {
+        "op": "add",
+        "lines": lines,
+        "workout_id": workout["id"],
+        "exercise_id": exercise["id"],
+        "position": position,
+        "max_pos": max_pos,
+        "counter_unit": counter_unit,
+        "reps": reps,
+        "rest": rest,
+        "sets": sets,
+        "has_weight": has_weight,
+    }
+
+
+def apply_add(conn: sqlite3.Connection, plan: dict) -> None:
+    position = plan["position"]
+    if position <= plan["max_pos"]:
+        shift_positions(conn, plan["workout_id"], position, +1)
+    conn.execute(
+        """
+        INSERT INTO workoutExercise
+          (workoutId, exerciseId, position, counterUnit, counterValue,
+           counterLabel, restSeconds, sets, isDailyChallenge, hasWeight, isActive)
+        VALUES (?, ?, ?, ?, ?, NULL, ?, ?, 0, ?, 1)
+        """,
+        (
+            plan["workout_id"],
+            plan["exercise_id"],
+            position,
+            plan["counter_unit"],
+            plan["reps"],
+            plan["rest"],
+            plan["sets"],
+            1 if plan["has_weight"] else 0,
+        ),
+    )
+
+
+def cmd_add(conn: sqlite3.Connection, args: argparse.Namespace, db_path: Path) -> None:
+    workout = resolve_workout(conn, args.workout)
+    exercise = resolve_exercise(conn, args.exercise)
+    run_plan(conn, plan_add(conn, workout, exercise, args), args.execute, db_path)
+
+
+def plan_remove(
+    conn: sqlite3.Connection, workout: sqlite3.Row, exercise: sqlite3.Row,
+    args: argparse.Namespace,
+) -> dict:
+    we_row = conn.execute(
+        """
+        SELECT * FROM workoutExercise
+        WHERE workoutId = ? AND exerciseId = ? AND isActive = 1
+        """,
+        (workout["id"], exercise["id"]),
+    ).fetchone()
+
+    if not we_row:
+        die(
+            f"\"{exercise['name']}\" is not an active exercise in "
+            f"\"{workout['name']}\"."
+        )
+
+    return {
+        "op": "remove",
+        "lines": [
+            f"Remove from \"{workout['name']}\":",
+            f"  Position {we_row['position']}: {exercise['name']}",
+        ],
+        "workout_id": workout["id"],
+        "we_row": we_row,
+    }
+
+
+def apply_remove(conn: sqlite3.Connection, plan: dict) -> None:
+    we_row = plan["we_row"]
+    # Mark inactive; park position at -id to free the unique constraint
+    conn.execute(
+        "UPDATE workoutExercise SET isActive = 0, position = -id WHERE id = ?",
+        (we_row["id"],),
+    )
+    # Shift positions up for remaining exercises
+    shift_positions(conn, plan["workout_id"], we_row["position"] + 1, -1)
+
+
+def cmd_remove(conn: sqlite3.Connection, args: argparse.Namespace, db_path: Path) -> None:
+    workout = resolve_workout(conn, args.workout)
+    exercise = resolve_exercise(conn, args.exercise)
+    run_plan(conn, plan_remove(conn, workout, exercise, args), args.execute, db_path)
+
+
+def plan_reorder(
+    conn: sqlite3.Connection, workout: sqlite3.Row, args: argparse.Namespace,
+) -> dict:
+    from_pos = args.move
+    to_pos = args.to
+
+    # Fetch active exercises
+    rows = conn.execute(
+        """
+        SELECT we.id, we.position, e.name
+        FROM workoutExercise we
+        JOIN exercise e ON e.id = we.exerciseId
+        WHERE we.workoutId = ? AND we.isActive = 1
+        ORDER BY we.position
+        """,
+        (workout["id"],),
+    ).fetchall()
+
+    positions = [r["position"] for r in rows]
+    if from_pos not in positions:
+        die(f"No active exercise at position {from_pos}.")
+    if to_pos < 1 or to_pos > max(positions):
+        die(f"Target position must be between 1 and {max(positions)}.")
+    if from_pos == to_pos:
+        die("Source and target positions are the same.")
+
+    moving = next(r for r in rows if r["position"] == from_pos)
+    return {
+        "op": "reorder",
+        "lines": [
+            f"Reorder in \"{workout['name']}\":",
+            f"  Move \"{moving['name']}\" from position {from_pos} to {to_pos}",
+        ],
+        "workout_id": workout["id"],
+        "from_pos": from_pos,
+        "to_pos": to_pos,
+    }
+
+
+def apply_reorder(conn: sqlite3.Connection, plan: dict) -> None:
+    move_position(conn, plan["workout_id"], plan["from_pos"], plan["to_pos"])
+
+
+def cmd_reorder(conn: sqlite3.Connection, args: argparse.Namespace, db_path: Path) -> None:
+    workout = resolve_workout(conn, args.workout)
+    run_plan(conn, plan_reorder(conn, workout, args), args.execute, db_path)
+
+
+APPLY = {
+    "swap": apply_swap,
+    "add": apply_add,
+    "remove": apply_remove,
+    "reorder": apply_reorder,
+}
+
+
+PLAN = {
+    "swap": plan_swap,
+    "add": plan_add,
+    "remove": plan_remove,
+    "reorder": plan_reorder,
+}
+
+# op -> (name fields resolved up front, option defaults, required options)
+BATCH_OPS: dict[str, tuple[dict[str, str], dict[str, object], tuple[str, ...]]] = {
+    "swap": (
+        {"workout": "workout", "old": "exercise", "new": "exercise"},
+        {"sets": None, "reps": None, "rest": None},
+        (),
+    ),
+    "add": (
+        {"workout": "workout", "exercise": "exercise"},
+        {"position": None, "sets": None, "reps": None, "rest": None,
+         "timed": False, "weight": False},
+        (),
+    ),
+    "remove": (
+        {"workout": "workout", "exercise": "exercise"},
+        {},
+        (),
+    ),
+    "reorder": (
+        {"workout": "workout"},
+        {},
+        ("move", "to"),
+    ),
+}
+
+
+# Numeric options, checked up front so a string never reaches position math
+BATCH_INT_FIELDS = ("position", "sets", "reps", "rest", "move", "to")
+
+
+def load_batch(path: Path) -> list[dict]:
+    """Read operations from a JSON array or NDJSON file."""
+    if not path.exists():
+        die(f"File not found: {path}")
+    text = path.read_text()
+    try:
+        if text.lstrip().startswith("["):
+            ops = json.loads(text)
+        else:
+            ops = [json.loads(line) for line in text.splitlines() if line.strip()]
+    except json.JSONDecodeError as e:
+        die(f"Invalid JSON in {path}: {e}")
+
+    for n, op in enumerate(ops, 1):
+        if not isinstance(op, dict) or op.get("op") not in BATCH_OPS:
+            die(
+                f"Operation {n}: expected an object with \"op\" one of "
+                + ", ".join(BATCH_OPS)
+            )
+        names, defaults, required = BATCH_OPS[op["op"]]
+        for key in [*names, *required]:
+            if key not in op:
+                die(f"Operation {n} ({op['op']}): missing \"{key}\".")
+        for key in BATCH_INT_FIELDS:
+            value = op.get(key)
+            if key in required or (key in defaults and value is not None):
+                if not isinstance(value, int) or isinstance(value, bool):
+                    die(f"Operation {n} ({op['op']}): \"{key}\" must be an integer.")
+    return ops
+
+
+def _snapshot(conn: sqlite3.Connection) -> sqlite3.Connection:
+    """In-memory copy of the database for rehearsing a batch."""
+    snap = sqlite3.connect(":memory:")
+    conn.backup(snap)
+    snap.row_factory = sqlite3.Row
+    snap.execute("PRAGMA foreign_keys = ON")
+    return snap
+
+
+def cmd_batch(conn: sqlite3.Connection, args: argparse.Namespace, db_path: Path) -> None:
+    ops = load_batch(Path(args.file))
+
+    # Resolve every name before touching anything so typos fail fast
+    resolved = []
+    for n, op in enumerate(ops, 1):
+        names, defaults, required = BATCH_OPS[op["op"]]
+        try:
+            rows = [
+                resolve_workout(conn, op[key]) if kind == "workout"
+                else resolve_exercise(conn, op[key])
+                for key, kind in names.items()
+            ]
+        except SystemExit:
+            print(f"  (in operation {n}: {op['op']})", file=sys.stderr)
+            raise
+        options = {k: op.get(k, v) for k, v in defaults.items()}
+        options.update({k: op[k] for k in required})
+        resolved.append((op["op"], rows, argparse.Namespace(**options)))
+
+    # A dry run rehearses the whole batch on an in-memory copy, so later
+    # operations are planned against the effects of earlier ones.
+    if args.execute:
+        backup_db(db_path)
+        target = conn
+        target.execute("BEGIN")
+    else:
+        target = _snapshot(conn)
+
+    n = 0
+    summary = f"{len(resolved)} operation(s) from {Path(args.file).name}"
+    try:
+        with journal(target, "batch", summary) if args.execute else nullcontext():
+            for n, (op, rows, options) in enumerate(resolved, 1):
+                plan = PLAN[op](target, *rows, options)
+                print(f"\n[{n}] " + "\n".join(plan["lines"]))
+                APPLY[op](target, plan)
+        if args.execute:
+            target.commit()
+            print(f"\nApplied {len(resolved)} operation(s).")
+        else:
+            print(f"\n{len(resolved)} operation(s). Dry run — pass --execute to apply.")
+    except BaseException:
+        target.rollback()
+        print(f"Operation {n} failed — nothing was changed.", file=sys.stderr)
+        raise
+    finally:
+        if target is not conn:
+            target.close()
+
+
+# ── Spec ──────────────────────────────────────────────────────────────
+
+# `openwo apply spec.json` makes the active rows of each listed workout match
+# a desired list. Current and desired exercise ids are aligned with a
+# longest common subsequence: aligned rows stay put (keeping their id and
+# their logs), other current rows of a wanted exercise are moved, and the
+# rest are removed or added. A row whose programming changes is versioned
+# the way swap does it (old row parked inactive, new row in its place), so
+# logs keep pointing at what was actually programmed. `dump-spec` writes
+# the current state in the same format.
+
+# spec key -> workoutExercise column; "timed" and "weight" are booleans
+SPEC_FIELDS = {
+    "sets": "sets", "reps": "counterValue", "rest": "restSeconds", "label": "counterLabel",
+}
+
+
+def load_spec(path: Path) -> list[dict]:
+    """Workouts from a spec file: {"workouts": [...]} or a bare list."""
+    if not path.exists():
+        die(f"File not found: {path}")
+    try:
+        spec = json.loads(path.read_text())
+    except json.JSONDecodeError as e:
+        die(f"Invalid JSON in {path}: {e}")
+    workouts = spec.get("workouts") if isinstance(spec, dict) else spec
+    if not isinstance(workouts, list):
+        die('Expected {"workouts": [...]} or a list of workouts.')
+    for w in workouts:
+        if not isinstance(w, dict) or not isinstance(w.get("name"), str) \
+                or not isinstance(w.get("exercises"), list):
+            die('Each workout needs a "name" string and an "exercises" list.')
+        for n, entry in enumerate(w["exercises"], 1):
+            where = f"Workout \"{w['name']}\", entry {n}"
+            if not isinstance(entry, dict) or "exercise" not in entry:
+                die(f"{where}: missing \"exercise\".")
+            for key in ("sets", "reps", "rest"):
+                if key in entry and (not isinstance(entry[key], int) or isinstance(entry[key], bool)):
+                    die(f"{where}: \"{key}\" must be an integer.")
+            for key in ("sets", "reps"):
+                if key in entry and entry[key] < 1:
+                    die(f"{where}: \"{key}\" must be positive.")
+            if "label" in entry and not isinstance(entry["label"], str):
+                die(f"{where}: \"label\" must be a string.")
+            for key in ("timed", "weight"):
+                if key in entry and not isinstance(entry[key], bool):
+                    die(f"{where}: \"{key}\" must be true or false.")
+    return workouts
+
+
+def spec_entry(rec: dict) -> dict:
+    """The spec form of one iter_show record."""
+    entry = {
+        "exercise": rec["exercise"], "sets": rec["sets"], "reps": rec["counterValue"],
+        "rest": rec["restSeconds"], "timed": rec["counterUnit"] == "timer",
+        "weight": bool(rec["hasWeight"]),
+    }
+    if rec["counterLabel"]:
+        entry["label"] = rec["counterLabel"]
+    return entry
+
+
+def lcs_pairs(a: list, b: list) -> list[tuple[int, int]]:
+    """Index pairs (i, j) of a longest common subsequence of ``a`` and ``b``."""
+    n, m = len(a), len(b)
+    # lengths[i][j] = LCS length of a[i:] and b[j:]
+    lengths = [[0] * (m + 1) for _ in range(n + 1)]
+    for i in range(n - 1, -1, -1):
+        row, below = lengths[i], lengths[i + 1]
+        for j in range(m - 1, -1, -1):
+            row[j] = below[j + 1] + 1 if a[i] == b[j] else max(below[j], row[j + 1])
+    pairs, i, j = [], 0, 0
+    while i < n and j < m:
+        if a[i] == b[j]:
+            pairs.append((i, j))
+            i += 1
+            j += 1
+        elif lengths[i + 1][j] >= lengths[i][j + 1]:
+            i += 1
+        else:
+            j += 1
+    return pairs
+
+
+def _spec_values(entry: dict, base: dict) -> dict:
+    """Column values for a row: ``base`` overridden by the fields ``entry`` sets."""
+    values = dict(base)
+    for key, column in SPEC_FIELDS.items():
+        if key in entry:
+            values[column] = entry[key]
+    if "timed" in entry:
+        values["counterUnit"] = "timer" if entry["timed"] else "reps"
+    if "weight" in entry:
+        values["hasWeight"] = 1 if entry["weight"] else 0
+    return values
+
+
+SPEC_COLUMNS = (
+    "counterUnit", "counterValue", "counterLabel", "restSeconds", "sets", "isDailyChallenge", "hasWeight",
+)
+
+
+def _describe(values: dict) -> str:
+    unit = "s" if values["counterUnit"] == "timer" else ""
+    weight = ", weight" if values["hasWeight"] else ""
+    return f"{values['sets']}×{values['counterValue']}{unit}, rest {values['restSeconds']}s{weight}"
+
+
+def plan_spec(
+    conn: sqlite3.Connection, workout: sqlite3.Row, entries: list[tuple[dict, sqlite3.Row]],
+) -> dict:
+    """Diff the active rows of ``workout`` against (entry, exercise) pairs."""
+    current = [dict(r) for r in conn.execute(
+        """
+        SELECT we.*, e.name FROM workoutExercise we JOIN exercise e ON e.id = we.exerciseId
+        WHERE we.workoutId = ? AND we.isActive = 1 ORDER BY we.position
+        """,
+        (workout["id"],),
+    )]
+    want = [ex["id"] for _, ex in entries]
+    match = {j: i for i, j in lcs_pairs([r["exerciseId"] for r in current], want)}
+    aligned = set(match.values())
+    in_order = set(match)
+    # Unaligned current rows of a wanted exercise are moved, in order
+    spare: dict[int, list[int]] = {}
+    for i, r in enumerate(current):
+        if i not in aligned:
+            spare.setdefault(r["exerciseId"], []).append(i)
+    for j, ex_id in enumerate(want):
+        if j not in match and spare.get(ex_id):
+            match[j] = spare[ex_id].pop(0)
+    used = set(match.values())
+
+    lines = [f"Apply to \"{workout['name']}\":"]
+    keep, retire, insert = [], [], []
+    for j, (entry, ex) in enumerate(entries):
+        pos = j + 1
+        i = match.get(j)
+        if i is None:
+            values = _spec_values(entry, {
+                "counterUnit": "reps", "counterValue": 10, "counterLabel": None,
+                "restSeconds": 30, "sets": 3, "isDailyChallenge": 0,
+                "hasWeight": 1 if ex["hasWeight"] else 0,
+            })
+            if "reps" not in entry and values["counterUnit"] == "timer":
+                values["counterValue"] = 60
+            insert.append((ex["id"], pos, values))
+            lines.append(f"  + {pos:<3} {ex['name']} ({_describe(values)})")
+            continue
+        row = current[i]
+        values = _spec_values(entry, {c: row[c] for c in SPEC_COLUMNS})
+        # Aligned rows only shift with inserts/removes; others move out of order
+        moved = "" if j in in_order else f" (from {row['position']})"
+        if any(values[c] != row[c] for c in SPEC_COLUMNS):
+            retire.append(row["id"])
+            insert.append((ex["id"], pos, values))
+            lines.append(
+                f"  ~ {pos:<3} {ex['name']}{moved}: "
+                f"{_describe({c: row[c] for c in SPEC_COLUMNS})} → {_describe(values)}"
+            )
+        else:
+            keep.append((row["id"], row["position"], pos))
+            lines.append(f"  {'↕' if moved else ' '} {pos:<3} {ex['name']}{moved}")
+    for i, r in enumerate(current):
+        if i not in used:
+            retire.append(r["id"])
+            lines.append(f"  - {'':<3} {r['name']} (was {r['position']})")
+
+    return {
+        "op": "spec", "lines": lines, "workout_id": workout["id"],
+        "keep": keep, "retire": retire, "insert": insert,
+    }
+
+
+def apply_spec(conn: sqlite3.Connection, plan: dict) -> None:
+    workout_id = plan["workout_id"]
+    conn.executemany(
+        "UPDATE workoutExercise SET isActive = 0, position = -id WHERE id = ?",
+        [(row_id,) for row_id in plan["retire"]],
+    )
+    # Lift the rows that change position clear of every final position,
+    # then drop them into place (see Positions)
+    moving = [(row_id, new) for row_id, old, new in plan["keep"] if old != new]
+    if moving:
+        offset = _lift_offset(conn, workout_id)
+        conn.executemany(
+            "UPDATE workoutExercise SET position = ? WHERE id = ?",
+            [(offset + new, row_id) for row_id, new in moving],
+        )
+        conn.execute(
+            """
+            UPDATE workoutExercise SET position = position - ?
+            WHERE workoutId = ? AND isActive = 1 AND position > ?
+            """,
+            (offset, workout_id, offset),
+        )
+    conn.executemany(
+        f"""
+        INSERT INTO workoutExercise (workoutId, exerciseId, position, {", ".join(SPEC_COLUMNS)}, isActive)
+        VALUES (?, ?, ?, {", ".join("?" * len(SPEC_COLUMNS))}, 1)
+        """,
+        [(workout_id, ex_id, pos, *(values[c] for c in SPEC_COLUMNS))
+         for ex_id, pos, values in plan["insert"]],
+    )
+
+
+def cmd_apply(conn: sqlite3.Connection, args: argparse.Namespace, db_path: Path) -> None:
+    workouts = load_spec(Path(args.file))
+
+    # Resolve every name before planning so typos fail fast
+    resolved = []
+    seen: set[int] = set()
+    for w in workouts:
+        workout = resolve_workout(conn, w["name"])
+        # Plans are made against the starting state, so a second plan for
+        # the same workout would undo the first
+        if workout["id"] in seen:
+            die(f"Workout \"{workout['name']}\" appears more than once in the spec.")
+        seen.add(workout["id"])
+        entries = []
+        for n, entry in enumerate(w["exercises"], 1):
+            try:
+                entries.append((entry, resolve_exercise(conn, entry["exercise"])))
+            except SystemExit:
+                print(f"  (in workout \"{w['name']}\", entry {n})", file=sys.stderr)
+                raise
+        resolved.append((workout, entries))
+
+    plans = [plan_spec(conn, workout, entries) for workout, entries in resolved]
+    changed = [p for p in plans if p["insert"] or p["retire"] or any(o != n for _, o, n in p["keep"])]
+    for plan in plans:
+        print("\n" + "\n".join(plan["lines"]))
+    if not changed:
+        print("\nAlready up to date.")
+        return
+    if not args.execute:
+        print(f"\n{len(changed)} workout(s) to change. Dry run — pass --execute to apply.")
+        return
+
+    backup_db(db_path)
+    conn.execute("BEGIN")
+    try:
+        with journal(conn, "apply", f"{Path(args.file).name}: {len(changed)} workout(s)"):
+            for plan in changed:
+                apply_spec(conn, plan)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    print(f"\nApplied to {len(changed)} workout(s).")
+
+
+def cmd_dump_spec(conn: sqlite3.Connection, args: argparse.Namespace) -> None:
+    ids = [resolve_workout(conn, name)["id"] for name in args.workout]
+    workouts = []
+    for (workout_id, name), recs in itertools.groupby(
+        iter_show(conn), key=lambda r: (r["workoutId"], r["workout"]),
+    ):
+        if ids and workout_id not in ids:
+            continue
+        workouts.append({
+            "name": name,
+            "exercises": [spec_entry(r) for r in recs if r["exerciseId"] is not None],
+        })
+    text = json.dumps({"workouts": workouts}, indent=2, ensure_ascii=False) + "\n"
+    if args.output:
+        Path(args.output).write_text(text)
+        print(f"Wrote {len(workouts)} workout(s) to {args.output}.", file=sys.stderr)
+    else:
+        sys.stdout.write(text)
+
+
+# ── Import ────────────────────────────────────────────────────────────
+
+IMPORT_CHUNK_SIZE = 1000
+_READ_SIZE = 1 << 16
+
+INSERT_EXERCISE = """
+    INSERT INTO exercise
+      (name, description, instructions, tip, externalId, hasWeight,
+       level, category, force, mechanic, equipment,
+       primaryMuscles, secondaryMuscles, counterUnit, defaultValue, isDailyChallenge)
+    VALUES (?, '', '', ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'reps', 10, 0)
+"""
+
+
+# Columns compared and written by --merge, in exercise_params order
+MERGE_FIELDS = (
+    "name", "tip", "externalId", "hasWeight", "level", "category",
+    "force", "mechanic", "equipment", "primaryMuscles", "secondaryMuscles",
+)
+
+UPDATE_EXERCISE = (
+    "UPDATE exercise SET "
+    + ", ".join(f"{f} = ?" for f in MERGE_FIELDS)
+    + " WHERE id = ?"
+)
+
+
+def content_hash(values: tuple) -> bytes:
+    return hashlib.sha1(json.dumps(values).encode()).digest()
+
+
+def load_merge_keys(
+    conn: sqlite3.Connection,
+) -> tuple[dict[str, tuple[int, bytes]], dict[str, tuple[int, bytes]]]:
+    """Map externalId and lowercased name to (id, content hash) for --merge."""
+    by_external: dict[str, tuple[int, bytes]] = {}
+    by_name: dict[str, tuple[int, bytes]] = {}
+    rows = conn.execute(f"SELECT id, {', '.join(MERGE_FIELDS)} FROM exercise ORDER BY id")
+    for r in rows:
+        key = (r["id"], content_hash(tuple(r)[1:]))
+        if r["externalId"]:
+            by_external.setdefault(r["externalId"], key)
+        by_name.setdefault(r["name"].lower(), key)
+    return by_external, by_name
+
+
+def _iter_json_array(f: IO[str]) -> Iterator[object]:
+    """Yield the elements of a JSON array one at a time from a text stream."""
+    decoder = json.JSONDecoder()
+    buf = f.read(_READ_SIZE).lstrip()
+    pos = 1  # past the opening "["
+    eof = False
+    while True:
+        while pos < len(buf) and buf[pos] in " \t\r\n,":
+            pos += 1
+        if pos < len(buf) and buf[pos] == "]":
+            return
+        try:
+            obj, end = decoder.raw_decode(buf, pos)
+            if end < len(buf) or eof:
+                yield obj
+                pos = end
+                continue
+        except json.JSONDecodeError:
+            if eof:
+                raise
+        # Element may be cut off at the buffer boundary: read more
+        more = f.read(_READ_SIZE)
+        eof = not more
+        buf = buf[pos:] + more
+        pos = 0
+        if eof and not buf.strip():
+            raise json.JSONDecodeError("Unterminated array", buf, pos)
+
+
+def iter_records(path: Path) -> Iterator[dict]:
+    """Stream objects from a JSON array or an NDJSON file."""
+    with open(path) as f:
+        head = f.read(_READ_SIZE).lstrip()[:1]
+        f.seek(0)
+        try:
+            if head == "[":
+                yield from _iter_json_array(f)
+            elif head == "{":
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+            else:
+                die("Expected a JSON array or NDJSON of exercise objects.")
+        except json.JSONDecodeError as e:
+            die(f"Invalid JSON in {path}: {e}")
+
+
+def exercise_params(e: dict) -> tuple:
+    """Values for MERGE_FIELDS (and INSERT_EXERCISE) from a catalog entry."""
+    primary = json.dumps(e.get("primaryMuscles", [])) if e.get("primaryMuscles") else None
+    secondary = json.dumps(e.get("secondaryMuscles", [])) if e.get("secondaryMuscles") else None
+    return (
+        e["name"],
+        e.get("tip", ""),
+        str(e["id"]) if e.get("id") is not None else None,
+        1 if e.get("hasWeight") else 0,
+        e.get("level"),
+        e.get("category"),
+        e.get("force"),
+        e.get("mechanic"),
+        e.get("equipment"),
+        primary,
+        secondary,
+    )
+
+
+def cmd_import_exercises(conn: sqlite3.Connection, args: argparse.Namespace, db_path: Path) -> None:
+    file_path = Path(args.file)
+    if not file_path.exists():
+        die(f"File not found: {file_path}")
+    if args.chunk_size < 1:
+        die("Chunk size must be at least 1.")
+
+    # Entries are streamed and written in chunks so memory does not grow
+    # with the input file. Without --merge, existing names (case-insensitive)
+    # are skipped; with --merge, they are matched and updated if changed.
+    if args.merge:
+        by_external, by_name = load_merge_keys(conn)
+    else:
+        existing = name_index(conn, "exercise")
+    inserts: list[tuple] = []
+    updates: list[tuple] = []
+    skipped = unchanged = pending_inserts = pending_updates = written = 0
+    # Every chunk adds to one journal operation, so undo reverses the whole import
+    operation = None
+    summary = f"{'Merge' if args.merge else 'Import'} exercises from {file_path.name}"
+
+    def flush() -> None:
+        nonlocal written, operation
+        if not written:
+            backup_db(db_path)
+        ensure_lookup_tables(conn)
+        conn.execute("BEGIN")
+        try:
+            with journal(conn, "import-exercises", summary, operation) as operation:
+                # The lookup tables follow through their triggers
+                conn.executemany(INSERT_EXERCISE, inserts)
+                conn.executemany(UPDATE_EXERCISE, updates)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        written += len(inserts) + len(updates)
+        inserts.clear()
+        updates.clear()
+        print(f"  ... wrote {written} exercise(s)", file=sys.stderr)
+
+    print()
+    for entry in iter_records(file_path):
+        if not isinstance(entry, dict):
+            die("Expected a JSON array or NDJSON of exercise objects.")
+        name = entry.get("name", "")
+        params = exercise_params(entry)
+
+        if args.merge:
+            match = by_external.get(params[2]) if params[2] else None
+            match = match or by_name.get(name.lower())
+            if match and match[1] == content_hash(params):
+                unchanged += 1
+                continue
+            if match:
+                pending_updates += 1
+                print(f"  ~ {name}")
+                if args.execute:
+                    updates.append((*params, match[0]))
+            else:
+                pending_inserts += 1
+                print(f"  + {name}")
+                if args.execute:
+                    inserts.append(params)
+        elif existing.find_exact(name.lower()):
+            skipped += 1
+            print(f"  - {name} (exists)")
+            continue
+        else:
+            pending_inserts += 1
+            print(f"  + {name}")
+            if args.execute:
+                inserts.append(params)
+
+        if args.execute and len(inserts) + len(updates) >= args.chunk_size:
+            flush()
+
+    if skipped:
+        print(f"\nSkipping {skipped} existing exercise(s).")
+    if args.merge:
+        print(
+            f"\n{pending_inserts} insert(s), {pending_updates} update(s), "
+            f"{unchanged} unchanged."
+        )
+    if not pending_inserts and not pending_updates:
+        print("\nNothing to import.")
+        return
+    if not args.execute:
+        if not args.merge:
+            print(f"\nWould import {pending_inserts} exercise(s).")
+        print("\nDry run — pass --execute to apply.")
+        return
+
+    if inserts or updates:
+        flush()
+    if args.merge:
+        print(f"\nInserted {pending_inserts}, updated {pending_updates} exercise(s).")
+    else:
+        print(f"\nImported {written} exercise(s).")
+
+
+def cmd_backups(conn: sqlite3.Connection, args: argparse.Namespace, db_path: Path) -> None:
+    store = open_backup_store(db_path)
+    try:
+        if args.backups_command == "list":
+            snaps = store.execute("SELECT * FROM snapshot ORDER BY id").fetchall()
+            if not snaps:
+                print("No backups.")
+                return
+            print(f"\n{'ID':>4}  {'Created':<19} {'Size':>10} {'New pages':>10} {'Stored':>10}  Note")
+            print(f"{'─'*4}  {'─'*19} {'─'*10} {'─'*10} {'─'*10}  {'─'*4}")
+            for snap in snaps:
+                print(
+                    f"{snap['id']:>4}  {snap['createdAt']:<19} "
+                    f"{format_bytes(snap['pageSize'] * snap['pageCount']):>10} "
+                    f"{snap['newPages']:>10} {format_bytes(snap['storedBytes']):>10}  {snap['note']}"
+                )
+            print(f"\nStore: {backup_store_path(db_path)}")
+
+        elif args.backups_command == "create":
+            snap = take_snapshot(db_path, store, args.note or "")
+            print(f"Backup: snapshot {snap['id']} ({snap['newPages']}/{snap['pageCount']} new pages)")
+
+        elif args.backups_command == "restore":
+            snap = store.execute("SELECT * FROM snapshot WHERE id = ?", (args.id,)).fetchone()
+            if not snap:
+                die(f"No backup with id {args.id}.")
+            print(f"\nRestore snapshot {snap['id']} from {snap['createdAt']} over {db_path}")
+            if not args.execute:
+                print("\nDry run — pass --execute to apply.")
+                return
+            current = take_snapshot(db_path, store, f"before restore of {snap['id']}")
+            print(f"Backup: snapshot {current['id']} (current state)")
+            restore_snapshot(store, snap, conn)
+            print("Done.")
+
+        elif args.backups_command == "prune":
+            if args.keep is None and args.max_age is None:
+                die("Pass --keep and/or --max-age.")
+            doomed = prune_snapshots(store, args.keep, args.max_age, args.execute)
+            if not doomed:
+                print("Nothing to prune.")
+                return
+            print(f"\n{'Pruned' if args.execute else 'Would prune'} {len(doomed)} snapshot(s):")
+            for snap in doomed:
+                print(f"  - {snap['id']} ({snap['createdAt']})")
+            if not args.execute:
+                print("\nDry run — pass --execute to apply.")
+    finally:
+        store.close()
+
+
+def cmd_checkout(conn: sqlite3.Connection, args: argparse.Namespace, db_path: Path) -> None:
+    copy = find_working_copy(db_path)
+    if copy:
+        meta = json.loads(_working_meta_path(copy).read_text())
+        print(f"Working copy from {meta['checkedOutAt']} already at {copy}")
+        if working_copy_conflict(db_path, copy):
+            print("The app has changed the database since; publishing would need --force.")
+        return
+    copy = checkout(db_path)
+    print(f"Checked out {db_path}\n  to {copy}")
+    print("Commands now edit the working copy. Finish with: openwo publish --execute")
+
+
+def cmd_publish(conn: sqlite3.Connection, args: argparse.Namespace, db_path: Path) -> None:
+    copy = find_working_copy(db_path)
+    if not copy:
+        die("No working copy. Start one with: openwo checkout")
+    conflict = working_copy_conflict(db_path, copy)
+    print(f"\nPublish {copy}\n  over {db_path}")
+    if conflict:
+        print("The app has changed the database since checkout; its changes would be lost.")
+        if not args.force:
+            die("Refusing to publish. Discard the working copy, or pass --force.")
+    if not args.execute:
+        print("\nDry run — pass --execute to apply.")
+        return
+    conn.close()  # a read-only handle on the file about to be replaced
+    publish(db_path, copy, force=args.force)
+    print("Done.")
+
+
+def cmd_discard(conn: sqlite3.Connection, args: argparse.Namespace, db_path: Path) -> None:
+    copy = find_working_copy(db_path)
+    if not copy:
+        print("No working copy.")
+        return
+    print(f"\nDiscard working copy {copy} and its unpublished changes")
+    if not args.execute:
+        print("\nDry run — pass --execute to apply.")
+        return
+    discard_working_copy(copy)
+    print("Done.")
+
+
+# ── Export ────────────────────────────────────────────────────────────
+
+# One record per exerciseLog row, joined with its session, programming and
+# exercise. Rows are read in pages keyed on exerciseLog.id, so no read
+# transaction stays open for the whole export and memory stays bounded.
+
+EXPORT_PAGE_SIZE = 1000
+
+EXPORT_FIELDS = [
+    "logId", "sessionId", "date", "startedAt", "sessionType", "durationSeconds",
+    "isPartial", "feedback", "exerciseId", "exercise", "position", "sets",
+    "counterUnit", "counterValue", "hasWeight", "weight", "failed", "achievedValue",
+]
+
+
+def iter_export(
+    conn: sqlite3.Connection,
+    after_id: int = 0,
+    date_from: str | None = None,
+    date_to: str | None = None,
+    exercise_ids: list[int] | None = None,
+    page_size: int = EXPORT_PAGE_SIZE,
+) -> Iterator[dict]:
+    """Yield joined log records with exerciseLog.id > ``after_id``, by id."""
+    conditions = ["el.id > ?"]
+    params: list = []
+    if date_from:
+        conditions.append("s.date >= ?")
+        params.append(date_from)
+    if date_to:
+        # Inclusive of the whole day when dates carry a time component
+        conditions.append("substr(s.date, 1, 10) <= ?")
+        params.append(date_to)
+    if exercise_ids:
+        conditions.append(f"we.exerciseId IN ({', '.join('?' * len(exercise_ids))})")
+        params.extend(exercise_ids)
+    sql = f"""
+        SELECT el.id AS logId, s.id AS sessionId, s.date, s.startedAt, s.sessionType,
+               s.durationSeconds, s.isPartial, s.feedback, e.id AS exerciseId,
+               e.name AS exercise, we.position, we.sets, we.counterUnit,
+               we.counterValue, we.hasWeight, el.weight, el.failed, el.achievedValue
+        FROM exerciseLog el
+        JOIN session s ON s.id = el.sessionId
+        JOIN workoutExercise we ON we.id = el.workoutExerciseId
+        JOIN exercise e ON e.id = we.exerciseId
+        WHERE {" AND ".join(conditions)}
+        ORDER BY el.id
+        LIMIT ?
+    """
+    last = after_id
+    while True:
+        page = conn.execute(sql, [last, *params, page_size]).fetchall()
+        for r in page:
+            rec = dict(r)
+            rec["isPartial"] = bool(rec["isPartial"])
+            rec["hasWeight"] = bool(rec["hasWeight"])
+            yield rec
+        if len(page) < page_size:
+            return
+        last = page[-1]["logId"]
+
+
+def _export_marks_path() -> Path:
+    return _data_dir() / "export-marks.json"
+
+
+def load_export_mark(db_path: Path, key: str) -> int:
+    path = _export_marks_path()
+    if not path.exists():
+        return 0
+    marks = json.loads(path.read_text())
+    return marks.get(f"{db_path.resolve()}#{key}", 0)
+
+
+def save_export_mark(db_path: Path, key: str, log_id: int) -> None:
+    path = _export_marks_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Fleet workers update the shared file at once: serialize the
+    # read-modify-write and give each writer its own temp file
+    with open(path.with_suffix(".lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        marks = json.loads(path.read_text()) if path.exists() else {}
+        marks[f"{db_path.resolve()}#{key}"] = log_id
+        with tempfile.NamedTemporaryFile(
+            "w", dir=path.parent, suffix=".tmp", delete=False,
+        ) as f:
+            f.write(json.dumps(marks, indent=2) + "\n")
+        Path(f.name).replace(path)
+
+
+def cmd_export(conn: sqlite3.Connection, args: argparse.Namespace, db_path: Path) -> None:
+    exercise_ids = [resolve_exercise(conn, q)["id"] for q in args.exercise or []]
+    after_id = load_export_mark(db_path, args.since) if args.since else 0
+
+    # Track the highest id seen so --since can resume from it next time
+    high = after_id
+
+    def tracked() -> Iterator[dict]:
+        nonlocal high
+        for rec in iter_export(conn, after_id, args.date_from, args.date_to, exercise_ids):
+            high = rec["logId"]
+            yield rec
+
+    out = open(args.output, "w", newline="") if args.output else sys.stdout
+    try:
+        n = write_records(tracked(), args.format, out, EXPORT_FIELDS)
+    finally:
+        if args.output:
+            out.close()
+
+    if args.since and high > after_id:
+        save_export_mark(db_path, args.since, high)
+    if args.output or args.since:
+        mark = f" (mark \"{args.since}\" at log {high})" if args.since else ""
+        print(f"Exported {n} log record(s){mark}.", file=sys.stderr)
+
+
+# ── Compact ───────────────────────────────────────────────────────────
+
+# Swaps and removes soft-delete workoutExercise rows (isActive = 0,
+# position = -id). Rows no exerciseLog points at are history nobody can
+# see; `openwo compact` moves them to a per-database archive file next to
+# the backups and frees their pages. Each chunk is copied to the archive
+# before it is deleted, so an interrupted run can only leave duplicates
+# in the archive, never lose rows.
+
+COMPACT_CHUNK = 1000
+
+DEAD_HISTORY = """
+    SELECT id FROM workoutExercise we
+    WHERE isActive = 0
+      AND NOT EXISTS (SELECT 1 FROM exerciseLog el WHERE el.workoutExerciseId = we.id)
+    ORDER BY id
+"""
+
+
+def archive_path(db_path: Path) -> Path:
+    return _data_dir() / "archive" / f"{_db_key(db_path)}.sqlite"
+
+
+def table_bytes(conn: sqlite3.Connection, table: str) -> int | None:
+    """Bytes used by ``table`` and its indexes; None without the dbstat table."""
+    try:
+        return conn.execute(
+            """SELECT IFNULL(SUM(pgsize), 0) FROM dbstat WHERE name = ?1
+               OR name IN (SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ?1)""",
+            (table,),
+        ).fetchone()[0]
+    except sqlite3.OperationalError:
+        return None
+
+
+def attach_archive(conn: sqlite3.Connection, db_path: Path) -> Path:
+    """ATTACH the archive as ``archive``, creating its table with ``workoutExercise``'s columns."""
+    path = archive_path(db_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn.execute("ATTACH DATABASE ? AS archive", (str(path),))
+    columns = [r["name"] for r in conn.execute("PRAGMA main.table_info(workoutExercise)")]
+    conn.execute(
+        f"""CREATE TABLE IF NOT EXISTS archive.workoutExercise (
+                id INTEGER PRIMARY KEY,
+                {", ".join(c for c in columns if c != "id")},
+                archivedAt TEXT NOT NULL
+            )"""
+    )
+    return path
+
+
+def archive_history(conn: sqlite3.Connection, ids: list[int]) -> int:
+    """Move rows ``ids`` to archive.workoutExercise in chunked transactions."""
+    columns = ", ".join(r["name"] for r in conn.execute("PRAGMA main.table_info(workoutExercise)"))
+    now = datetime.now().isoformat(timespec="seconds")
+    done = 0
+    for start in range(0, len(ids), COMPACT_CHUNK):
+        chunk = ids[start:start + COMPACT_CHUNK]
+        marks = ", ".join("?" * len(chunk))
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                f"""INSERT OR REPLACE INTO archive.workoutExercise ({columns}, archivedAt)
+                    SELECT {columns}, ? FROM main.workoutExercise WHERE id IN ({marks})""",
+                (now, *chunk),
+            )
+            # Re-check in the transaction: the app may have logged one since
+            done += conn.execute(
+                f"""DELETE FROM main.workoutExercise WHERE id IN ({marks}) AND isActive = 0
+                    AND NOT EXISTS (SELECT 1 FROM exerciseLog el WHERE el.workoutExerciseId = workoutExercise.id)""",
+                chunk,
+            ).rowcount
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        print(f"  ... archived {done}/{len(ids)} row(s)", file=sys.stderr)
+    return done
+
+
+def cmd_compact(conn: sqlite3.Connection, args: argparse.Namespace, db_path: Path) -> None:
+    ids = [r[0] for r in conn.execute(DEAD_HISTORY)]
+    inactive, total = conn.execute(
+        "SELECT COUNT(*) FILTER (WHERE isActive = 0), COUNT(*) FROM workoutExercise"
+    ).fetchone()
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    incremental = conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    used = table_bytes(conn, "workoutExercise")
+
+    print(f"\nworkoutExercise: {total} row(s), {inactive} inactive")
+    print(f"  {len(ids)} unreferenced → {archive_path(db_path)}")
+    print(f"  {inactive - len(ids)} still referenced by exerciseLog → kept")
+    if used is not None and total:
+        print(f"Reclaims ~{format_bytes(used * len(ids) / total)} of table and index pages")
+    print(f"Free pages already in the file: {free_pages} ({format_bytes(free_pages * page_size)})")
+    if not incremental and not args.full_vacuum:
+        print(
+            "auto_vacuum is off: freed pages stay in the file for reuse. "
+            "Pass --full-vacuum once to switch to incremental auto-vacuum."
+        )
+
+    if not args.execute:
+        print("\nDry run — pass --execute to apply.")
+        return
+    if not ids and not free_pages and not args.full_vacuum:
+        print("\nNothing to compact.")
+        return
+
+    size_before = db_path.stat().st_size
+    backup_db(db_path)
+    if ids:
+        attach_archive(conn, db_path)
+        try:
+            moved = archive_history(conn, ids)
+        finally:
+            conn.execute("DETACH DATABASE archive")
+        print(f"\nArchived {moved} row(s).")
+    if args.full_vacuum:
+        print("Rewriting the file with VACUUM...", file=sys.stderr)
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+    elif incremental:
+        conn.execute("PRAGMA incremental_vacuum")
+    size_after = db_path.stat().st_size
+    free_after = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    print(
+        f"File: {format_bytes(size_before)} → {format_bytes(size_after)}"
+        + (f" ({free_after} free page(s) kept for reuse)" if free_after else "")
+    )
+
+
+# ── Stats Summaries ───────────────────────────────────────────────────
+
+# Materialized aggregates behind `openwo stats`. Each table is folded
+# forward from a watermark (the last session.id / exerciseLog.id already
+# counted), so `openwo stats refresh` costs O(new rows). The app only ever
+# appends sessions and logs; if a watermark is ahead of its table the
+# summaries are rebuilt from scratch, and `stats refresh --full` forces it.
+# Stats commands read the summaries only while they are current and fall
+# back to the live queries otherwise.
+
+STATS_SOURCES = ("session", "exerciseLog")
+
+STATS_SCHEMA = """
+    CREATE TABLE statsWatermark (
+        source TEXT PRIMARY KEY,
+        lastId INTEGER NOT NULL
+    );
+    CREATE TABLE statsSessionPeriod (
+        granularity TEXT NOT NULL,
+        bucket TEXT NOT NULL,
+        sessionType TEXT NOT NULL,
+        n INTEGER NOT NULL,
+        PRIMARY KEY (granularity, bucket, sessionType)
+    ) WITHOUT ROWID;
+    CREATE TABLE statsExerciseDay (
+        exerciseId INTEGER NOT NULL REFERENCES exercise(id) ON DELETE CASCADE,
+        date TEXT NOT NULL,
+        maxWeight REAL NOT NULL,
+        PRIMARY KEY (exerciseId, date)
+    ) WITHOUT ROWID;
+    CREATE TABLE statsExerciseWeek (
+        exerciseId INTEGER NOT NULL REFERENCES exercise(id) ON DELETE CASCADE,
+        week TEXT NOT NULL,
+        maxWeight REAL NOT NULL,
+        volume REAL NOT NULL,
+        logs INTEGER NOT NULL,
+        PRIMARY KEY (exerciseId, week)
+    ) WITHOUT ROWID;
+    CREATE TABLE statsExercise (
+        exerciseId INTEGER PRIMARY KEY REFERENCES exercise(id) ON DELETE CASCADE,
+        maxWeight REAL,
+        lastSessionId INTEGER,
+        lastWeight REAL
+    );
+"""
+
+STATS_TABLES = ("statsSessionPeriod", "statsExerciseDay", "statsExerciseWeek", "statsExercise")
+
+# Session buckets kept in statsSessionPeriod. 'weekday 0' moves forward to
+# Sunday; six days back is that week's Monday, which keys the week.
+SESSION_BUCKETS = {
+    "day": "s.date",
+    "week": "date(s.date, 'weekday 0', '-6 days')",
+    "month": "substr(s.date, 1, 7)",
+}
+
+# The SELECTs carry a WHERE clause so SQLite does not parse the upsert's
+# ON CONFLICT as a join constraint.
+FOLD_SESSIONS = """
+    INSERT INTO statsSessionPeriod (granularity, bucket, sessionType, n)
+    SELECT ?, {bucket} AS bucket, s.sessionType, COUNT(*)
+    FROM session s
+    WHERE s.id > ? AND s.id <= ? AND s.isPartial = 0 AND {bucket} IS NOT NULL
+    GROUP BY bucket, s.sessionType
+    ON CONFLICT (granularity, bucket, sessionType) DO UPDATE SET n = n + excluded.n
+"""
+
+_NEW_LOGS = """
+    FROM exerciseLog el
+    JOIN session s ON s.id = el.sessionId
+    JOIN workoutExercise we ON we.id = el.workoutExerciseId
+    WHERE el.id > ? AND el.id <= ?
+"""
+
+FOLD_LOGS = (
+    f"""
+    INSERT INTO statsExerciseDay (exerciseId, date, maxWeight)
+    SELECT we.exerciseId, s.date, MAX(el.weight)
+    {_NEW_LOGS} AND el.weight > 0
+    GROUP BY we.exerciseId, s.date
+    ON CONFLICT (exerciseId, date) DO UPDATE SET
+        maxWeight = MAX(maxWeight, excluded.maxWeight)
+    """,
+    # Volume is weight x reps x sets, with the achieved reps of a failed set
+    f"""
+    INSERT INTO statsExerciseWeek (exerciseId, week, maxWeight, volume, logs)
+    SELECT we.exerciseId, date(s.date, 'weekday 0', '-6 days') AS week, MAX(el.weight),
+           TOTAL(el.weight * COALESCE(el.achievedValue, we.counterValue, 0) * we.sets),
+           COUNT(*)
+    {_NEW_LOGS} AND el.weight > 0 AND date(s.date, 'weekday 0', '-6 days') IS NOT NULL
+    GROUP BY we.exerciseId, week
+    ON CONFLICT (exerciseId, week) DO UPDATE SET
+        maxWeight = MAX(maxWeight, excluded.maxWeight),
+        volume = volume + excluded.volume,
+        logs = logs + excluded.logs
+    """,
+    f"""
+    INSERT INTO statsExercise (exerciseId, maxWeight)
+    SELECT we.exerciseId, MAX(el.weight)
+    {_NEW_LOGS} AND el.weight > 0
+    GROUP BY we.exerciseId
+    ON CONFLICT (exerciseId) DO UPDATE SET
+        maxWeight = MAX(COALESCE(maxWeight, 0), excluded.maxWeight)
+    """,
+    # Bare el.weight comes from the row holding MAX(el.sessionId)
+    f"""
+    INSERT INTO statsExercise (exerciseId, lastSessionId, lastWeight)
+    SELECT we.exerciseId, MAX(el.sessionId), el.weight
+    {_NEW_LOGS} AND el.weight IS NOT NULL
+    GROUP BY we.exerciseId
+    ON CONFLICT (exerciseId) DO UPDATE SET
+        lastWeight = CASE WHEN excluded.lastSessionId >= IFNULL(lastSessionId, 0)
+                          THEN excluded.lastWeight ELSE lastWeight END,
+        lastSessionId = MAX(IFNULL(lastSessionId, 0), excluded.lastSessionId)
+    """,
+)
+
+
+def ensure_stats_tables(conn: sqlite3.Connection) -> None:
+    """Create the (empty) summary tables; runs inside the caller's transaction."""
+    if _has_table(conn, "statsWatermark"):
+        return
+    for stmt in STATS_SCHEMA.split(";"):
+        if stmt.strip():
+            conn.execute(stmt)
+    conn.executemany(
+        "INSERT INTO statsWatermark (source, lastId) VALUES (?, 0)",
+        ((source,) for source in STATS_SOURCES),
+    )
+
+
+def _stats_heads(conn: sqlite3.Connection) -> dict[str, int]:
+    # MAX() of an INTEGER PRIMARY KEY reads one b-tree edge, not the table
+    return {
+        source: conn.execute(f"SELECT IFNULL(MAX(id), 0) FROM {source}").fetchone()[0]
+        for source in STATS_SOURCES
+    }
+
+
+def stats_watermarks(conn: sqlite3.Connection) -> dict[str, int] | None:
+    """Last folded id per source table, or None before the first refresh."""
+    if not _has_table(conn, "statsWatermark"):
+        return None
+    return dict(conn.execute("SELECT source, lastId FROM statsWatermark").fetchall())
+
+
+def summaries_current(conn: sqlite3.Connection) -> bool:
+    marks = stats_watermarks(conn)
+    return marks is not None and marks == _stats_heads(conn)
+
+
+def refresh_stats(conn: sqlite3.Connection, full: bool = False) -> dict[str, int]:
+    """Fold rows past the watermarks into the summaries.
+
+    Runs inside the caller's transaction. Returns the number of new ids
+    covered per source table.
+    """
+    ensure_stats_tables(conn)
+    marks = stats_watermarks(conn)
+    heads = _stats_heads(conn)
+    if full or any(marks[s] > heads[s] for s in STATS_SOURCES):
+        for table in STATS_TABLES:
+            conn.execute(f"DELETE FROM {table}")
+        marks = dict.fromkeys(STATS_SOURCES, 0)
+
+    lo, hi = marks["session"], heads["session"]
+    if hi > lo:
+        for granularity, bucket in SESSION_BUCKETS.items():
+            conn.execute(FOLD_SESSIONS.format(bucket=bucket), (granularity, lo, hi))
+    lo, hi = marks["exerciseLog"], heads["exerciseLog"]
+    if hi > lo:
+        for stmt in FOLD_LOGS:
+            conn.execute(stmt, (lo, hi))
+
+    conn.executemany(
+        "UPDATE statsWatermark SET lastId = ? WHERE source = ?",
+        ((heads[s], s) for s in STATS_SOURCES),
+    )
+    return {s: heads[s] - marks[s] for s in STATS_SOURCES}
+
+
+# ── Stats ─────────────────────────────────────────────────────────────
+
+# Python counterparts of the analytics in OpenWOKit's Queries.swift. Each
+# aggregate is one grouped query over the whole history rather than one
+# query per exercise. Weekly buckets are ISO weeks (Monday start). When
+# the summaries are current they answer instead of the history tables.
+
+def stats_weight_history(conn: sqlite3.Connection, exercise_id: int | None = None) -> list[dict]:
+    """Max weight per exercise per session date (Queries.weightHistory)."""
+    params = (exercise_id,) if exercise_id else ()
+    if summaries_current(conn):
+        where = "d.exerciseId = ?" if exercise_id else "1=1"
+        rows = conn.execute(
+            f"""
+            SELECT d.exerciseId, e.name AS exercise, d.date, d.maxWeight AS weight
+            FROM statsExerciseDay d
+            JOIN exercise e ON e.id = d.exerciseId
+            WHERE {where}
+            ORDER BY e.name, d.exerciseId, d.date
+            """,
+            params,
+        )
+        return [dict(r) for r in rows]
+    where = "el.weight > 0" + (" AND we.exerciseId = ?" if exercise_id else "")
+    rows = conn.execute(
+        f"""
+        SELECT we.exerciseId, e.name AS exercise, s.date, MAX(el.weight) AS weight
+        FROM exerciseLog el
+        JOIN session s ON s.id = el.sessionId
+        JOIN workoutExercise we ON we.id = el.workoutExerciseId
+        JOIN exercise e ON e.id = we.exerciseId
+        WHERE {where}
+        GROUP BY we.exerciseId, s.date
+        ORDER BY e.name, we.exerciseId, s.date
+        """,
+        params,
+    )
+    return [dict(r) for r in rows]
+
+
+def _iso_week(monday: str) -> str:
+    year, week, _ = date.fromisoformat(monday).isocalendar()
+    return f"{year:04d}-W{week:02d}"
+
+
+def stats_session_counts(conn: sqlite3.Connection, granularity: str = "weekly") -> list[dict]:
+    """Non-partial sessions per week or month (Queries.sessionCountsByPeriod)."""
+    period = "week" if granularity == "weekly" else "month"
+    if summaries_current(conn):
+        rows = conn.execute(
+            """
+            SELECT bucket, sessionType, n FROM statsSessionPeriod
+            WHERE granularity = ?
+            ORDER BY bucket, n DESC, sessionType
+            """,
+            (period,),
+        )
+    else:
+        bucket = SESSION_BUCKETS[period]
+        rows = conn.execute(
+            f"""
+            SELECT {bucket} AS bucket, s.sessionType, COUNT(*) AS n
+            FROM session s
+            WHERE s.isPartial = 0 AND {bucket} IS NOT NULL
+            GROUP BY bucket, s.sessionType
+            ORDER BY bucket, n DESC, s.sessionType
+            """
+        )
+    buckets: list[dict] = []
+    for r in rows:
+        if not buckets or buckets[-1]["bucket"] != r["bucket"]:
+            # First row per bucket has the highest count: the dominant type
+            buckets.append({"bucket": r["bucket"], "count": 0, "dominantType": r["sessionType"]})
+        buckets[-1]["count"] += r["n"]
+    return [
+        {
+            "period": _iso_week(b["bucket"]) if granularity == "weekly" else b["bucket"],
+            "count": b["count"],
+            "dominantType": b["dominantType"],
+        }
+        for b in buckets
+    ]
+
+
+# SQL expression mapping an ISO date column to date.toordinal(). date()
+# pins the value to midnight, where julianday() is always N.5.
+DAY_ORDINAL = "CAST(julianday(date({})) AS INTEGER) - 1721424"
+
+
+def day_runs(days: Iterable[int]) -> tuple[list[int], list[int]]:
+    """Runs of consecutive day ordinals in sorted, distinct ``days``.
+
+    Returns the last day of each run and the run lengths.
+    """
+    if np is not None:
+        d = np.fromiter(days, dtype=np.int64)
+        if not d.size:
+            return [], []
+        # A run ends wherever the gap to the next day is not exactly 1
+        ends = np.append(np.flatnonzero(np.diff(d) != 1), d.size - 1)
+        lengths = np.diff(ends, prepend=-1)
+        return d[ends].tolist(), lengths.tolist()
+    run_ends: list[int] = []
+    lengths_: list[int] = []
+    for day in days:
+        if run_ends and day == run_ends[-1] + 1:
+            run_ends[-1] = day
+            lengths_[-1] += 1
+        else:
+            run_ends.append(day)
+            lengths_.append(1)
+    return run_ends, lengths_
+
+
+def streaks(days: Iterable[int], today: int) -> dict[str, int]:
+    """Current and longest streak (StreakLogic.swift).
+
+    The current streak counts only if the latest day is today or yesterday.
+    """
+    ends, lengths = day_runs(days)
+    current = lengths[-1] if ends and ends[-1] in (today, today - 1) else 0
+    return {"current": current, "longest": max(lengths, default=0)}
+
+
+def _session_days(conn: sqlite3.Connection) -> list[int]:
+    if summaries_current(conn):
+        sql = f"""
+            SELECT DISTINCT {DAY_ORDINAL.format('bucket')} AS day FROM statsSessionPeriod
+            WHERE granularity = 'day' AND day IS NOT NULL ORDER BY day
+        """
+    else:
+        sql = f"""
+            SELECT DISTINCT {DAY_ORDINAL.format('date')} AS day FROM session
+            WHERE isPartial = 0 AND day IS NOT NULL ORDER BY day
+        """
+    return [r[0] for r in conn.execute(sql)]
+
+
+def _challenge_days(conn: sqlite3.Connection) -> list[int]:
+    return [r[0] for r in conn.execute(
+        f"""
+        SELECT DISTINCT {DAY_ORDINAL.format('date')} AS day FROM dailyChallenge
+        WHERE setsCompleted = 3 AND day IS NOT NULL ORDER BY day
+        """
+    )]
+
+
+def stats_streaks(conn: sqlite3.Connection, today: date | None = None) -> dict[str, dict[str, int]]:
+    """Gym and challenge streaks, current and longest."""
+    ordinal = (today or date.today()).toordinal()
+    return {
+        "gym": streaks(_session_days(conn), ordinal),
+        "challenge": streaks(_challenge_days(conn), ordinal),
+    }
+
+
+def stats_heatmap(conn: sqlite3.Connection, year: int) -> dict:
+    """Challenge sets laid out like the app's ChallengeHeatmap.
+
+    ``weeks`` holds one list of seven days (Monday first) per week from the
+    Monday on or before Jan 1 to the Sunday on or after Dec 31; days outside
+    ``year`` are None.
+    """
+    first = date(year, 1, 1).toordinal()
+    last = date(year, 12, 31).toordinal()
+    # date.weekday() is 0 on Monday, and ordinal 1 (0001-01-01) was a Monday
+    start = first - (first - 1) % 7
+    end = last + 6 - (last - 1) % 7
+    rows = conn.execute(
+        f"""
+        SELECT {DAY_ORDINAL.format('date')} AS day, setsCompleted FROM dailyChallenge
+        WHERE date >= ? AND date <= ? AND setsCompleted > 0
+        """,
+        (f"{year:04d}-01-01", f"{year:04d}-12-31"),
+    ).fetchall()
+    n = end - start + 1
+    if np is not None:
+        cells = np.zeros(n, dtype=np.int64)
+        if rows:
+            days, sets = np.array(rows, dtype=np.int64).T
+            cells[days - start] = sets
+        grid = cells.reshape(-1, 7).tolist()
+    else:
+        flat = [0] * n
+        for day, sets in rows:
+            flat[day - start] = sets
+        grid = [flat[i:i + 7] for i in range(0, n, 7)]
+    for i in range(first - start):
+        grid[0][i] = None
+    for i in range(7 - (end - last), 7):
+        grid[-1][i] = None
+    return {"year": year, "start": date.fromordinal(start).isoformat(), "weeks": grid}
+
+
+def stats_personal_bests(conn: sqlite3.Connection) -> dict:
+    """All-time bests (Queries.personalBests)."""
+    if summaries_current(conn):
+        sql = """
+            SELECT e.name, x.maxWeight FROM statsExercise x
+            JOIN exercise e ON e.id = x.exerciseId
+            WHERE x.maxWeight > 0
+            ORDER BY x.maxWeight DESC
+            LIMIT 1
+        """
+    else:
+        sql = """
+            SELECT e.name, MAX(el.weight) AS maxWeight
+            FROM exerciseLog el
+            JOIN workoutExercise we ON we.id = el.workoutExerciseId
+            JOIN exercise e ON e.id = we.exerciseId
+            WHERE el.weight > 0
+            GROUP BY we.exerciseId
+            ORDER BY MAX(el.weight) DESC
+            LIMIT 1
+        """
+    heaviest = conn.execute(sql).fetchone()
+    weekly = stats_session_counts(conn, "weekly")
+    return {
+        "heaviestLift": (
+            {"exercise": heaviest["name"], "weight": heaviest["maxWeight"]}
+            if heaviest else None
+        ),
+        "longestSessionStreak": max(day_runs(_session_days(conn))[1], default=0),
+        "longestChallengeStreak": max(day_runs(_challenge_days(conn))[1], default=0),
+        "mostSessionsInWeek": max((b["count"] for b in weekly), default=0),
+    }
+
+
+def stats_challenge_history(conn: sqlite3.Connection, year: int) -> dict[str, int]:
+    """Challenge sets per date for one year (Queries.challengeHistory)."""
+    rows = conn.execute(
+        """
+        SELECT date, setsCompleted FROM dailyChallenge
+        WHERE date >= ? AND date <= ? AND setsCompleted > 0
+        ORDER BY date
+        """,
+        (f"{year:04d}-01-01", f"{year:04d}-12-31"),
+    )
+    return {r["date"]: r["setsCompleted"] for r in rows}
+
+
+def stats_last_weights(conn: sqlite3.Connection, workout_id: int) -> list[dict]:
+    """Latest weight per active exercise of a workout (Queries.lastWeights).
+
+    Looks across every workout sharing the exerciseId, like the app does.
+    """
+    if summaries_current(conn):
+        latest = conn.execute(
+            """
+            SELECT exerciseId, lastWeight FROM statsExercise
+            WHERE lastWeight IS NOT NULL AND exerciseId IN (
+                SELECT exerciseId FROM workoutExercise WHERE workoutId = ? AND isActive = 1
+            )
+            """,
+            (workout_id,),
+        )
+    else:
+        # One scan of exerciseLog; SQLite returns the bare el.weight column
+        # from the row holding MAX(el.sessionId) within each group.
+        latest = conn.execute(
+            """
+            SELECT any_we.exerciseId, el.weight, MAX(el.sessionId)
+            FROM exerciseLog el
+            JOIN workoutExercise any_we ON any_we.id = el.workoutExerciseId
+            WHERE el.weight IS NOT NULL
+              AND any_we.exerciseId IN (
+                  SELECT exerciseId FROM workoutExercise WHERE workoutId = ? AND isActive = 1
+              )
+            GROUP BY any_we.exerciseId
+            """,
+            (workout_id,),
+        )
+    weights = {r[0]: r[1] for r in latest}
+    rows = conn.execute(
+        """
+        SELECT cur.id AS workoutExerciseId, cur.exerciseId, e.name AS exercise, cur.position
+        FROM workoutExercise cur
+        JOIN exercise e ON e.id = cur.exerciseId
+        WHERE cur.workoutId = ? AND cur.isActive = 1
+        ORDER BY cur.position
+        """,
+        (workout_id,),
+    )
+    return [
+        {"workoutExerciseId": r["workoutExerciseId"], "exercise": r["exercise"],
+         "position": r["position"], "weight": weights[r["exerciseId"]]}
+        for r in rows if r["exerciseId"] in weights
+    ]
+
+
+def stats_weekly_volume(conn: sqlite3.Connection, exercise_id: int | None = None) -> list[dict]:
+    """Max weight and volume per exercise per ISO week."""
+    params = (exercise_id,) if exercise_id else ()
+    if summaries_current(conn):
+        source = """
+            SELECT exerciseId, week, maxWeight, volume FROM statsExerciseWeek
+        """
+    else:
+        source = """
+            SELECT we.exerciseId, date(s.date, 'weekday 0', '-6 days') AS week,
+                   MAX(el.weight) AS maxWeight,
+                   TOTAL(el.weight * COALESCE(el.achievedValue, we.counterValue, 0) * we.sets) AS volume
+            FROM exerciseLog el
+            JOIN session s ON s.id = el.sessionId
+            JOIN workoutExercise we ON we.id = el.workoutExerciseId
+            WHERE el.weight > 0 AND date(s.date, 'weekday 0', '-6 days') IS NOT NULL
+            GROUP BY we.exerciseId, week
+        """
+    where = "w.exerciseId = ?" if exercise_id else "1=1"
+    rows = conn.execute(
+        f"""
+        SELECT e.name AS exercise, w.week, w.maxWeight, w.volume
+        FROM ({source}) w
+        JOIN exercise e ON e.id = w.exerciseId
+        WHERE {where}
+        ORDER BY e.name, w.exerciseId, w.week
+        """,
+        params,
+    )
+    return [
+        {"exercise": r["exercise"], "week": _iso_week(r["week"]),
+         "maxWeight": r["maxWeight"], "volume": r["volume"]}
+        for r in rows
+    ]
+
+
+def print_table(rows: list[dict], columns: list[str]) -> None:
+    if not rows:
+        print("No data.")
+        return
+    cells = [["" if r[c] is None else str(r[c]) for c in columns] for r in rows]
+    widths = [max(len(c), *(len(row[i]) for row in cells)) for i, c in enumerate(columns)]
+    print()
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)))
+    print("  ".join("─" * w for w in widths))
+    for row in cells:
+        print("  ".join(v.ljust(w) for v, w in zip(row, widths)))
+
+
+HEATMAP_CELLS = {None: " ", 0: "·", 1: "░", 2: "▒"}
+
+
+def print_heatmap(heatmap: dict) -> None:
+    """Seven rows (Mon–Sun) by one column per week, like the app's grid."""
+    start = date.fromisoformat(heatmap["start"])
+    weeks = heatmap["weeks"]
+    months = ""
+    for i in range(len(weeks)):
+        # Label the column holding the first day of each month
+        sunday = start + timedelta(days=7 * i + 6)
+        if sunday.day <= 7 and sunday.year == heatmap["year"] and len(months) <= i:
+            months = months.ljust(i) + sunday.strftime("%b")
+    print()
+    print("    " + months)
+    for d, label in enumerate(("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")):
+        print(label + " " + "".join(HEATMAP_CELLS.get(week[d], "█") for week in weeks))
+    print()
+    print("    Less " + "".join(HEATMAP_CELLS[n] for n in (0, 1, 2)) + "█ More")
+
+
+def cmd_stats(conn: sqlite3.Connection, args: argparse.Namespace) -> None:
+    if args.stats_command == "refresh":
+        conn.execute("BEGIN")
+        try:
+            folded = refresh_stats(conn, full=args.full)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        print(
+            f"Folded {folded['session']} session id(s) and "
+            f"{folded['exerciseLog']} log id(s) into the summaries."
+        )
+        return
+    if stats_watermarks(conn) is not None and not summaries_current(conn):
+        print("Summaries are out of date; run `openwo stats refresh`.", file=sys.stderr)
+
+    if args.stats_command == "weights":
+        exercise_id = resolve_exercise(conn, args.exercise)["id"] if args.exercise else None
+        result = stats_weight_history(conn, exercise_id)
+        columns = ["exercise", "date", "weight"]
+    elif args.stats_command == "volume":
+        exercise_id = resolve_exercise(conn, args.exercise)["id"] if args.exercise else None
+        result = stats_weekly_volume(conn, exercise_id)
+        columns = ["exercise", "week", "maxWeight", "volume"]
+    elif args.stats_command == "sessions":
+        result = stats_session_counts(conn, args.granularity)
+        columns = ["period", "count", "dominantType"]
+    elif args.stats_command == "bests":
+        result = stats_personal_bests(conn)
+        heaviest = result["heaviestLift"]
+        rows = [
+            {"best": "Heaviest lift",
+             "value": f"{heaviest['weight']:g} ({heaviest['exercise']})" if heaviest else None},
+            {"best": "Longest session streak", "value": f"{result['longestSessionStreak']} day(s)"},
+            {"best": "Longest challenge streak", "value": f"{result['longestChallengeStreak']} day(s)"},
+            {"best": "Most sessions in a week", "value": result["mostSessionsInWeek"]},
+        ]
+        if args.format == "json":
+            print(json.dumps(result, indent=2))
+        else:
+            print_table(rows, ["best", "value"])
+        return
+    elif args.stats_command == "streaks":
+        result = stats_streaks(conn)
+        rows = [
+            {"streak": name, "current": s["current"], "longest": s["longest"]}
+            for name, s in (("Gym", result["gym"]), ("Challenge", result["challenge"]))
+        ]
+        if args.format == "json":
+            print(json.dumps(result, indent=2))
+        else:
+            print_table(rows, ["streak", "current", "longest"])
+        return
+    elif args.stats_command == "heatmap":
+        result = stats_heatmap(conn, args.year)
+        if args.format == "json":
+            print(json.dumps(result, indent=2))
+        else:
+            print_heatmap(result)
+        return
+    elif args.stats_command == "challenges":
+        history = stats_challenge_history(conn, args.year)
+        result = [{"date": d, "sets": n} for d, n in history.items()]
+        columns = ["date", "sets"]
+    elif args.stats_command == "last-weights":
+        workout = resolve_workout(conn, args.workout)
+        result = stats_last_weights(conn, workout["id"])
+        columns = ["position", "exercise", "weight"]
+
+    if args.format == "json":
+        print(json.dumps(result, indent=2))
+    else:
+        print_table(result, columns)
 
-    print(f"\n{'ID':>4}  {'Name':<35} {'Equipment':<15} {'Muscles':<25} {'Level':<12}")
-    print(f"{'─'*4}  {'─'*35} {'─'*15} {'─'*25} {'─'*12}")
-    for r in rows:
-        muscles = r["primaryMuscles"] or ""
-        print(
-            f"{r['id']:>4}  {r['name']:<35} {(r['equipment'] or '')::<15} "
-            f"{muscles:<25} {(r['level'] or ''):<12}"
-        )
-    print(f"\n{len(rows)} exercise(s) found.")
 
+# ── Shell ─────────────────────────────────────────────────────────────
 
-def cmd_swap(conn: sqlite3.Connection, args: argparse.Namespace, db_path: Path) -> None:
-    workout = resolve_workout(conn, args.workout)
-    old_ex = resolve_exercise(conn, args.old)
-    new_ex = resolve_exercise(conn, args.new)
+# `openwo shell` runs subcommands against one open connection, so the
+# interpreter start, discovery and PRAGMAs are paid once and the name
+# indexes and compiled statements stay warm. The name indexes are rebuilt
+# only after PRAGMA data_version moves, i.e. when another connection (the
+# app, via iCloud) has committed.
 
-    # Find the active workoutExercise row for the old exercise
-    we_row = conn.execute(
-        """
-        SELECT * FROM workoutExercise
-        WHERE workoutId = ? AND exerciseId = ? AND isActive = 1
-        """,
-        (workout["id"], old_ex["id"]),
-    ).fetchone()
+SHELL_PROMPT = "openwo> "
 
-    if not we_row:
-        die(
-            f"\"{old_ex['name']}\" is not an active exercise in "
-            f"\"{workout['name']}\"."
-        )
 
-    # Determine programming for the new row
-    sets = args.sets if args.sets is not None else we_row["sets"]
-    reps = args.reps if args.reps is not None else we_row["counterValue"]
-    rest = args.rest if args.rest is not None else we_row["restSeconds"]
+def _shell_history() -> Path:
+    return _data_dir() / "shell-history"
 
-    print(f"\nSwap in \"{workout['name']}\":")
-    print(f"  Position {we_row['position']}: {old_ex['name']} → {new_ex['name']}")
-    print(f"  Sets: {sets}, Reps/Value: {reps}, Rest: {rest}s")
 
-    if not args.execute:
-        print("\nDry run — pass --execute to apply.")
-        return
+def shell_line(
+    conn: sqlite3.Connection, parser: argparse.ArgumentParser, db_path: Path, line: str,
+) -> bool:
+    """Run one shell line. False once the user asks to leave."""
+    global _backup_done
+    try:
+        argv = shlex.split(line)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return True
+    if not argv:
+        return True
+    if argv[0] in ("exit", "quit"):
+        return False
+    if argv[0] == "help":
+        parser.print_help()
+        return True
+    try:
+        args = parser.parse_args(argv)
+    except SystemExit:  # argparse already printed the usage error
+        return True
+    if args.command == "shell" or args.db or args.fleet:
+        print("Error: already in a shell on " + str(db_path), file=sys.stderr)
+        return True
+    if args.command in ("checkout", "publish", "discard"):
+        print(f"Error: leave the shell to {args.command}.", file=sys.stderr)
+        return True
+    # Each mutating command gets its own snapshot, as it would from the CLI
+    _backup_done = args.no_backup
+    profiler = start_profiling(args)
+    if profiler is not None:
+        profiler.attach(conn)
+    try:
+        apply_profile(conn, command_profile(args))
+        with phase("migration"):
+            prepare_schema(conn, args, db_path)
+        with phase("command"):
+            run_command(conn, args, db_path)
+    except SystemExit:  # die() already printed the message
+        pass
+    except KeyboardInterrupt:
+        print("Interrupted.", file=sys.stderr)
+    finally:
+        if conn.in_transaction:
+            conn.rollback()
+        if profiler is not None:
+            conn.set_trace_callback(None)
+            stop_profiling(args, argv)
+    return True
 
-    backup_db(db_path)
-    conn.execute("BEGIN")
+
+def cmd_shell(conn: sqlite3.Connection, parser: argparse.ArgumentParser, db_path: Path) -> None:
     try:
-        # Mark old row inactive; park position at -id to free the unique constraint
-        conn.execute(
-            "UPDATE workoutExercise SET isActive = 0, position = -id WHERE id = ?",
-            (we_row["id"],),
-        )
-        # Insert new row at same position
-        conn.execute(
-            """
-            INSERT INTO workoutExercise
-              (workoutId, exerciseId, position, counterUnit, counterValue,
-               counterLabel, restSeconds, sets, isDailyChallenge, hasWeight, isActive)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 1)
-            """,
-            (
-                workout["id"],
-                new_ex["id"],
-                we_row["position"],
-                we_row["counterUnit"],
-                reps,
-                we_row["counterLabel"],
-                rest,
-                sets,
-                we_row["isDailyChallenge"],
-                1 if new_ex["hasWeight"] else 0,
-            ),
-        )
-        conn.commit()
-        print("Done.")
-    except Exception:
-        conn.rollback()
-        raise
+        import readline
+    except ImportError:  # not available on every platform
+        readline = None
+    history = _shell_history()
+    if readline:
+        try:
+            readline.read_history_file(history)
+        except OSError:
+            pass
+    print(f"OpenWO shell on {db_path}. Type help for commands, exit to leave.")
+    while True:
+        try:
+            line = input(SHELL_PROMPT)
+        except EOFError:
+            print()
+            break
+        except KeyboardInterrupt:
+            print()
+            continue
+        if not shell_line(conn, parser, db_path, line):
+            break
+    if readline:
+        try:
+            history.parent.mkdir(parents=True, exist_ok=True)
+            readline.write_history_file(history)
+        except OSError:
+            pass
 
 
-def cmd_add(conn: sqlite3.Connection, args: argparse.Namespace, db_path: Path) -> None:
-    workout = resolve_workout(conn, args.workout)
-    exercise = resolve_exercise(conn, args.exercise)
+# ── Fleet ─────────────────────────────────────────────────────────────
 
-    # Determine position
-    max_pos_row = conn.execute(
-        "SELECT MAX(position) AS mp FROM workoutExercise WHERE workoutId = ? AND isActive = 1",
-        (workout["id"],),
-    ).fetchone()
-    max_pos = max_pos_row["mp"] if max_pos_row and max_pos_row["mp"] is not None else 0
+# --fleet runs one command over many databases. Each database is a job for
+# a worker process, which opens its own connection and captures the
+# command's stdout/stderr; results are reported in path order whatever
+# order the workers finish in.
 
-    if args.position is not None:
-        position = args.position
-        if position < 1 or position > max_pos + 1:
-            die(f"Position must be between 1 and {max_pos + 1}.")
+FLEET_COMMANDS = ("show", "exercises", "stats", "export", "batch", "apply", "dump-spec")
+
+
+def fleet_databases(spec: str) -> list[Path]:
+    """The ``.sqlite`` files in directory ``spec``, or matching glob ``spec``, sorted."""
+    root = Path(spec).expanduser()
+    if root.is_dir():
+        paths = root.glob("*.sqlite")
     else:
-        position = max_pos + 1
+        paths = (Path(p) for p in glob.glob(str(root), recursive=True))
+    found = sorted(p for p in paths if p.is_file())
+    if not found:
+        die(f"No databases match {spec}")
+    return found
 
-    sets = args.sets if args.sets is not None else 3
-    counter_unit = "timer" if args.timed else "reps"
-    reps = args.reps if args.reps is not None else (60 if args.timed else 10)
-    rest = args.rest if args.rest is not None else 30
-    has_weight = args.weight if args.weight else bool(exercise["hasWeight"])
 
-    print(f"\nAdd to \"{workout['name']}\":")
-    print(f"  Position {position}: {exercise['name']}")
-    print(f"  Sets: {sets}, {'Time' if args.timed else 'Reps'}: {reps}, Rest: {rest}s, Weight: {'Y' if has_weight else 'N'}")
+def fleet_job(db_path: str, args: argparse.Namespace) -> dict:
+    """Run one command against one database; never raises."""
+    global _backup_done
+    path = Path(db_path)
+    args = argparse.Namespace(**vars(args))
+    if args.command == "export" and args.output:
+        # --output names a directory in fleet mode: one file per database
+        args.output = str(Path(args.output) / f"{path.stem}.{args.format}")
+    _backup_done = args.no_backup
+    out, err = io.StringIO(), io.StringIO()
+    ok = True
+    t0 = time.perf_counter()
+    with redirect_stdout(out), redirect_stderr(err):
+        conn = None
+        try:
+            conn = connect(path, read_only=not command_writes(args), profile=command_profile(args))
+            prepare_schema(conn, args, path)
+            run_command(conn, args, path)
+        except SystemExit as e:  # die() printed the reason to stderr
+            ok = not e.code
+        except sqlite3.Error as e:
+            ok = False
+            print(f"Error: {e}", file=sys.stderr)
+        except Exception:
+            ok = False
+            traceback.print_exc()
+        finally:
+            if conn is not None:
+                if conn.in_transaction:
+                    conn.rollback()
+                conn.close()
+    return {
+        "database": db_path, "ok": ok, "seconds": round(time.perf_counter() - t0, 4),
+        "stdout": out.getvalue(), "stderr": err.getvalue(),
+    }
 
-    if position <= max_pos:
-        print(f"  (exercises at position {position}+ will shift down)")
 
-    if not args.execute:
-        print("\nDry run — pass --execute to apply.")
+def run_fleet(
+    paths: list[Path], args: argparse.Namespace, workers: int,
+) -> Iterator[dict]:
+    """Yield one result per database, in ``paths`` order."""
+    jobs = [str(p) for p in paths]
+    if workers <= 1 or len(jobs) == 1:
+        for job in jobs:
+            yield fleet_job(job, args)
         return
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+        yield from pool.map(fleet_job, jobs, itertools.repeat(args))
 
-    backup_db(db_path)
-    conn.execute("BEGIN")
-    try:
-        if position <= max_pos:
-            # Fetch all active rows at or after the insertion point
-            affected = conn.execute(
-                """
-                SELECT id, position FROM workoutExercise
-                WHERE workoutId = ? AND isActive = 1 AND position >= ?
-                ORDER BY position
-                """,
-                (workout["id"], position),
-            ).fetchall()
-            # Phase 1: move to temporary positions
-            offset = max_pos + 100
-            for r in affected:
-                conn.execute(
-                    "UPDATE workoutExercise SET position = ? WHERE id = ?",
-                    (offset + r["position"], r["id"]),
-                )
-            # Phase 2: set final positions (+1 from original)
-            for r in affected:
-                conn.execute(
-                    "UPDATE workoutExercise SET position = ? WHERE id = ?",
-                    (r["position"] + 1, r["id"]),
-                )
-        conn.execute(
-            """
-            INSERT INTO workoutExercise
-              (workoutId, exerciseId, position, counterUnit, counterValue,
-               counterLabel, restSeconds, sets, isDailyChallenge, hasWeight, isActive)
-            VALUES (?, ?, ?, ?, ?, NULL, ?, ?, 0, ?, 1)
-            """,
-            (
-                workout["id"],
-                exercise["id"],
-                position,
-                counter_unit,
-                reps,
-                rest,
-                sets,
-                1 if has_weight else 0,
-            ),
-        )
-        conn.commit()
-        print("Done.")
-    except Exception:
-        conn.rollback()
-        raise
 
+def cmd_fleet(args: argparse.Namespace) -> None:
+    if args.db:
+        die("Use either --db or --fleet, not both.")
+    if args.command not in FLEET_COMMANDS:
+        die(f"Fleet mode supports: {', '.join(FLEET_COMMANDS)}.")
+    paths = fleet_databases(args.fleet)
+    if args.command == "export" and args.output:
+        Path(args.output).mkdir(parents=True, exist_ok=True)
+    workers = args.workers or os.cpu_count() or 1
 
-def cmd_remove(conn: sqlite3.Connection, args: argparse.Namespace, db_path: Path) -> None:
-    workout = resolve_workout(conn, args.workout)
-    exercise = resolve_exercise(conn, args.exercise)
+    t0 = time.perf_counter()
+    failed = 0
+    results = []
+    for res in run_fleet(paths, args, workers):
+        failed += not res["ok"]
+        if args.fleet_report == "json":
+            results.append(res)
+            continue
+        status = "" if res["ok"] else " FAILED"
+        sys.stdout.write(f"== {res['database']}{status} ({res['seconds'] * 1e3:.0f}ms) ==\n")
+        sys.stdout.write(res["stdout"])
+        if res["stderr"]:
+            sys.stdout.write("".join(f"  ! {line}\n" for line in res["stderr"].splitlines()))
+        sys.stdout.flush()
+    if args.fleet_report == "json":
+        json.dump(results, sys.stdout, indent=2)
+        sys.stdout.write("\n")
 
-    we_row = conn.execute(
-        """
-        SELECT * FROM workoutExercise
-        WHERE workoutId = ? AND exerciseId = ? AND isActive = 1
-        """,
-        (workout["id"], exercise["id"]),
-    ).fetchone()
+    print(
+        f"\nFleet: {len(paths)} database(s), {len(paths) - failed} ok, {failed} failed "
+        f"in {time.perf_counter() - t0:.1f}s ({min(workers, len(paths))} worker(s)).",
+        file=sys.stderr,
+    )
+    if failed:
+        sys.exit(1)
 
-    if not we_row:
-        die(
-            f"\"{exercise['name']}\" is not an active exercise in "
-            f"\"{workout['name']}\"."
-        )
 
-    print(f"\nRemove from \"{workout['name']}\":")
-    print(f"  Position {we_row['position']}: {exercise['name']}")
+# ── Doctor ────────────────────────────────────────────────────────────
 
-    if not args.execute:
-        print("\nDry run — pass --execute to apply.")
-        return
+# `openwo doctor` collects the statements the CLI actually issues by running
+# a fixed set of commands against an in-memory copy of the schema (plus
+# sqlite_stat1) seeded with a few rows, then EXPLAINs each one against the
+# real database. Candidate indexes are tried on the copy first: one is
+# recommended when a statement's plan switches to it, whether the statement
+# scans today or walks a wider index (e.g. a workout's inactive history).
 
-    backup_db(db_path)
-    conn.execute("BEGIN")
-    try:
-        # Mark inactive; park position at -id to free the unique constraint
-        conn.execute(
-            "UPDATE workoutExercise SET isActive = 0, position = -id WHERE id = ?",
-            (we_row["id"],),
-        )
-        # Shift positions up for remaining exercises
-        affected = conn.execute(
-            """
-            SELECT id, position FROM workoutExercise
-            WHERE workoutId = ? AND isActive = 1 AND position > ?
-            ORDER BY position
-            """,
-            (workout["id"], we_row["position"]),
-        ).fetchall()
-        # Phase 1: move to temporary positions
-        offset = we_row["position"] + 100
-        for r in affected:
-            conn.execute(
-                "UPDATE workoutExercise SET position = ? WHERE id = ?",
-                (offset + r["position"], r["id"]),
-            )
-        # Phase 2: set final positions (-1 from original)
-        for r in affected:
-            conn.execute(
-                "UPDATE workoutExercise SET position = ? WHERE id = ?",
-                (r["position"] - 1, r["id"]),
-            )
-        conn.commit()
-        print("Done.")
-    except Exception:
-        conn.rollback()
-        raise
+DOCTOR_SEED = """
+    INSERT INTO exercise (id, name, counterUnit, defaultValue, hasWeight, equipment, primaryMuscles)
+    VALUES (1, 'Doctor Press', 'reps', 10, 1, 'barbell', '["chest"]'),
+           (2, 'Doctor Row', 'reps', 10, 1, 'cable', '["lats"]'),
+           (3, 'Doctor Squat', 'reps', 10, 1, 'barbell', '["quadriceps"]'),
+           (4, 'Doctor Plank', 'timer', 60, 0, 'body only', '["abdominals"]');
+    INSERT INTO workout (id, name) VALUES (1, 'Doctor Day');
+    INSERT INTO workoutExercise (id, workoutId, exerciseId, position, counterValue, hasWeight)
+    VALUES (1, 1, 1, 1, 10, 1), (2, 1, 2, 2, 10, 1), (3, 1, 3, 3, 10, 1);
+    INSERT INTO session (id, sessionType, date, startedAt, durationSeconds)
+    VALUES (1, 'doctor', '2024-01-01', '2024-01-01T07:00:00', 3000);
+    INSERT INTO exerciseLog (sessionId, workoutExerciseId, weight) VALUES (1, 1, 50), (1, 2, 40);
+    INSERT INTO dailyChallenge (date, setsCompleted) VALUES ('2024-01-01', 3);
+"""
 
+# Run in order; the stats commands run before and after a refresh so both
+# the live and the summary paths are seen.
+DOCTOR_COMMANDS = [
+    ["show"], ["show", "Doctor Day", "--all"],
+    ["exercises", "doctor"], ["exercises", "--muscle", "chest", "--equipment", "barbell"],
+    ["stats", "weights"], ["stats", "volume"], ["stats", "sessions"], ["stats", "bests"],
+    ["stats", "last-weights", "Doctor Day"], ["stats", "streaks"],
+    ["stats", "challenges", "--year", "2024"], ["stats", "heatmap", "--year", "2024"],
+    ["stats", "refresh"],
+    ["stats", "weights"], ["stats", "volume"], ["stats", "bests"],
+    ["stats", "last-weights", "Doctor Day"],
+    ["export"],
+    ["swap", "Doctor Day", "Doctor Press", "Doctor Plank", "--execute"],
+    ["add", "Doctor Day", "Doctor Press", "--position", "1", "--execute"],
+    ["add", "Doctor Day", "Doctor Squat", "--execute"],
+    ["reorder", "Doctor Day", "--move", "3", "--to", "1", "--execute"],
+    ["remove", "Doctor Day", "Doctor Row", "--execute"],
+]
 
-def cmd_reorder(conn: sqlite3.Connection, args: argparse.Namespace, db_path: Path) -> None:
-    workout = resolve_workout(conn, args.workout)
-    from_pos = args.move
-    to_pos = args.to
+# Partial indexes only serve queries that spell out ``isActive = 1``,
+# which every active-row lookup in this file does.
+DOCTOR_INDEXES = {
+    "workoutExercise_activeExercise":
+        "CREATE INDEX IF NOT EXISTS workoutExercise_activeExercise "
+        "ON workoutExercise(workoutId, exerciseId) WHERE isActive = 1",
+    "workoutExercise_activePosition":
+        "CREATE INDEX IF NOT EXISTS workoutExercise_activePosition "
+        "ON workoutExercise(workoutId, position) WHERE isActive = 1",
+    "exerciseLog_weight":
+        "CREATE INDEX IF NOT EXISTS exerciseLog_weight "
+        "ON exerciseLog(workoutExerciseId, sessionId, weight) WHERE weight IS NOT NULL",
+}
 
-    # Fetch active exercises
-    rows = conn.execute(
-        """
-        SELECT we.id, we.position, e.name
-        FROM workoutExercise we
-        JOIN exercise e ON e.id = we.exerciseId
-        WHERE we.workoutId = ? AND we.isActive = 1
-        ORDER BY we.position
-        """,
-        (workout["id"],),
+SKIP_EXPLAIN = ("PRAGMA", "BEGIN", "COMMIT", "ROLLBACK", "END", "SAVEPOINT", "RELEASE",
+                "CREATE", "DROP", "ALTER", "ANALYZE", "--")
+
+
+def schema_sandbox(conn: sqlite3.Connection) -> sqlite3.Connection:
+    """In-memory database with ``conn``'s schema and planner statistics, no rows."""
+    sandbox = sqlite3.connect(":memory:", isolation_level=None)
+    sandbox.row_factory = sqlite3.Row
+    shadow = {r[0] for r in conn.execute("SELECT name FROM pragma_table_list WHERE type = 'shadow'")}
+    objects = conn.execute(
+        """SELECT name, sql FROM sqlite_master
+           WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%'
+           ORDER BY CASE type WHEN 'table' THEN 0 WHEN 'index' THEN 1 WHEN 'view' THEN 2 ELSE 3 END"""
     ).fetchall()
+    for name, sql in objects:
+        if name not in shadow:
+            sandbox.execute(sql)
+    if _has_table(conn, "sqlite_stat1"):
+        sandbox.execute("ANALYZE sqlite_master")
+        sandbox.execute("DELETE FROM sqlite_stat1")
+        sandbox.executemany(
+            "INSERT INTO sqlite_stat1 VALUES (?, ?, ?)",
+            conn.execute("SELECT tbl, idx, stat FROM sqlite_stat1"),
+        )
+        sandbox.execute("ANALYZE sqlite_schema")  # reload the statistics
+    if _has_table(sandbox, "statsWatermark"):
+        # The sandbox has no rows, so nothing has been folded into its summaries
+        sandbox.executemany(
+            "INSERT INTO statsWatermark (source, lastId) VALUES (?, 0)",
+            ((source,) for source in STATS_SOURCES),
+        )
+    sandbox.execute(f"PRAGMA user_version = {schema_version(conn)}")
+    sandbox.execute("PRAGMA foreign_keys = ON")
+    return sandbox
 
-    positions = [r["position"] for r in rows]
-    if from_pos not in positions:
-        die(f"No active exercise at position {from_pos}.")
-    if to_pos < 1 or to_pos > max(positions):
-        die(f"Target position must be between 1 and {max(positions)}.")
-    if from_pos == to_pos:
-        die("Source and target positions are the same.")
 
-    moving = next(r for r in rows if r["position"] == from_pos)
-    print(f"\nReorder in \"{workout['name']}\":")
-    print(f"  Move \"{moving['name']}\" from position {from_pos} to {to_pos}")
+def capture_statements(sandbox: sqlite3.Connection) -> dict[str, str]:
+    """normalized SQL -> first expanded statement, from running DOCTOR_COMMANDS."""
+    global _backup_done
+    seen: dict[str, str] = {}
 
-    if not args.execute:
-        print("\nDry run — pass --execute to apply.")
-        return
+    def on_statement(sql: str) -> None:
+        if not sql.lstrip().upper().startswith(SKIP_EXPLAIN):
+            seen.setdefault(normalize_sql(sql), sql)
 
-    backup_db(db_path)
-    conn.execute("BEGIN")
+    sandbox.executescript(DOCTOR_SEED)
+    parser = build_parser()
+    sandbox_path = Path(":memory:")
+    saved = _backup_done
+    _backup_done = True  # nothing to snapshot
+    sandbox.set_trace_callback(on_statement)
     try:
-        # Build the reordered list in Python to avoid unique constraint
-        # collisions from bulk UPDATE position arithmetic
-        ordered = list(rows)
-        from_idx = next(i for i, r in enumerate(ordered) if r["position"] == from_pos)
-        to_idx = next(i for i, r in enumerate(ordered) if r["position"] == to_pos)
-        item = ordered.pop(from_idx)
-        ordered.insert(to_idx, item)
-
-        # Phase 1: move all affected rows to temporary positions
-        offset = max(positions) + 100
-        for i, r in enumerate(ordered):
-            conn.execute(
-                "UPDATE workoutExercise SET position = ? WHERE id = ?",
-                (offset + i, r["id"]),
-            )
-        # Phase 2: set final positions
-        for i, r in enumerate(ordered):
-            conn.execute(
-                "UPDATE workoutExercise SET position = ? WHERE id = ?",
-                (i + 1, r["id"]),
-            )
+        with open(os.devnull, "w") as devnull, redirect_stdout(devnull), redirect_stderr(devnull):
+            for argv in DOCTOR_COMMANDS:
+                try:
+                    run_command(sandbox, parser.parse_args(argv), sandbox_path)
+                except SystemExit:
+                    pass
+                if sandbox.in_transaction:
+                    sandbox.rollback()
+    finally:
+        sandbox.set_trace_callback(None)
+        _backup_done = saved
+    return seen
 
-        conn.commit()
-        print("Done.")
-    except Exception:
-        conn.rollback()
-        raise
 
+def query_plan(conn: sqlite3.Connection, sql: str) -> list[str]:
+    return [r[3] for r in conn.execute("EXPLAIN QUERY PLAN " + sql)]
 
-def cmd_import_exercises(conn: sqlite3.Connection, args: argparse.Namespace, db_path: Path) -> None:
-    file_path = Path(args.file)
-    if not file_path.exists():
-        die(f"File not found: {file_path}")
 
-    with open(file_path) as f:
-        data = json.load(f)
+def plan_problems(sql: str, plan: list[str], tables: set[str]) -> list[str]:
+    """Plan steps that read a whole table or sort in a temp b-tree.
 
-    if not isinstance(data, list):
-        die("Expected a JSON array of exercise objects.")
+    Scans are only flagged in statements that filter or join; a bare
+    ``SELECT ... FROM t`` means to read every row.
+    """
+    filtered = " WHERE " in sql or " JOIN " in sql
+    problems = []
+    for step in plan:
+        words = step.split()
+        if words[0] == "SCAN" and filtered and words[1] in tables and "INDEX" not in words:
+            problems.append(step)
+        elif step.startswith("USE TEMP B-TREE"):
+            problems.append(step)
+    return problems
 
-    # Get existing exercise names (case-insensitive)
-    existing = {
-        r["name"].lower()
-        for r in conn.execute("SELECT name FROM exercise").fetchall()
-    }
 
-    to_import = []
-    skipped = []
-    for entry in data:
-        name = entry.get("name", "")
-        if name.lower() in existing:
-            skipped.append(name)
-        else:
-            to_import.append(entry)
+def _time_select(conn: sqlite3.Connection, sql: str, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        conn.execute(sql).fetchall()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def diagnose(conn: sqlite3.Connection) -> list[dict]:
+    """One entry per captured statement that scans, sorts or has a better index.
+
+    Each has the statement, its plan on ``conn``, the problem steps and the
+    DOCTOR_INDEXES (not yet on ``conn``) its plan uses once they exist.
+    """
+    sandbox = schema_sandbox(conn)
+    try:
+        statements = capture_statements(sandbox)
+        existing = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        candidates = {name: sql for name, sql in DOCTOR_INDEXES.items() if name not in existing}
+        for sql in candidates.values():
+            sandbox.execute(sql)
+        tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        findings = []
+        for key, sql in statements.items():
+            try:
+                plan = query_plan(conn, sql)
+            except sqlite3.Error:  # touches tables only the sandbox has (e.g. stats*)
+                continue
+            problems = plan_problems(key, plan, tables)
+            after = " ".join(query_plan(sandbox, sql))
+            fixes = [name for name in candidates if re.search(rf"\b{name}\b", after)]
+            if problems or fixes:
+                findings.append({
+                    "sql": key, "example": sql, "plan": plan, "problems": problems, "indexes": fixes,
+                })
+        return findings
+    finally:
+        sandbox.close()
 
-    if skipped:
-        print(f"\nSkipping {len(skipped)} existing exercise(s):")
-        for name in skipped:
-            print(f"  - {name}")
-
-    if to_import:
-        print(f"\nWould import {len(to_import)} exercise(s):")
-        for entry in to_import:
-            print(f"  + {entry['name']}")
-    else:
-        print("\nNothing to import.")
-        return
 
+def cmd_doctor(conn: sqlite3.Connection, args: argparse.Namespace, db_path: Path) -> None:
+    pending = pending_migrations(conn)
+    if pending:
+        print(
+            f"Note: {len(pending)} CLI migration(s) pending, including the hot-path indexes; "
+            "run `openwo migrate --execute` first."
+        )
+    findings = diagnose(conn)
+    if not findings:
+        print("No full scans, temp sorts or better indexes for the CLI's statements.")
+        return
+    print(f"\n{len(findings)} statement(s) could use attention:\n")
+    for f in findings:
+        sql = f["sql"] if len(f["sql"]) <= 100 else f["sql"][:97] + "..."
+        print(f"  {sql}")
+        # Problem steps, or the index walk a candidate would narrow
+        for step in f["problems"] or [s for s in f["plan"] if s.startswith("SEARCH")][:1]:
+            print(f"      {step}")
+        if f["indexes"]:
+            print(f"      -> {', '.join(f['indexes'])}")
+    wanted = list(dict.fromkeys(name for f in findings for name in f["indexes"]))
+    if not wanted:
+        print("\nNo candidate index changes these plans.")
+        return
+    print(f"\n{len(wanted)} index(es) would help:")
+    for name in wanted:
+        print(f"  {DOCTOR_INDEXES[name]}")
     if not args.execute:
         print("\nDry run — pass --execute to apply.")
         return
 
+    # Time the affected reads before and after; writes are only EXPLAINed
+    reads = [f for f in findings if f["indexes"] and f["example"].lstrip().upper().startswith(("SELECT", "WITH"))]
+    before = {f["sql"]: _time_select(conn, f["example"]) for f in reads}
     backup_db(db_path)
-    conn.execute("BEGIN")
+    conn.execute("BEGIN IMMEDIATE")
     try:
-        for e in to_import:
-            primary = json.dumps(e.get("primaryMuscles", [])) if e.get("primaryMuscles") else None
-            secondary = json.dumps(e.get("secondaryMuscles", [])) if e.get("secondaryMuscles") else None
-            conn.execute(
-                """
-                INSERT INTO exercise
-                  (name, description, instructions, tip, externalId, hasWeight,
-                   level, category, force, mechanic, equipment,
-                   primaryMuscles, secondaryMuscles, counterUnit, defaultValue, isDailyChallenge)
-                VALUES (?, '', '', ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'reps', 10, 0)
-                """,
-                (
-                    e["name"],
-                    e.get("tip", ""),
-                    e.get("id"),
-                    1 if e.get("hasWeight") else 0,
-                    e.get("level"),
-                    e.get("category"),
-                    e.get("force"),
-                    e.get("mechanic"),
-                    e.get("equipment"),
-                    primary,
-                    secondary,
-                ),
-            )
+        for name in wanted:
+            conn.execute(DOCTOR_INDEXES[name])
         conn.commit()
-        print(f"\nImported {len(to_import)} exercise(s).")
     except Exception:
         conn.rollback()
         raise
+    print(f"\nCreated {len(wanted)} index(es).")
+    if reads:
+        print(f"\n{'before':>10} {'after':>10}  statement")
+        for f in reads:
+            after = _time_select(conn, f["example"])
+            sql = f["sql"] if len(f["sql"]) <= 70 else f["sql"][:67] + "..."
+            print(f"{before[f['sql']] * 1e3:>8.2f}ms {after * 1e3:>8.2f}ms  {sql}")
 
 
 # ── Argument Parsing ──────────────────────────────────────────────────
@@ -602,16 +4216,49 @@ def build_parser() -> argparse.ArgumentParser:
         description="CLI for OpenWO workout management",
     )
     parser.add_argument("--db", help="Path to SQLite database")
+    parser.add_argument(
+        "--tuning", choices=list(SQLITE_PROFILES),
+        help="SQLite cache/mmap/temp_store profile (default: chosen per command)",
+    )
+    parser.add_argument(
+        "--profile", action="store_true",
+        help="Print phase timings and a per-statement SQL summary to stderr",
+    )
+    parser.add_argument(
+        "--trace-sql", action="store_true",
+        help="Echo every SQL statement to stderr, then summarize them",
+    )
+    parser.add_argument("--profile-json", metavar="FILE", help="Write the profile as JSON")
+    parser.add_argument("--cprofile", metavar="FILE", help="Write cProfile stats (pstats format)")
+    parser.add_argument(
+        "--fleet", metavar="DIR|GLOB",
+        help=f"Run the command on every .sqlite file in DIR or matching GLOB ({', '.join(FLEET_COMMANDS)})",
+    )
+    parser.add_argument(
+        "--workers", type=int, metavar="N", help="Fleet worker processes (default: CPU count)",
+    )
+    parser.add_argument(
+        "--fleet-report", choices=["text", "json"], default="text",
+        help="Fleet report format (default: text)",
+    )
+    parser.add_argument(
+        "--no-backup", action="store_true",
+        help="Skip the pre-mutation snapshot (journaled edits can still be undone)",
+    )
     sub = parser.add_subparsers(dest="command")
 
     # show
     p_show = sub.add_parser("show", help="List workouts and exercises")
     p_show.add_argument("workout", nargs="?", help="Workout name/substring")
     p_show.add_argument("--all", action="store_true", help="Include inactive exercises")
+    p_show.add_argument(
+        "--format", "-f", choices=["table", "json", "ndjson", "csv"], default="table",
+        help="Output format (default: table)",
+    )
 
     # exercises
     p_ex = sub.add_parser("exercises", help="Browse exercise catalog")
-    p_ex.add_argument("query", nargs="?", help="Name substring")
+    p_ex.add_argument("query", nargs="?", help="Search words (name, tip, instructions, muscles)")
     p_ex.add_argument("--muscle", "-m", help="Filter by muscle")
     p_ex.add_argument("--equipment", "-e", help="Filter by equipment")
 
@@ -650,26 +4297,139 @@ def build_parser() -> argparse.ArgumentParser:
     p_ro.add_argument("--to", type=int, required=True, help="Position to move to")
     p_ro.add_argument("--execute", action="store_true", help="Apply changes")
 
-    # import-exercises
-    p_imp = sub.add_parser("import-exercises", help="Import exercises from JSON")
-    p_imp.add_argument("file", help="JSON file path")
-    p_imp.add_argument("--execute", action="store_true", help="Apply changes")
+    # rebuild-lookups
+    sub.add_parser("rebuild-lookups", help="Rebuild the muscle/equipment lookup tables")
 
-    return parser
+    # export
+    p_exp = sub.add_parser("export", help="Export the workout log")
+    p_exp.add_argument(
+        "--format", "-f", choices=["ndjson", "csv", "json"], default="ndjson",
+        help="Output format (default: ndjson)",
+    )
+    p_exp.add_argument("--output", "-o", help="Write to FILE instead of stdout")
+    p_exp.add_argument("--from", dest="date_from", metavar="DATE", help="First session date (YYYY-MM-DD)")
+    p_exp.add_argument("--to", dest="date_to", metavar="DATE", help="Last session date (YYYY-MM-DD)")
+    p_exp.add_argument(
+        "--exercise", action="append", metavar="NAME",
+        help="Only this exercise (repeatable)",
+    )
+    p_exp.add_argument(
+        "--since", nargs="?", const="default", metavar="KEY",
+        help="Only logs added since the last export with this key, then advance it",
+    )
 
+    # stats
+    p_stats = sub.add_parser("stats", help="Training analytics")
+    st_sub = p_stats.add_subparsers(dest="stats_command", required=True)
+    st_fmt = argparse.ArgumentParser(add_help=False)
+    st_fmt.add_argument(
+        "--format", "-f", choices=["table", "json"], default="table",
+        help="Output format (default: table)",
+    )
+    p_st_w = st_sub.add_parser("weights", parents=[st_fmt], help="Max weight per exercise per day")
+    p_st_w.add_argument("exercise", nargs="?", help="Exercise name (default: all)")
+    p_st_v = st_sub.add_parser("volume", parents=[st_fmt], help="Max weight and volume per exercise per week")
+    p_st_v.add_argument("exercise", nargs="?", help="Exercise name (default: all)")
+    p_st_s = st_sub.add_parser("sessions", parents=[st_fmt], help="Sessions per week or month")
+    p_st_s.add_argument(
+        "--by", dest="granularity", choices=["weekly", "monthly"], default="weekly",
+    )
+    st_sub.add_parser("bests", parents=[st_fmt], help="All-time personal bests")
+    p_st_c = st_sub.add_parser("challenges", parents=[st_fmt], help="Daily challenge sets for a year")
+    p_st_c.add_argument("--year", type=int, default=date.today().year)
+    st_sub.add_parser("streaks", parents=[st_fmt], help="Current and longest gym/challenge streaks")
+    p_st_h = st_sub.add_parser("heatmap", parents=[st_fmt], help="Daily challenge heatmap for a year")
+    p_st_h.add_argument("--year", type=int, default=date.today().year)
+    p_st_l = st_sub.add_parser("last-weights", parents=[st_fmt], help="Last weight per exercise of a workout")
+    p_st_l.add_argument("workout", help="Workout name")
+    p_st_r = st_sub.add_parser("refresh", help="Fold new sessions and logs into the summary tables")
+    p_st_r.add_argument("--full", action="store_true", help="Rebuild the summaries from scratch")
 
-def main() -> None:
-    parser = build_parser()
-    args = parser.parse_args()
+    # working copy
+    sub.add_parser("checkout", help="Copy the database to local disk and edit the copy")
+    p_pub = sub.add_parser("publish", help="Write the working copy back to the database")
+    p_pub.add_argument("--force", action="store_true", help="Overwrite changes the app made since checkout")
+    p_pub.add_argument("--execute", action="store_true", help="Apply changes")
+    p_dis = sub.add_parser("discard", help="Delete the working copy and its changes")
+    p_dis.add_argument("--execute", action="store_true", help="Apply changes")
 
-    if not args.command:
-        parser.print_help()
-        sys.exit(1)
+    # migrate
+    p_mig = sub.add_parser("migrate", help="Apply the CLI's pending schema migrations")
+    p_mig.add_argument("--execute", action="store_true", help="Apply changes")
+
+    # shell
+    sub.add_parser("shell", help="Interactive prompt reusing one connection and its caches")
+
+    # compact
+    p_cmp = sub.add_parser("compact", help="Archive unreferenced inactive workout rows and free their pages")
+    p_cmp.add_argument(
+        "--full-vacuum", action="store_true",
+        help="Also VACUUM once and switch the file to incremental auto-vacuum",
+    )
+    p_cmp.add_argument("--execute", action="store_true", help="Apply changes")
+
+    # doctor
+    p_doc = sub.add_parser("doctor", help="Flag full scans in the CLI's queries and suggest indexes")
+    p_doc.add_argument("--execute", action="store_true", help="Create the suggested indexes")
+
+    # batch
+    p_batch = sub.add_parser("batch", help="Apply many edits in one transaction")
+    p_batch.add_argument("file", help="JSON array or NDJSON file of operations")
+    p_batch.add_argument("--execute", action="store_true", help="Apply changes")
+
+    # apply / dump-spec
+    p_apply = sub.add_parser("apply", help="Make workouts match a JSON spec with minimal edits")
+    p_apply.add_argument("file", help="Spec file (see dump-spec)")
+    p_apply.add_argument("--execute", action="store_true", help="Apply changes")
+    p_dump = sub.add_parser("dump-spec", help="Write workouts as a spec for apply")
+    p_dump.add_argument("workout", nargs="*", help="Workout names (default: all)")
+    p_dump.add_argument("--output", "-o", help="Write to FILE instead of stdout")
+
+    # history / undo
+    p_hist = sub.add_parser("history", help="List journaled operations")
+    p_hist.add_argument("id", type=int, nargs="?", help="Show the rows changed by this operation")
+    p_hist.add_argument("--limit", "-n", type=int, default=20, help="Operations to list (default: 20)")
+    p_undo = sub.add_parser("undo", help="Reverse the most recent operations from the journal")
+    p_undo.add_argument("count", type=int, nargs="?", default=1, help="Operations to undo (default: 1)")
+    p_undo.add_argument("--execute", action="store_true", help="Apply changes")
+
+    # backups
+    p_bk = sub.add_parser(
+        "backups", help="Manage database snapshots",
+        description=(
+            "Manage database snapshots. Each automatic backup prunes all but the newest "
+            f"OPENWO_BACKUP_KEEP snapshots (default {BACKUP_KEEP}, 0 keeps every snapshot)."
+        ),
+    )
+    bk_sub = p_bk.add_subparsers(dest="backups_command", required=True)
+    bk_sub.add_parser("list", help="List snapshots")
+    p_bk_create = bk_sub.add_parser("create", help="Take a snapshot now")
+    p_bk_create.add_argument("--note", help="Free-form label")
+    p_bk_restore = bk_sub.add_parser("restore", help="Restore a snapshot")
+    p_bk_restore.add_argument("id", type=int, help="Snapshot id (see list)")
+    p_bk_restore.add_argument("--execute", action="store_true", help="Apply changes")
+    p_bk_prune = bk_sub.add_parser("prune", help="Delete old snapshots")
+    p_bk_prune.add_argument("--keep", type=int, help="Keep the N most recent snapshots")
+    p_bk_prune.add_argument("--max-age", type=int, metavar="DAYS", help="Drop snapshots older than DAYS")
+    p_bk_prune.add_argument("--execute", action="store_true", help="Apply changes")
+
+    # import-exercises
+    p_imp = sub.add_parser("import-exercises", help="Import exercises from JSON/NDJSON")
+    p_imp.add_argument("file", help="JSON array or NDJSON file path")
+    p_imp.add_argument(
+        "--chunk-size", type=int, default=IMPORT_CHUNK_SIZE,
+        help=f"Rows per insert/commit (default: {IMPORT_CHUNK_SIZE})",
+    )
+    p_imp.add_argument(
+        "--merge", action="store_true",
+        help="Update existing exercises (matched by id or name) whose fields changed",
+    )
+    p_imp.add_argument("--execute", action="store_true", help="Apply changes")
+
+    return parser
 
-    db_path = discover_db(args.db)
-    conn = connect(db_path)
-    ensure_is_active_column(conn)
 
+def run_command(conn: sqlite3.Connection, args: argparse.Namespace, db_path: Path) -> None:
     if args.command == "show":
         cmd_show(conn, args)
     elif args.command == "exercises":
@@ -682,10 +4442,78 @@ def main() -> None:
         cmd_remove(conn, args, db_path)
     elif args.command == "reorder":
         cmd_reorder(conn, args, db_path)
+    elif args.command == "rebuild-lookups":
+        cmd_rebuild_lookups(conn, args)
+    elif args.command == "export":
+        cmd_export(conn, args, db_path)
+    elif args.command == "stats":
+        cmd_stats(conn, args)
+    elif args.command == "batch":
+        cmd_batch(conn, args, db_path)
+    elif args.command == "backups":
+        cmd_backups(conn, args, db_path)
     elif args.command == "import-exercises":
         cmd_import_exercises(conn, args, db_path)
+    elif args.command == "migrate":
+        cmd_migrate(conn, args, db_path)
+    elif args.command == "checkout":
+        cmd_checkout(conn, args, db_path)
+    elif args.command == "publish":
+        cmd_publish(conn, args, db_path)
+    elif args.command == "discard":
+        cmd_discard(conn, args, db_path)
+    elif args.command == "apply":
+        cmd_apply(conn, args, db_path)
+    elif args.command == "dump-spec":
+        cmd_dump_spec(conn, args)
+    elif args.command == "compact":
+        cmd_compact(conn, args, db_path)
+    elif args.command == "doctor":
+        cmd_doctor(conn, args, db_path)
+    elif args.command == "history":
+        cmd_history(conn, args)
+    elif args.command == "undo":
+        cmd_undo(conn, args, db_path)
+
+
+def main() -> None:
+    global _backup_done
+    parser = build_parser()
+    args = parser.parse_args()
+
+    if not args.command:
+        parser.print_help()
+        sys.exit(1)
+
+    if args.fleet:
+        cmd_fleet(args)
+        return
+    if args.no_backup:
+        _backup_done = True
+    if args.command == "shell":
+        db_path, wal = target_db(args, discover_db(args.db))
+        conn = connect(db_path, wal=wal)
+        cmd_shell(conn, parser, db_path)
+        conn.close()
+        return
 
-    conn.close()
+    profiler = start_profiling(args)
+    try:
+        with phase("discovery"):
+            db_path, wal = target_db(args, discover_db(args.db))
+        with phase("connect"):
+            conn = connect(
+                db_path, read_only=not command_writes(args), profile=command_profile(args), wal=wal,
+            )
+        if profiler is not None:
+            profiler.attach(conn)
+        with phase("migration"):
+            prepare_schema(conn, args, db_path)
+        with phase("command"):
+            run_command(conn, args, db_path)
+        conn.close()
+    finally:
+        stop_profiling(args, sys.argv[1:])
 
 
 if __name__ == "__main__":
@@ -1,10 +1,18 @@
 """Tests for openwo.py CLI operations."""
 
 import argparse
+import csv
+import difflib
+import io
 import json
+import marshal
+import pickle
 import sqlite3
+import sys
 import tempfile
 import unittest
+from datetime import date
+from unittest import mock
 from pathlib import Path
 
 import openwo
@@ -69,6 +77,12 @@ def create_test_db() -> sqlite3.Connection:
             feedback TEXT
         );
 
+        CREATE TABLE dailyChallenge (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date TEXT NOT NULL UNIQUE,
+            setsCompleted INTEGER NOT NULL DEFAULT 0
+        );
+
         CREATE TABLE exerciseLog (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             sessionId INTEGER NOT NULL REFERENCES session(id) ON DELETE CASCADE,
@@ -161,6 +175,330 @@ class TestResolveWorkout(unittest.TestCase):
             openwo.resolve_workout(self.conn, "Day")
 
 
+class TestNameIndex(unittest.TestCase):
+    def setUp(self):
+        self.conn = create_test_db()
+
+    def test_substring_reports_each_row_once(self):
+        index = openwo.name_index(self.conn, "exercise")
+        hits = index.find_substring("s")
+        self.assertEqual(len(hits), len(set(hits)))
+        self.assertEqual(
+            [index.names[i] for i in hits],
+            ["Bench Press", "Squat", "Pull-ups", "Dumbbell Rows", "Cable Rows"],
+        )
+
+    def test_empty_table(self):
+        self.assertEqual(openwo.NameIndex([]).find_substring(""), [])
+
+    def test_index_refreshed_after_insert(self):
+        openwo.resolve_exercise(self.conn, "squat")
+        self.conn.execute("INSERT INTO exercise (name) VALUES ('Goblet Squat')")
+        row = openwo.resolve_exercise(self.conn, "goblet")
+        self.assertEqual(row["name"], "Goblet Squat")
+
+    def test_duplicate_exact_names_are_ambiguous(self):
+        self.conn.execute("INSERT INTO exercise (name) VALUES ('plank')")
+        with self.assertRaises(SystemExit):
+            openwo.resolve_exercise(self.conn, "Plank")
+
+
+class TestFuzzySuggestions(unittest.TestCase):
+    def setUp(self):
+        self.conn = create_test_db()
+        self.cache = tempfile.TemporaryDirectory()
+        self.env = mock.patch.dict("os.environ", {"XDG_CACHE_HOME": self.cache.name})
+        self.env.start()
+        self.min = mock.patch.object(openwo, "FUZZY_INDEX_MIN", 0)
+        self.min.start()
+
+    def tearDown(self):
+        self.min.stop()
+        self.env.stop()
+        self.cache.cleanup()
+
+    def test_candidates_ranked_by_shared_trigrams(self):
+        index = openwo.TrigramIndex(["Bench Press", "Squat", "Cable Rows"])
+        self.assertEqual(index.candidates("benchpress", limit=1), [0])
+
+    def test_matches_difflib_on_small_catalog(self):
+        index = openwo.name_index(self.conn, "exercise")
+        for query in ["bnch pres", "sqaut", "Dumbell Row", "plnk"]:
+            self.assertEqual(
+                openwo.suggest_names(self.conn, "exercise", index, query),
+                difflib.get_close_matches(query, index.names, n=3, cutoff=0.4),
+            )
+
+    def test_index_cached_and_rebuilt_on_change(self):
+        with tempfile.TemporaryDirectory() as d:
+            db = Path(d) / "openwo.sqlite"
+            self.conn.execute("VACUUM INTO ?", (str(db),))
+            conn = openwo.connect(db)
+            index = openwo.name_index(conn, "exercise")
+            openwo.suggest_names(conn, "exercise", index, "sqaut")
+            path = openwo._trigram_cache_path(conn, "exercise")
+            self.assertTrue(path.exists())
+
+            # A new name changes the fingerprint and forces a rebuild
+            conn.execute("INSERT INTO exercise (name) VALUES ('Front Squat')")
+            index = openwo.name_index(conn, "exercise")
+            self.assertIn(
+                "Front Squat",
+                openwo.suggest_names(conn, "exercise", index, "frnt squat"),
+            )
+            conn.close()
+
+    def test_unreadable_cache_is_rebuilt(self):
+        with tempfile.TemporaryDirectory() as d:
+            db = Path(d) / "openwo.sqlite"
+            self.conn.execute("VACUUM INTO ?", (str(db),))
+            conn = openwo.connect(db)
+            path = openwo._trigram_cache_path(conn, "exercise")
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Includes a pickled cache from before the format change
+            old = pickle.dumps({"fingerprint": "x", "index": openwo.TrigramIndex([])})
+            for junk in (b"", b"\x80\xff", b"not marshal", marshal.dumps(["old", "format"]), old):
+                path.write_bytes(junk)
+                index = openwo.name_index(conn, "exercise")
+                index.trigrams = None
+                self.assertIn("Squat", openwo.suggest_names(conn, "exercise", index, "sqaut"))
+                self.assertEqual(marshal.loads(path.read_bytes())["fingerprint"], index.fingerprint())
+
+            # The rewritten cache is read back, not rebuilt
+            index = openwo.name_index(conn, "exercise")
+            index.trigrams = None
+            with mock.patch.object(openwo.TrigramIndex, "__init__", side_effect=AssertionError):
+                self.assertIn("Squat", openwo.suggest_names(conn, "exercise", index, "sqaut"))
+            conn.close()
+
+
+# ── Search Tests ──────────────────────────────────────────────────────
+
+
+class TestExerciseSearch(unittest.TestCase):
+    def setUp(self):
+        self.conn = create_test_db()
+        self.assertTrue(openwo.ensure_search_index(self.conn))
+
+    def _names(self, query=None, muscle=None, equipment=None) -> list[str]:
+        rows = openwo.search_exercises(self.conn, query, muscle, equipment)
+        return [r["name"] for r in rows]
+
+    def test_prefix_query(self):
+        self.assertEqual(self._names("dumb"), ["Dumbbell Rows"])
+
+    def test_name_matches_rank_first(self):
+        self.conn.execute(
+            "INSERT INTO exercise (name, tip) VALUES ('Face Pull', 'Not a row')"
+        )
+        self.assertEqual(self._names("row"), ["Cable Rows", "Dumbbell Rows", "Face Pull"])
+
+    def test_muscle_matches_whole_words(self):
+        self.conn.execute(
+            "INSERT INTO exercise (name, primaryMuscles) VALUES ('Hip Abduction', '[\"abductors\"]')"
+        )
+        self.conn.commit()
+        openwo.cmd_rebuild_lookups(self.conn, argparse.Namespace())
+        self.assertEqual(self._names(muscle="abdominals"), ["Plank"])
+        self.assertEqual(self._names(muscle="abs"), [])
+        self.assertEqual(self._names(muscle="back"), ["Cable Rows", "Deadlift", "Dumbbell Rows"])
+        self.assertEqual(self._names(muscle="lower back"), ["Deadlift"])
+
+    def test_filters_combine(self):
+        self.assertEqual(self._names("rows", equipment="cable"), ["Cable Rows"])
+
+    def test_triggers_follow_updates_and_deletes(self):
+        self.conn.execute("UPDATE exercise SET name = 'Back Squat' WHERE id = 2")
+        self.conn.execute("DELETE FROM exercise WHERE id = 6")
+        self.assertEqual(self._names("back squat"), ["Back Squat"])
+        self.assertEqual(self._names("dumbbell"), [])
+
+    def test_lookup_tables_follow_writes_outside_the_cli(self):
+        openwo.ensure_lookup_tables(self.conn)
+        self.conn.execute(
+            """INSERT INTO exercise (name, equipment, primaryMuscles)
+               VALUES ('Goblet Squat', 'Kettlebells', '["quadriceps"]')"""
+        )
+        self.assertEqual(self._names(muscle="quadriceps"), ["Goblet Squat", "Squat"])
+        self.assertEqual(self._names(equipment="kettlebells"), ["Goblet Squat"])
+        self.conn.execute(
+            "UPDATE exercise SET equipment = 'dumbbell', primaryMuscles = 'not json' WHERE name = 'Goblet Squat'"
+        )
+        self.assertEqual(self._names(equipment="kettlebells"), [])
+        self.assertEqual(self._names(muscle="quadriceps"), ["Squat"])
+        goblet = self.conn.execute("SELECT id FROM exercise WHERE name = 'Goblet Squat'").fetchone()[0]
+        self.conn.execute("DELETE FROM exercise WHERE id = ?", (goblet,))
+        self.assertIsNone(
+            self.conn.execute("SELECT 1 FROM exerciseEquipment WHERE exerciseId = ?", (goblet,)).fetchone()
+        )
+
+    def test_lookup_tables_without_triggers_are_bypassed(self):
+        openwo.ensure_lookup_tables(self.conn)
+        for name in ("exerciseLookup_ai", "exerciseLookup_au", "exerciseLookup_ad"):
+            self.conn.execute(f"DROP TRIGGER {name}")
+        self.conn.execute(
+            "INSERT INTO exercise (name, equipment) VALUES ('Goblet Squat', 'Kettlebells')"
+        )
+        self.assertEqual(self._names(equipment="kettlebells"), ["Goblet Squat"])
+        # Migrating adds the triggers and refills the stale tables
+        openwo.create_lookup_tables(self.conn)
+        self.assertEqual(
+            self.conn.execute("SELECT exerciseId FROM exerciseEquipment WHERE equipment = 'kettlebells'").fetchone()[0],
+            self.conn.execute("SELECT id FROM exercise WHERE name = 'Goblet Squat'").fetchone()[0],
+        )
+
+
+# ── Migration Tests ───────────────────────────────────────────────────
+
+
+class TestMigrations(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.env = mock.patch.dict("os.environ", {"XDG_DATA_HOME": self.tmp.name})
+        self.env.start()
+        self.db_path = Path(self.tmp.name) / "openwo.sqlite"
+        create_test_db().execute("VACUUM INTO ?", (str(self.db_path),))
+        self.conn = openwo.connect(self.db_path)
+        self.parser = openwo.build_parser()
+
+    def tearDown(self):
+        self.conn.close()
+        self.env.stop()
+        self.tmp.cleanup()
+
+    def schema(self):
+        return self.conn.execute("SELECT name FROM sqlite_master ORDER BY name").fetchall()
+
+    def test_migrate_runs_pending_steps_once(self):
+        applied = openwo.migrate(self.conn, self.db_path)
+        self.assertEqual([v for v, _ in applied], list(range(1, len(openwo.MIGRATIONS) + 1)))
+        self.assertEqual(openwo.schema_version(self.conn), len(openwo.MIGRATIONS))
+        names = {r["name"] for r in self.schema()}
+        self.assertTrue({"exerciseLog_workoutExerciseId", "exerciseMuscle", "exerciseSearch"} <= names)
+        self.assertEqual(openwo.migrate(self.conn, self.db_path), [])
+
+    def test_adds_is_active_to_old_databases(self):
+        self.conn.executescript("""
+            CREATE TABLE old AS SELECT id, workoutId, exerciseId, position FROM workoutExercise;
+            DROP TABLE workoutExercise;
+            ALTER TABLE old RENAME TO workoutExercise;
+        """)
+        with self.assertRaises(SystemExit):
+            openwo.require_schema(self.conn)
+        openwo.migrate(self.conn, self.db_path)
+        openwo.require_schema(self.conn)
+        self.assertEqual(len(get_active_positions(self.conn, 1)), 5)
+
+    def test_read_only_commands_never_write(self):
+        other = sqlite3.connect(self.db_path)
+        other.execute("BEGIN IMMEDIATE")  # holds the write lock
+        self.conn.execute("PRAGMA busy_timeout = 0")
+        before = self.schema()
+        out = io.StringIO()
+        with mock.patch("sys.stdout", out), mock.patch("sys.stderr", out):
+            for line in (
+                "show", "exercises row --muscle back", "stats bests",
+                "swap 'Day A' Squat Plank", "migrate",
+            ):
+                args = self.parser.parse_args(openwo.shlex.split(line))
+                openwo.prepare_schema(self.conn, args, self.db_path)
+                openwo.run_command(self.conn, args, self.db_path)
+        other.rollback()
+        other.close()
+        self.assertNotIn("locked", out.getvalue())
+        self.assertIn("Dumbbell Rows", out.getvalue())
+        self.assertEqual(self.schema(), before)
+        self.assertEqual(openwo.schema_version(self.conn), 0)
+
+    def test_muscle_filter_without_lookup_tables(self):
+        unmigrated = openwo.filter_exercises(self.conn, None, "back", None)
+        openwo.migrate(self.conn, self.db_path)
+        migrated = openwo.filter_exercises(self.conn, None, "back", None)
+        self.assertEqual([r["name"] for r in unmigrated], [r["name"] for r in migrated])
+        self.assertEqual(len(migrated), 3)
+
+
+class TestConnect(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        # Characters that must be escaped in a file: URI
+        self.db_path = Path(self.tmp.name) / "my db?#1.sqlite"
+        create_test_db().execute("VACUUM INTO ?", (str(self.db_path),))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_read_only_connection(self):
+        conn = openwo.connect(self.db_path, read_only=True, profile="scan")
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM workout").fetchone()[0], 2)
+        self.assertEqual(conn.execute("PRAGMA cache_size").fetchone()[0], -65536)
+        with self.assertRaises(sqlite3.OperationalError):
+            conn.execute("UPDATE workout SET name = 'x'")
+        conn.close()
+        self.assertFalse(Path(f"{self.db_path}-journal").exists())
+
+    def test_profile_per_command_class(self):
+        parser = openwo.build_parser()
+        cases = {
+            "show": "read",
+            "swap 'Day A' Squat Plank": "read",
+            "swap 'Day A' Squat Plank --execute": "write",
+            "stats weights": "scan",
+            "stats refresh": "bulk",
+            "export": "scan",
+            "import-exercises x.json": "bulk",
+            "--tuning scan show": "scan",
+        }
+        for line, profile in cases.items():
+            args = parser.parse_args(openwo.shlex.split(line))
+            self.assertEqual(openwo.command_profile(args), profile, line)
+
+
+# ── Show Tests ────────────────────────────────────────────────────────
+
+
+class TestShow(unittest.TestCase):
+    def setUp(self):
+        self.conn = create_test_db()
+        self.conn.execute("INSERT INTO workout (name) VALUES ('Empty')")
+        self.conn.execute("UPDATE workoutExercise SET isActive = 0 WHERE id = 2")
+
+    def show(self, fmt: str, workout: str | None = None, include_inactive: bool = False) -> str:
+        out = io.StringIO()
+        args = argparse.Namespace(workout=workout, all=include_inactive, format=fmt)
+        with mock.patch("sys.stdout", out):
+            openwo.cmd_show(self.conn, args)
+        return out.getvalue()
+
+    def test_one_query_groups_all_workouts(self):
+        statements = []
+        self.conn.set_trace_callback(statements.append)
+        recs = list(openwo.iter_show(self.conn))
+        self.conn.set_trace_callback(None)
+        self.assertEqual(len(statements), 1)
+        self.assertEqual(
+            [(r["workout"], r["exercise"]) for r in recs],
+            [("Day A", "Bench Press"), ("Day A", "Deadlift"), ("Day A", "Pull-ups"),
+             ("Day A", "Plank"), ("Day B", "Dumbbell Rows"), ("Day B", "Plank"),
+             ("Empty", None)],
+        )
+
+    def test_table_marks_inactive_and_empty_workouts(self):
+        out = self.show("table", include_inactive=True)
+        self.assertIn("Squat [inactive]", out)
+        self.assertIn("  Empty\n" + "=" * 60 + "\n  (no exercises)", out)
+        self.assertNotIn("Squat", self.show("table"))
+
+    def test_structured_formats_skip_empty_workouts(self):
+        recs = [json.loads(line) for line in self.show("ndjson", workout="Day B").splitlines()]
+        self.assertEqual([r["exercise"] for r in recs], ["Dumbbell Rows", "Plank"])
+        self.assertIs(recs[0]["hasWeight"], True)
+        self.assertEqual(len(json.loads(self.show("json"))), 6)
+        rows = list(csv.DictReader(io.StringIO(self.show("csv", include_inactive=True))))
+        self.assertEqual(list(rows[0]), openwo.SHOW_FIELDS)
+        self.assertEqual(len(rows), 7)
+
+
 # ── Swap Tests ────────────────────────────────────────────────────────
 
 
@@ -291,6 +629,15 @@ class TestReorder(unittest.TestCase):
         positions = [p for p, _ in active]
         self.assertEqual(positions, [1, 2, 3, 4, 5])
 
+    def test_reorder_uses_constant_number_of_updates(self):
+        statements: list[str] = []
+        self.conn.set_trace_callback(statements.append)
+        self._reorder(5, 1)
+        self.conn.set_trace_callback(None)
+        # The trace repeats a statement each time it fires a journal trigger
+        updates = {s for s in statements if s.lstrip().startswith("UPDATE")}
+        self.assertEqual(len(updates), 2)
+
     def test_reorder_same_position_exits(self):
         with self.assertRaises(SystemExit):
             self._reorder(3, 3)
@@ -429,7 +776,7 @@ class TestImportExercises(unittest.TestCase):
         with tempfile.NamedTemporaryFile(mode="w", suffix=".json", delete=False) as f:
             json.dump(data, f)
             f.flush()
-            args = argparse.Namespace(file=f.name, execute=True)
+            args = argparse.Namespace(file=f.name, execute=True, chunk_size=1000, merge=False)
             openwo.cmd_import_exercises(self.conn, args, self.db_path)
 
         row = self.conn.execute("SELECT * FROM exercise WHERE name = 'Lunges'").fetchone()
@@ -444,14 +791,1077 @@ class TestImportExercises(unittest.TestCase):
         with tempfile.NamedTemporaryFile(mode="w", suffix=".json", delete=False) as f:
             json.dump(data, f)
             f.flush()
-            args = argparse.Namespace(file=f.name, execute=True)
+            args = argparse.Namespace(file=f.name, execute=True, chunk_size=1000, merge=False)
             openwo.cmd_import_exercises(self.conn, args, self.db_path)
 
         count = self.conn.execute("SELECT COUNT(*) AS c FROM exercise WHERE name = 'Bench Press'").fetchone()["c"]
         self.assertEqual(count, 1)  # not duplicated
 
+    def test_ndjson_in_chunks(self):
+        with tempfile.NamedTemporaryFile(mode="w", suffix=".ndjson", delete=False) as f:
+            for i in range(5):
+                f.write(json.dumps({"id": f"ex{i}", "name": f"Exercise {i}"}) + "\n")
+        args = argparse.Namespace(file=f.name, execute=True, chunk_size=2, merge=False)
+        openwo.cmd_import_exercises(self.conn, args, self.db_path)
+
+        count = self.conn.execute("SELECT COUNT(*) AS c FROM exercise WHERE name LIKE 'Exercise %'").fetchone()["c"]
+        self.assertEqual(count, 5)
+
+    def test_rejects_chunk_size_below_one(self):
+        with tempfile.NamedTemporaryFile(mode="w", suffix=".ndjson", delete=False) as f:
+            f.write(json.dumps({"id": "ex0", "name": "Exercise 0"}) + "\n")
+        for execute in (False, True):
+            args = argparse.Namespace(file=f.name, execute=execute, chunk_size=0, merge=False)
+            with mock.patch("sys.stderr", io.StringIO()) as err, self.assertRaises(SystemExit):
+                openwo.cmd_import_exercises(self.conn, args, self.db_path)
+            self.assertIn("Chunk size must be at least 1.", err.getvalue())
+        self.assertEqual(self.conn.execute("SELECT COUNT(*) FROM exercise WHERE name = 'Exercise 0'").fetchone()[0], 0)
+
+    def test_array_parsed_across_read_boundaries(self):
+        data = [{"name": f"Exercise {i}", "tip": "x" * i} for i in range(20)]
+        with tempfile.NamedTemporaryFile(mode="w", suffix=".json", delete=False) as f:
+            json.dump(data, f, indent=2)
+        with mock.patch.object(openwo, "_READ_SIZE", 7):
+            self.assertEqual(list(openwo.iter_records(Path(f.name))), data)
+
+    def test_dry_run_inserts_nothing(self):
+        data = [{"id": "lunges", "name": "Lunges"}]
+        with tempfile.NamedTemporaryFile(mode="w", suffix=".json", delete=False) as f:
+            json.dump(data, f)
+        args = argparse.Namespace(file=f.name, execute=False, chunk_size=1000, merge=False)
+        openwo.cmd_import_exercises(self.conn, args, self.db_path)
+        self.assertIsNone(self.conn.execute("SELECT * FROM exercise WHERE name = 'Lunges'").fetchone())
+
+
+    def test_import_fills_lookup_tables(self):
+        data = [{"name": "Lunges", "equipment": "Dumbbell",
+                 "primaryMuscles": ["quadriceps"], "secondaryMuscles": ["glutes", "calves"]}]
+        with tempfile.NamedTemporaryFile(mode="w", suffix=".json", delete=False) as f:
+            json.dump(data, f)
+        args = argparse.Namespace(file=f.name, execute=True, chunk_size=1000, merge=False)
+        openwo.cmd_import_exercises(self.conn, args, self.db_path)
+
+        ex_id = self.conn.execute("SELECT id FROM exercise WHERE name = 'Lunges'").fetchone()["id"]
+        muscles = self.conn.execute(
+            "SELECT muscle, isPrimary FROM exerciseMuscle WHERE exerciseId = ? ORDER BY muscle",
+            (ex_id,),
+        ).fetchall()
+        self.assertEqual(
+            [tuple(r) for r in muscles],
+            [("calves", 0), ("glutes", 0), ("quadriceps", 1)],
+        )
+        equipment = self.conn.execute(
+            "SELECT equipment FROM exerciseEquipment WHERE exerciseId = ?", (ex_id,)
+        ).fetchone()
+        self.assertEqual(equipment["equipment"], "dumbbell")
+
+    def _merge(self, data: list[dict]):
+        with tempfile.NamedTemporaryFile(mode="w", suffix=".json", delete=False) as f:
+            json.dump(data, f)
+        args = argparse.Namespace(file=f.name, execute=True, chunk_size=1000, merge=True)
+        openwo.cmd_import_exercises(self.conn, args, self.db_path)
+
+    def _log_exercise_writes(self):
+        self.conn.executescript("""
+            CREATE TEMP TABLE written (id INTEGER);
+            CREATE TEMP TRIGGER log_insert AFTER INSERT ON exercise
+            BEGIN INSERT INTO written VALUES (new.id); END;
+            CREATE TEMP TRIGGER log_update AFTER UPDATE ON exercise
+            BEGIN INSERT INTO written VALUES (new.id); END;
+        """)
+
+    def _written(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) AS c FROM written").fetchone()["c"]
+
+    def test_merge_writes_only_changed_rows(self):
+        self._log_exercise_writes()
+        self._merge([
+            {"name": "Bench Press", "hasWeight": True, "equipment": "barbell",
+             "primaryMuscles": ["chest"]},
+            {"name": "Squat", "hasWeight": True, "equipment": "barbell",
+             "primaryMuscles": ["quadriceps"], "level": "beginner"},
+            {"id": "lunges", "name": "Lunges"},
+        ])
+        self.assertEqual(self._written(), 2)
+        squat = self.conn.execute("SELECT * FROM exercise WHERE id = 2").fetchone()
+        self.assertEqual(squat["level"], "beginner")
+        self.assertIsNotNone(
+            self.conn.execute("SELECT * FROM exercise WHERE name = 'Lunges'").fetchone()
+        )
+
+    def test_merge_matches_external_id_and_keeps_references(self):
+        self.conn.execute("UPDATE exercise SET externalId = 'plank' WHERE id = 5")
+        self.conn.commit()
+        self._merge([{"id": "plank", "name": "Front Plank", "primaryMuscles": ["abdominals"]}])
+        row = self.conn.execute("SELECT * FROM exercise WHERE externalId = 'plank'").fetchone()
+        self.assertEqual((row["id"], row["name"]), (5, "Front Plank"))
+        self.assertEqual(get_active_positions(self.conn, 1)[-1], (5, "Front Plank"))
+
+        self._log_exercise_writes()
+        self._merge([{"id": "plank", "name": "Front Plank", "primaryMuscles": ["abdominals"]}])
+        self.assertEqual(self._written(), 0)
+
+
+# ── Batch Tests ───────────────────────────────────────────────────────
+
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.conn = create_test_db()
+        self.db_file = tempfile.NamedTemporaryFile(suffix=".sqlite", delete=False)
+        self.db_path = Path(self.db_file.name)
+        self.db_file.close()
+        openwo._backup_done = True
+
+    def _batch(self, ops: list[dict], execute: bool = True, ndjson: bool = False):
+        with tempfile.NamedTemporaryFile(mode="w", suffix=".json", delete=False) as f:
+            if ndjson:
+                f.write("\n".join(json.dumps(op) for op in ops) + "\n")
+            else:
+                json.dump(ops, f)
+        args = argparse.Namespace(file=f.name, execute=execute)
+        openwo.cmd_batch(self.conn, args, self.db_path)
+
+    OPS = [
+        {"op": "swap", "workout": "Day A", "old": "Bench Press", "new": "Cable Rows"},
+        {"op": "add", "workout": "Day A", "exercise": "Bench Press", "position": 1},
+        {"op": "remove", "workout": "Day A", "exercise": "Deadlift"},
+        {"op": "reorder", "workout": "Day A", "move": 5, "to": 2},
+    ]
+
+    def test_applies_operations_in_sequence(self):
+        self._batch(self.OPS)
+        active = get_active_positions(self.conn, 1)
+        self.assertEqual(
+            [name for _, name in active],
+            ["Bench Press", "Plank", "Cable Rows", "Squat", "Pull-ups"],
+        )
+        self.assertEqual([p for p, _ in active], [1, 2, 3, 4, 5])
+
+    def test_ndjson(self):
+        self._batch(self.OPS, ndjson=True)
+        self.assertEqual(len(get_active_positions(self.conn, 1)), 5)
+
+    def test_dry_run_changes_nothing(self):
+        before = get_active_positions(self.conn, 1)
+        self._batch(self.OPS, execute=False)
+        self.assertEqual(get_active_positions(self.conn, 1), before)
+
+    def test_failure_rolls_back_whole_batch(self):
+        before = get_active_positions(self.conn, 1)
+        ops = self.OPS + [{"op": "remove", "workout": "Day A", "exercise": "Deadlift"}]
+        with self.assertRaises(SystemExit):
+            self._batch(ops)
+        self.assertEqual(get_active_positions(self.conn, 1), before)
+
+    def test_unknown_name_fails_before_any_change(self):
+        ops = [self.OPS[0], {"op": "remove", "workout": "Day A", "exercise": "zzzzz"}]
+        with self.assertRaises(SystemExit):
+            self._batch(ops)
+        self.assertEqual(get_active_positions(self.conn, 1)[0], (1, "Bench Press"))
+
+    def test_missing_field_exits(self):
+        with self.assertRaises(SystemExit):
+            self._batch([{"op": "reorder", "workout": "Day A", "move": 1}])
+
+    def test_non_integer_fields_exit_with_operation_number(self):
+        for bad in (
+            {"op": "reorder", "workout": "Day A", "move": "5", "to": 1},
+            {"op": "reorder", "workout": "Day A", "move": 5, "to": True},
+            {"op": "add", "workout": "Day A", "exercise": "Plank", "position": 1.5},
+        ):
+            with mock.patch("sys.stderr", io.StringIO()) as err, self.assertRaises(SystemExit):
+                self._batch([self.OPS[0], bad])
+            self.assertIn(f"Operation 2 ({bad['op']}):", err.getvalue())
+            self.assertIn("must be an integer", err.getvalue())
+        self.assertEqual(get_active_positions(self.conn, 1)[0], (1, "Bench Press"))
+
+
+# ── Backup Tests ──────────────────────────────────────────────────────
+
+
+class TestBackups(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.env = mock.patch.dict("os.environ", {"XDG_DATA_HOME": self.tmp.name})
+        self.env.start()
+        self.db_path = Path(self.tmp.name) / "openwo.sqlite"
+        create_test_db().execute("VACUUM INTO ?", (str(self.db_path),))
+        self.conn = openwo.connect(self.db_path)
+        self.store = openwo.open_backup_store(self.db_path)
+
+    def tearDown(self):
+        self.store.close()
+        self.conn.close()
+        self.env.stop()
+        self.tmp.cleanup()
+
+    def test_unchanged_pages_are_deduplicated(self):
+        first = openwo.take_snapshot(self.db_path, self.store)
+        self.assertEqual(first["newPages"], len(set(openwo._snapshot_hashes(first))))
+        self.conn.execute("UPDATE workout SET name = 'Day C' WHERE id = 2")
+        self.conn.commit()
+        second = openwo.take_snapshot(self.db_path, self.store)
+        self.assertGreater(second["newPages"], 0)
+        self.assertLess(second["newPages"], second["pageCount"])
+
+    def test_restore_brings_back_snapshot(self):
+        snap = openwo.take_snapshot(self.db_path, self.store)
+        self.conn.execute("DELETE FROM workoutExercise WHERE workoutId = 1")
+        self.conn.commit()
+        openwo.restore_snapshot(self.store, snap, self.conn)
+        self.assertEqual(len(get_active_positions(self.conn, 1)), 5)
+
+    def test_prune_keeps_pages_of_remaining_snapshots(self):
+        for name in ["Day C", "Day D", "Day E"]:
+            self.conn.execute("UPDATE workout SET name = ? WHERE id = 2", (name,))
+            self.conn.commit()
+            openwo.take_snapshot(self.db_path, self.store)
+        doomed = openwo.prune_snapshots(self.store, keep=1, max_age_days=None)
+        self.assertEqual(len(doomed), 2)
+
+        (latest,) = self.store.execute("SELECT * FROM snapshot").fetchall()
+        hashes = set(openwo._snapshot_hashes(latest))
+        stored = {r["hash"] for r in self.store.execute("SELECT hash FROM page")}
+        self.assertEqual(stored, hashes)
+
+        self.conn.execute("DELETE FROM workout WHERE id = 2")
+        self.conn.commit()
+        openwo.restore_snapshot(self.store, latest, self.conn)
+        name = self.conn.execute("SELECT name FROM workout WHERE id = 2").fetchone()["name"]
+        self.assertEqual(name, "Day E")
+
+    def test_page_use_tracks_last_snapshot(self):
+        first = openwo.take_snapshot(self.db_path, self.store)
+        self.conn.execute("UPDATE workout SET name = 'Day C' WHERE id = 2")
+        self.conn.commit()
+        second = openwo.take_snapshot(self.db_path, self.store)
+        gone = set(openwo._snapshot_hashes(first)) - set(openwo._snapshot_hashes(second))
+        self.assertTrue(gone)
+        last = dict(self.store.execute("SELECT hash, lastSnapshot FROM pageUse").fetchall())
+        self.assertEqual({h for h, snap in last.items() if snap is None},
+                         set(openwo._snapshot_hashes(second)))
+        self.assertEqual({h for h, snap in last.items() if snap == first["id"]}, gone)
+
+        openwo.prune_snapshots(self.store, keep=1, max_age_days=None, vacuum=False)
+        stored = {r["hash"] for r in self.store.execute("SELECT hash FROM page")}
+        self.assertEqual(stored, set(openwo._snapshot_hashes(second)))
+        self.assertEqual(stored, {r["hash"] for r in self.store.execute("SELECT hash FROM pageUse")})
+
+    def test_old_store_gets_page_use(self):
+        first = openwo.take_snapshot(self.db_path, self.store)
+        self.conn.execute("UPDATE workout SET name = 'Day C' WHERE id = 2")
+        self.conn.commit()
+        second = openwo.take_snapshot(self.db_path, self.store)
+        self.store.execute("DROP TABLE pageUse")
+        self.store.close()
+        self.store = openwo.open_backup_store(self.db_path)
+        last = dict(self.store.execute("SELECT hash, lastSnapshot FROM pageUse").fetchall())
+        gone = set(openwo._snapshot_hashes(first)) - set(openwo._snapshot_hashes(second))
+        self.assertEqual({h for h, snap in last.items() if snap == first["id"]}, gone)
+        self.assertEqual({h for h, snap in last.items() if snap is None},
+                         set(openwo._snapshot_hashes(second)))
+
+    def test_snapshot_of_wal_database(self):
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("UPDATE workout SET name = 'Day C' WHERE id = 2")
+        self.conn.commit()
+        snap = openwo.take_snapshot(self.db_path, self.store)
+        self.conn.execute("UPDATE workout SET name = 'Day D' WHERE id = 2")
+        self.conn.commit()
+        openwo.restore_snapshot(self.store, snap, self.conn)
+        name = self.conn.execute("SELECT name FROM workout WHERE id = 2").fetchone()["name"]
+        self.assertEqual(name, "Day C")
+
+    def _backups(self, keep: str) -> int:
+        with mock.patch.dict("os.environ", {"OPENWO_BACKUP_KEEP": keep}), \
+                mock.patch("sys.stdout", io.StringIO()), mock.patch.object(openwo, "_backup_done"):
+            for name in ["Day C", "Day D", "Day E"]:
+                self.conn.execute("UPDATE workout SET name = ? WHERE id = 2", (name,))
+                self.conn.commit()
+                openwo._backup_done = False
+                openwo.backup_db(self.db_path)
+        return self.store.execute("SELECT COUNT(*) FROM snapshot").fetchone()[0]
+
+    def test_automatic_prune_keeps_configured_count(self):
+        self.assertEqual(self._backups("2"), 2)
+
+    def test_automatic_prune_can_be_turned_off(self):
+        self.assertEqual(self._backups("0"), 3)
+
+    def test_invalid_keep_exits(self):
+        with mock.patch("sys.stderr", io.StringIO()), self.assertRaises(SystemExit):
+            self._backups("-1")
+
+
+# ── Working Copy Tests ────────────────────────────────────────────────
+
+
+class TestWorkingCopy(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.env = mock.patch.dict("os.environ", {"XDG_DATA_HOME": self.tmp.name})
+        self.env.start()
+        self.db_path = Path(self.tmp.name) / "icloud" / "openwo.sqlite"
+        self.db_path.parent.mkdir()
+        create_test_db().execute("VACUUM INTO ?", (str(self.db_path),))
+        openwo._backup_done = True
+        self.out = io.StringIO()
+        self.stdout = mock.patch("sys.stdout", self.out)
+        self.stdout.start()
+
+    def tearDown(self):
+        self.stdout.stop()
+        self.env.stop()
+        self.tmp.cleanup()
+
+    def edit_copy(self):
+        args = argparse.Namespace(command="add")
+        copy, wal = openwo.target_db(args, self.db_path)
+        self.assertTrue(wal)
+        conn = openwo.connect(copy, wal=wal)
+        self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        conn.execute("UPDATE workout SET name = 'Push Day' WHERE id = 1")
+        conn.commit()
+        conn.close()
+        return copy
+
+    def publish(self, force=False):
+        args = argparse.Namespace(force=force, execute=True)
+        conn = openwo.connect(self.db_path, read_only=True)
+        openwo.cmd_publish(conn, args, self.db_path)
+
+    def workout_names(self):
+        conn = sqlite3.connect(self.db_path)
+        names = [r[0] for r in conn.execute("SELECT name FROM workout ORDER BY id")]
+        mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+        conn.close()
+        return names, mode
+
+    def test_checkout_edit_publish(self):
+        openwo.checkout(self.db_path)
+        copy = self.edit_copy()
+        self.assertEqual(self.workout_names()[0], ["Day A", "Day B"])
+        self.publish()
+        self.assertEqual(self.workout_names(), (["Push Day", "Day B"], "delete"))
+        self.assertFalse(copy.exists())
+        self.assertEqual(list(self.db_path.parent.iterdir()), [self.db_path])
+
+    def test_publish_refuses_after_app_writes(self):
+        openwo.checkout(self.db_path)
+        self.edit_copy()
+        app = sqlite3.connect(self.db_path)
+        app.execute("UPDATE workout SET name = 'From the app' WHERE id = 2")
+        app.commit()
+        app.close()
+        with self.assertRaises(SystemExit):
+            self.publish()
+        self.assertEqual(self.workout_names()[0], ["Day A", "From the app"])
+        self.publish(force=True)
+        self.assertEqual(self.workout_names()[0], ["Push Day", "Day B"])
+
+
+# ── Export Tests ──────────────────────────────────────────────────────
+
+
+def add_sessions(conn: sqlite3.Connection) -> None:
+    """Three Day A sessions logging Bench Press and Squat with rising weights."""
+    for i, date in enumerate(["2024-01-01", "2024-01-03", "2024-01-05"]):
+        sid = conn.execute(
+            "INSERT INTO session (sessionType, date, startedAt, durationSeconds) VALUES (?, ?, ?, ?)",
+            ("dayA", date, f"{date}T08:00:00", 1800),
+        ).lastrowid
+        conn.execute(
+            "INSERT INTO exerciseLog (sessionId, workoutExerciseId, weight) VALUES (?, 1, ?)",
+            (sid, 60 + 2.5 * i),
+        )
+        conn.execute(
+            "INSERT INTO exerciseLog (sessionId, workoutExerciseId, weight) VALUES (?, 2, ?)",
+            (sid, 80 + 5 * i),
+        )
+    conn.commit()
+
+
+class TestExport(unittest.TestCase):
+    def setUp(self):
+        self.conn = create_test_db()
+        add_sessions(self.conn)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.env = mock.patch.dict("os.environ", {"XDG_DATA_HOME": self.tmp.name})
+        self.env.start()
+        self.db_path = Path(self.tmp.name) / "openwo.sqlite"
+
+    def tearDown(self):
+        self.env.stop()
+        self.tmp.cleanup()
+
+    def test_pages_cover_every_log_in_order(self):
+        recs = list(openwo.iter_export(self.conn, page_size=4))
+        self.assertEqual([r["logId"] for r in recs], [1, 2, 3, 4, 5, 6])
+        self.assertEqual(recs[1]["exercise"], "Squat")
+        self.assertEqual(recs[1]["date"], "2024-01-01")
+
+    def test_date_and_exercise_filters(self):
+        recs = list(openwo.iter_export(
+            self.conn, date_from="2024-01-02", date_to="2024-01-03", exercise_ids=[1],
+        ))
+        self.assertEqual([(r["date"], r["weight"]) for r in recs], [("2024-01-03", 62.5)])
+
+    def _export(self, fmt: str = "ndjson", since: str | None = None) -> str:
+        out = Path(self.tmp.name) / f"out.{fmt}"
+        args = argparse.Namespace(
+            format=fmt, output=str(out), date_from=None, date_to=None,
+            exercise=None, since=since,
+        )
+        openwo.cmd_export(self.conn, args, self.db_path)
+        return out.read_text()
+
+    def test_since_resumes_from_stored_mark(self):
+        self.assertEqual(len(self._export(since="weekly").splitlines()), 6)
+        self.assertEqual(self._export(since="weekly"), "")
+        self.conn.execute(
+            "INSERT INTO exerciseLog (sessionId, workoutExerciseId, weight) VALUES (3, 3, 100)"
+        )
+        lines = self._export(since="weekly").splitlines()
+        self.assertEqual([json.loads(line)["exercise"] for line in lines], ["Deadlift"])
+
+    def test_csv_and_json_formats(self):
+        rows = list(csv.DictReader(io.StringIO(self._export("csv"))))
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[0]["exercise"], "Bench Press")
+        self.assertEqual(len(json.loads(self._export("json"))), 6)
+
+
+# ── Stats Tests ───────────────────────────────────────────────────────
+
+
+class TestStats(unittest.TestCase):
+    def setUp(self):
+        self.conn = create_test_db()
+        add_sessions(self.conn)
+
+    def test_weight_history_all_exercises_in_one_pass(self):
+        rows = openwo.stats_weight_history(self.conn)
+        self.assertEqual(
+            [(r["exercise"], r["date"], r["weight"]) for r in rows],
+            [
+                ("Bench Press", "2024-01-01", 60.0),
+                ("Bench Press", "2024-01-03", 62.5),
+                ("Bench Press", "2024-01-05", 65.0),
+                ("Squat", "2024-01-01", 80.0),
+                ("Squat", "2024-01-03", 85.0),
+                ("Squat", "2024-01-05", 90.0),
+            ],
+        )
+        self.assertEqual(len(openwo.stats_weight_history(self.conn, exercise_id=2)), 3)
+
+    def test_session_counts_by_iso_week(self):
+        self.conn.execute(
+            "INSERT INTO session (sessionType, date, startedAt, durationSeconds) "
+            "VALUES ('dayB', '2024-01-08', '2024-01-08T08:00:00', 1800), "
+            "       ('dayB', '2024-01-14', '2024-01-14T08:00:00', 1800), "
+            "       ('dayA', '2024-01-09', '2024-01-09T08:00:00', 60)"
+        )
+        self.conn.execute("UPDATE session SET isPartial = 1 WHERE date = '2024-01-09'")
+        weekly = openwo.stats_session_counts(self.conn, "weekly")
+        self.assertEqual(
+            [(b["period"], b["count"], b["dominantType"]) for b in weekly],
+            [("2024-W01", 3, "dayA"), ("2024-W02", 2, "dayB")],
+        )
+        monthly = openwo.stats_session_counts(self.conn, "monthly")
+        self.assertEqual([(b["period"], b["count"]) for b in monthly], [("2024-01", 5)])
+
+    def test_personal_bests(self):
+        self.conn.executemany(
+            "INSERT INTO dailyChallenge (date, setsCompleted) VALUES (?, ?)",
+            [("2024-02-01", 3), ("2024-02-02", 3), ("2024-02-03", 2), ("2024-02-04", 3)],
+        )
+        bests = openwo.stats_personal_bests(self.conn)
+        self.assertEqual(bests["heaviestLift"], {"exercise": "Squat", "weight": 90.0})
+        self.assertEqual(bests["longestSessionStreak"], 1)
+        self.assertEqual(bests["longestChallengeStreak"], 2)
+        self.assertEqual(bests["mostSessionsInWeek"], 3)
+
+    def test_last_weights_carry_across_workouts(self):
+        self.conn.execute(
+            "INSERT INTO workoutExercise (workoutId, exerciseId, position) VALUES (2, 1, 3)"
+        )
+        rows = openwo.stats_last_weights(self.conn, 2)
+        self.assertEqual([(r["exercise"], r["weight"]) for r in rows], [("Bench Press", 65.0)])
+
+    def refresh(self, full=False):
+        self.conn.execute("BEGIN")
+        folded = openwo.refresh_stats(self.conn, full=full)
+        self.conn.commit()
+        return folded
+
+    def all_stats(self):
+        return (
+            openwo.stats_weight_history(self.conn),
+            openwo.stats_weekly_volume(self.conn),
+            openwo.stats_session_counts(self.conn, "weekly"),
+            openwo.stats_session_counts(self.conn, "monthly"),
+            openwo.stats_personal_bests(self.conn),
+            openwo.stats_last_weights(self.conn, 1),
+        )
+
+    def test_summaries_match_live_queries(self):
+        live = self.all_stats()
+        self.assertEqual(self.refresh(), {"session": 3, "exerciseLog": 6})
+        self.assertTrue(openwo.summaries_current(self.conn))
+        self.assertEqual(self.all_stats(), live)
+
+    def test_refresh_folds_only_new_rows(self):
+        self.refresh()
+        sid = self.conn.execute(
+            "INSERT INTO session (sessionType, date, startedAt, durationSeconds) "
+            "VALUES ('dayA', '2024-01-06', '2024-01-06T08:00:00', 1800)"
+        ).lastrowid
+        self.conn.execute(
+            "INSERT INTO exerciseLog (sessionId, workoutExerciseId, weight) VALUES (?, 1, 55)",
+            (sid,),
+        )
+        self.conn.commit()
+        self.assertFalse(openwo.summaries_current(self.conn))
+        live = self.all_stats()
+        self.assertEqual(self.refresh(), {"session": 1, "exerciseLog": 1})
+        self.assertEqual(self.all_stats(), live)
+        rows = openwo.stats_last_weights(self.conn, 1)
+        self.assertEqual([r["weight"] for r in rows], [55.0, 90.0])
+        weeks = openwo.stats_weekly_volume(self.conn, exercise_id=1)
+        self.assertEqual([(w["week"], w["maxWeight"]) for w in weeks], [("2024-W01", 65.0)])
+
+    def test_refresh_rebuilds_when_history_shrinks(self):
+        self.refresh()
+        self.conn.execute("DELETE FROM session WHERE date = '2024-01-05'")
+        self.conn.commit()
+        self.assertEqual(self.refresh(), {"session": 2, "exerciseLog": 4})
+        bests = openwo.stats_personal_bests(self.conn)
+        self.assertEqual(bests["heaviestLift"], {"exercise": "Squat", "weight": 85.0})
+
+
+# ── Streak Tests ──────────────────────────────────────────────────────
+
+
+class TestStreaks(unittest.TestCase):
+    def setUp(self):
+        self.conn = create_test_db()
+        add_sessions(self.conn)
+        self.conn.executemany(
+            "INSERT INTO dailyChallenge (date, setsCompleted) VALUES (?, ?)",
+            [("2024-02-27", 3), ("2024-02-28", 3), ("2024-02-29", 3), ("2024-03-01", 3),
+             ("2024-03-02", 2), ("2024-03-05", 3), ("2024-03-06", 3), ("2024-12-31", 1)],
+        )
+
+    def check_runs(self):
+        days = [1, 2, 3, 7, 9, 10]
+        self.assertEqual(openwo.day_runs(days), ([3, 7, 10], [3, 1, 2]))
+        self.assertEqual(openwo.day_runs([]), ([], []))
+        streaks = openwo.stats_streaks(self.conn, today=date(2024, 3, 7))
+        self.assertEqual(streaks["challenge"], {"current": 2, "longest": 4})
+        self.assertEqual(streaks["gym"], {"current": 0, "longest": 1})
+        late = openwo.stats_streaks(self.conn, today=date(2024, 3, 8))
+        self.assertEqual(late["challenge"]["current"], 0)
+
+    def test_runs_pure_python(self):
+        with mock.patch.object(openwo, "np", None):
+            self.check_runs()
+
+    @unittest.skipIf(openwo.np is None, "numpy not installed")
+    def test_runs_numpy(self):
+        self.check_runs()
+
+    def test_heatmap_grid(self):
+        heatmap = openwo.stats_heatmap(self.conn, 2024)
+        # 2024-01-01 is a Monday; Dec 31 is the Tuesday of week 53
+        self.assertEqual(heatmap["start"], "2024-01-01")
+        self.assertEqual(len(heatmap["weeks"]), 53)
+        self.assertEqual(heatmap["weeks"][-1], [0, 1, None, None, None, None, None])
+        # Week 9 starts Monday 2024-02-26
+        self.assertEqual(heatmap["weeks"][8], [0, 3, 3, 3, 3, 2, 0])
+        padded = openwo.stats_heatmap(self.conn, 2025)
+        self.assertEqual(padded["start"], "2024-12-30")
+        self.assertEqual(padded["weeks"][0], [None, None, 0, 0, 0, 0, 0])
+
+
+# ── Shell Tests ───────────────────────────────────────────────────────
+
+
+class TestShell(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.env = mock.patch.dict("os.environ", {"XDG_DATA_HOME": self.tmp.name})
+        self.env.start()
+        self.db_path = Path(self.tmp.name) / "openwo.sqlite"
+        create_test_db().execute("VACUUM INTO ?", (str(self.db_path),))
+        self.conn = openwo.connect(self.db_path)
+        self.parser = openwo.build_parser()
+
+    def tearDown(self):
+        self.conn.close()
+        self.env.stop()
+        self.tmp.cleanup()
+
+    def run_lines(self, *lines):
+        out = io.StringIO()
+        with mock.patch("sys.stdout", out), mock.patch("sys.stderr", out):
+            results = [openwo.shell_line(self.conn, self.parser, self.db_path, l) for l in lines]
+        return results, out.getvalue()
+
+    def test_errors_do_not_end_the_session(self):
+        results, out = self.run_lines(
+            "show nosuchworkout", "swap --bogus", 'show "unterminated', "show 'Day A'", "exit",
+        )
+        self.assertEqual(results, [True, True, True, True, False])
+        self.assertIn("Bench Press", out)
+
+    def test_mutations_are_backed_up_per_command(self):
+        self.run_lines(
+            "add 'Day A' Plank --execute",
+            "remove 'Day A' Plank --execute",
+        )
+        store = openwo.open_backup_store(self.db_path)
+        self.assertEqual(store.execute("SELECT COUNT(*) FROM snapshot").fetchone()[0], 2)
+        store.close()
+        self.assertFalse(self.conn.in_transaction)
+
+    def test_name_index_reused_until_another_connection_writes(self):
+        self.run_lines("show 'Day A'")
+        index = openwo.name_index(self.conn, "workout")
+        self.run_lines("show 'Day B'")
+        self.assertIs(openwo.name_index(self.conn, "workout"), index)
+        other = sqlite3.connect(self.db_path)
+        other.execute("UPDATE workout SET name = 'Push Day' WHERE id = 1")
+        other.commit()
+        other.close()
+        _, out = self.run_lines("show push")
+        self.assertIn("Push Day", out)
+        self.assertIsNot(openwo.name_index(self.conn, "workout"), index)
+
+
+# ── Profiling Tests ───────────────────────────────────────────────────
+
+
+class TestProfiling(unittest.TestCase):
+    def test_normalize_groups_expanded_sql(self):
+        self.assertEqual(
+            openwo.normalize_sql("SELECT * FROM t\n  WHERE a = 'x''y' AND b IN (1, 2.5, NULL)"),
+            "SELECT * FROM t WHERE a = ? AND b IN (?, ...)",
+        )
+        self.assertEqual(openwo.percentile([5.0, 1.0, 3.0, 2.0, 4.0], 95), 5.0)
+        self.assertEqual(openwo.percentile(list(map(float, range(1, 101))), 95), 95.0)
+
+    def test_phases_and_transactions_from_trace(self):
+        conn = create_test_db()
+        conn.isolation_level = None
+        profiler = openwo.Profiler()
+        profiler.attach(conn)
+        with profiler.phase("command"):
+            conn.execute("SELECT * FROM exercise WHERE id = 1").fetchall()
+            conn.execute("SELECT * FROM exercise WHERE id = 2").fetchall()
+            conn.execute("BEGIN")
+            conn.execute("UPDATE workout SET name = 'X' WHERE id = 1")
+            conn.execute("COMMIT")
+        profiler.finish()
+        self.assertEqual(profiler.calls["transaction"], 1)
+        self.assertEqual(profiler.stack, ["other"])
+        counts = {r["sql"]: r["count"] for r in profiler.statement_summary()}
+        self.assertEqual(counts["SELECT * FROM exercise WHERE id = ?"], 2)
+        self.assertEqual(counts["COMMIT"], 1)
+        self.assertAlmostEqual(sum(profiler.phases.values()), profiler.total, places=6)
+
+    def test_shell_line_writes_json_profile(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            out = Path(tmp) / "profile.json"
+            conn = create_test_db()
+            stdout = sys.stdout
+            with mock.patch("sys.stdout", io.StringIO()):
+                openwo.shell_line(
+                    conn, openwo.build_parser(), Path(tmp) / "db.sqlite",
+                    f"--profile-json {out} show 'Day A'",
+                )
+                self.assertIsInstance(sys.stdout, io.StringIO)
+            self.assertIs(sys.stdout, stdout)
+            report = json.loads(out.read_text())
+            self.assertEqual(report["argv"][-2:], ["show", "Day A"])
+            phases = {p["name"] for p in report["phases"]}
+            self.assertTrue({"resolve", "output", "command"} <= phases)
+            self.assertTrue(any("FROM workout w" in r["sql"] for r in report["statements"]))
+
+
+# ── Fleet Tests ───────────────────────────────────────────────────────
+
+
+class TestFleet(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        self.env = mock.patch.dict("os.environ", {"XDG_DATA_HOME": self.tmp.name})
+        self.env.start()
+        self.fleet = self.root / "fleet"
+        self.fleet.mkdir()
+        for name in ("c", "a", "b"):
+            create_test_db().execute("VACUUM INTO ?", (str(self.fleet / f"{name}.sqlite"),))
+        (self.fleet / "broken.sqlite").write_text("not a database")
+
+    def tearDown(self):
+        self.env.stop()
+        self.tmp.cleanup()
+
+    def fleet_run(self, *argv: str) -> tuple[str, int]:
+        args = openwo.build_parser().parse_args(["--fleet", str(self.fleet), *argv])
+        out, code = io.StringIO(), 0
+        with mock.patch("sys.stdout", out), mock.patch("sys.stderr", io.StringIO()):
+            try:
+                openwo.cmd_fleet(args)
+            except SystemExit as e:
+                code = e.code
+        return out.getvalue(), code
+
+    def test_results_in_path_order_with_failures(self):
+        out, code = self.fleet_run("--workers", "2", "show", "Day B")
+        headers = [line for line in out.splitlines() if line.startswith("== ")]
+        self.assertEqual(
+            [h.split()[1].rsplit("/", 1)[1] for h in headers],
+            ["a.sqlite", "b.sqlite", "broken.sqlite", "c.sqlite"],
+        )
+        self.assertIn("FAILED", headers[2])
+        self.assertEqual(out.count("Dumbbell Rows"), 3)
+        self.assertEqual(code, 1)
+
+    def test_batch_edits_every_database_without_backups(self):
+        ops = self.root / "ops.json"
+        ops.write_text(json.dumps([{"op": "remove", "workout": "Day A", "exercise": "Plank"}]))
+        (self.fleet / "broken.sqlite").unlink()
+        out, code = self.fleet_run(
+            "--workers", "2", "--no-backup", "--fleet-report", "json", "batch", str(ops), "--execute",
+        )
+        self.assertEqual(code, 0)
+        self.assertEqual([r["ok"] for r in json.loads(out)], [True, True, True])
+        for name in ("a", "b", "c"):
+            conn = sqlite3.connect(self.fleet / f"{name}.sqlite")
+            conn.row_factory = sqlite3.Row
+            self.assertEqual(len(get_active_positions(conn, 1)), 4)
+            conn.close()
+        self.assertFalse((self.root / "openwo" / "backups").exists())
+
+    def test_parallel_exports_keep_every_mark(self):
+        (self.fleet / "broken.sqlite").unlink()
+        for i in range(16):
+            conn = create_test_db()
+            add_sessions(conn)
+            conn.execute("VACUUM INTO ?", (str(self.fleet / f"db{i:02}.sqlite"),))
+        paths = sorted(self.fleet.glob("*.sqlite"))
+        out, code = self.fleet_run(
+            "--workers", "8", "export", "--since", "nightly", "--output", str(self.root / "out"),
+        )
+        self.assertEqual(code, 0)
+        logged = [p for p in paths if p.stem.startswith("db")]
+        self.assertEqual(
+            {p.name: openwo.load_export_mark(p, "nightly") for p in logged},
+            dict.fromkeys((p.name for p in logged), 6),
+        )
+
+    def test_rejects_unsupported_commands(self):
+        with mock.patch("sys.stderr", io.StringIO()), self.assertRaises(SystemExit):
+            openwo.cmd_fleet(openwo.build_parser().parse_args(
+                ["--fleet", str(self.fleet), "swap", "Day A", "Plank", "Squat"],
+            ))
+
+
+# ── Doctor Tests ──────────────────────────────────────────────────────
+
+
+class TestDoctor(unittest.TestCase):
+    def setUp(self):
+        self.conn = create_test_db()
+        add_sessions(self.conn)
+        self.conn.commit()
+        openwo._backup_done = True
+
+    def indexes(self) -> set[str]:
+        return {r[0] for r in self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+
+    def test_sandbox_copies_schema_without_rows(self):
+        sandbox = openwo.schema_sandbox(self.conn)
+        self.assertEqual(sandbox.execute("SELECT COUNT(*) FROM exercise").fetchone()[0], 0)
+        statements = openwo.capture_statements(sandbox)
+        self.assertIn(
+            "SELECT MAX(position) AS mp FROM workoutExercise WHERE workoutId = ? AND isActive = ?",
+            statements,
+        )
+        self.assertFalse(any(sql.startswith("BEGIN") for sql in statements))
+
+    def test_recommends_partial_indexes_then_creates_them(self):
+        findings = openwo.diagnose(self.conn)
+        wanted = {name for f in findings for name in f["indexes"]}
+        self.assertEqual(wanted, set(openwo.DOCTOR_INDEXES))
+        lookup = next(f for f in findings if f["sql"].startswith("SELECT * FROM workoutExercise WHERE"))
+        self.assertEqual(lookup["indexes"], ["workoutExercise_activeExercise"])
+
+        out = io.StringIO()
+        with mock.patch("sys.stdout", out):
+            openwo.cmd_doctor(self.conn, argparse.Namespace(execute=False), Path(":memory:"))
+        self.assertIn("Dry run", out.getvalue())
+        self.assertFalse(set(openwo.DOCTOR_INDEXES) & self.indexes())
+
+        with mock.patch("sys.stdout", io.StringIO()):
+            openwo.cmd_doctor(self.conn, argparse.Namespace(execute=True), Path(":memory:"))
+        self.assertTrue(set(openwo.DOCTOR_INDEXES) <= self.indexes())
+        self.assertFalse(any(f["indexes"] for f in openwo.diagnose(self.conn)))
+
+    def test_runs_after_stats_refresh(self):
+        self.conn.execute("BEGIN")
+        openwo.refresh_stats(self.conn)
+        self.conn.commit()
+        findings = openwo.diagnose(self.conn)
+        self.assertTrue(any(f["sql"].startswith("SELECT") for f in findings))
+        with mock.patch("sys.stdout", io.StringIO()):
+            openwo.cmd_doctor(self.conn, argparse.Namespace(execute=False), Path(":memory:"))
+
+
+# ── Compact Tests ─────────────────────────────────────────────────────
+
+
+class TestCompact(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.env = mock.patch.dict("os.environ", {"XDG_DATA_HOME": self.tmp.name})
+        self.env.start()
+        self.db_path = Path(self.tmp.name) / "openwo.sqlite"
+        conn = create_test_db()
+        add_sessions(conn)
+        # Squat (logged) and Deadlift, Plank (never logged) swapped out
+        conn.execute("UPDATE workoutExercise SET isActive = 0, position = -id WHERE id IN (2, 3, 7)")
+        conn.commit()
+        conn.execute("VACUUM INTO ?", (str(self.db_path),))
+        self.conn = openwo.connect(self.db_path)
+        openwo._backup_done = True
+
+    def tearDown(self):
+        self.conn.close()
+        self.env.stop()
+        self.tmp.cleanup()
+
+    def compact(self, execute: bool = True, full_vacuum: bool = False) -> str:
+        out = io.StringIO()
+        args = argparse.Namespace(execute=execute, full_vacuum=full_vacuum)
+        with mock.patch("sys.stdout", out), mock.patch("sys.stderr", io.StringIO()):
+            openwo.cmd_compact(self.conn, args, self.db_path)
+        return out.getvalue()
+
+    def ids(self) -> list[int]:
+        return [r[0] for r in self.conn.execute("SELECT id FROM workoutExercise ORDER BY id")]
+
+    def test_dry_run_reports_and_changes_nothing(self):
+        out = self.compact(execute=False)
+        self.assertIn("2 unreferenced", out)
+        self.assertIn("1 still referenced", out)
+        self.assertIn("Dry run", out)
+        self.assertEqual(self.ids(), [1, 2, 3, 4, 5, 6, 7])
+        self.assertFalse(openwo.archive_path(self.db_path).exists())
+
+    def test_archives_unreferenced_rows_and_vacuums(self):
+        self.compact(full_vacuum=True)
+        self.assertEqual(self.ids(), [1, 2, 4, 5, 6])
+        archive = sqlite3.connect(openwo.archive_path(self.db_path))
+        rows = archive.execute("SELECT id, workoutId, exerciseId, isActive FROM workoutExercise").fetchall()
+        self.assertEqual(rows, [(3, 1, 3, 0), (7, 2, 5, 0)])
+        archive.close()
+        self.assertEqual(self.conn.execute("PRAGMA auto_vacuum").fetchone()[0], 2)
+        self.assertEqual(self.conn.execute("PRAGMA integrity_check").fetchone()[0], "ok")
+
+        # Later runs free pages incrementally
+        self.conn.execute("UPDATE workoutExercise SET isActive = 0, position = -id WHERE id = 4")
+        self.conn.commit()
+        self.compact()
+        self.assertEqual(self.ids(), [1, 2, 5, 6])
+        self.assertEqual(self.conn.execute("PRAGMA freelist_count").fetchone()[0], 0)
+
+
+# ── Spec Tests ────────────────────────────────────────────────────────
+
+
+class TestSpec(unittest.TestCase):
+    def setUp(self):
+        self.conn = create_test_db()
+        add_sessions(self.conn)
+        self.tmp = tempfile.TemporaryDirectory()
+        openwo._backup_done = True
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def dump(self) -> dict:
+        out = io.StringIO()
+        with mock.patch("sys.stdout", out):
+            openwo.cmd_dump_spec(self.conn, argparse.Namespace(workout=["Day A"], output=None))
+        return json.loads(out.getvalue())
+
+    def apply(self, spec: dict, execute: bool = True) -> str:
+        path = Path(self.tmp.name) / "spec.json"
+        path.write_text(json.dumps(spec))
+        out = io.StringIO()
+        with mock.patch("sys.stdout", out):
+            openwo.cmd_apply(self.conn, argparse.Namespace(file=str(path), execute=execute), Path(":memory:"))
+        return out.getvalue()
+
+    def active(self) -> list[tuple[int, str, int]]:
+        return [
+            (r["id"], r["name"], r["sets"]) for r in self.conn.execute(
+                """SELECT we.id, e.name, we.sets FROM workoutExercise we JOIN exercise e ON e.id = we.exerciseId
+                   WHERE we.workoutId = 1 AND we.isActive = 1 ORDER BY we.position"""
+            )
+        ]
+
+    def test_lcs_pairs(self):
+        self.assertEqual(openwo.lcs_pairs([1, 2, 3, 4, 5], [5, 1, 2, 6, 4]), [(0, 1), (1, 2), (3, 4)])
+        self.assertEqual(openwo.lcs_pairs([], [1]), [])
+
+    def test_dump_round_trips_without_changes(self):
+        spec = self.dump()
+        self.assertEqual([w["name"] for w in spec["workouts"]], ["Day A"])
+        self.assertEqual(spec["workouts"][0]["exercises"][0], {
+            "exercise": "Bench Press", "sets": 3, "reps": 10, "rest": 30, "timed": False, "weight": True,
+        })
+        self.assertIn("Already up to date.", self.apply(spec))
+
+    def test_minimal_edits_keep_row_identity(self):
+        spec = {"workouts": [{"name": "Day A", "exercises": [
+            {"exercise": "Plank"}, {"exercise": "Bench Press"}, {"exercise": "Cable Rows"},
+            {"exercise": "Squat", "sets": 5}, {"exercise": "Pull-ups"},
+        ]}]}
+        before = self.active()
+        out = self.apply(spec, execute=False)
+        self.assertIn("↕ 1   Plank (from 5)", out)
+        self.assertIn("- ", out)
+        self.assertEqual(self.active(), before)
+
+        self.apply(spec)
+        after = self.active()
+        self.assertEqual([name for _, name, _ in after], ["Plank", "Bench Press", "Cable Rows", "Squat", "Pull-ups"])
+        # Moved and untouched rows keep their ids; the edited Squat is a new version
+        self.assertEqual([after[0][0], after[1][0], after[4][0]], [5, 1, 4])
+        self.assertNotEqual(after[3][0], 2)
+        self.assertEqual(after[3][2], 5)
+        old_squat = self.conn.execute("SELECT isActive, position FROM workoutExercise WHERE id = 2").fetchone()
+        self.assertEqual(tuple(old_squat), (0, -2))
+        self.assertEqual(
+            self.conn.execute("SELECT COUNT(*) FROM exerciseLog WHERE workoutExerciseId = 2").fetchone()[0], 3,
+        )
+        self.assertIn("Already up to date.", self.apply(spec))
+
+    def test_rejects_workout_listed_twice(self):
+        spec = self.dump()
+        spec["workouts"].append({"name": "day a", "exercises": [{"exercise": "Plank"}]})
+        before = self.active()
+        with mock.patch("sys.stderr", io.StringIO()) as err, self.assertRaises(SystemExit):
+            self.apply(spec)
+        self.assertIn("appears more than once", err.getvalue())
+        self.assertEqual(self.active(), before)
+
+    def test_rejects_mistyped_fields(self):
+        for workout, message in (
+            ({"name": 7, "exercises": []}, '"name" string'),
+            ({"name": "Day A", "exercises": [{"exercise": "Plank", "sets": True}]}, "must be an integer"),
+            ({"name": "Day A", "exercises": [{"exercise": "Plank", "reps": 0}]}, "must be positive"),
+            ({"name": "Day A", "exercises": [{"exercise": "Plank", "sets": -2}]}, "must be positive"),
+            ({"name": "Day A", "exercises": [{"exercise": "Plank", "label": 5}]}, "must be a string"),
+            ({"name": "Day A", "exercises": [{"exercise": "Plank", "timed": "yes"}]}, "true or false"),
+            ({"name": "Day A", "exercises": [{"exercise": "Plank", "weight": 1}]}, "true or false"),
+        ):
+            before = self.active()
+            with mock.patch("sys.stderr", io.StringIO()) as err, self.assertRaises(SystemExit):
+                self.apply({"workouts": [workout]})
+            self.assertIn(message, err.getvalue())
+            self.assertEqual(self.active(), before)
+
+
+# ── Journal Tests ─────────────────────────────────────────────────────
+
+
+class TestJournal(unittest.TestCase):
+    def setUp(self):
+        self.conn = create_test_db()
+        self.tmp = tempfile.TemporaryDirectory()
+        openwo._backup_done = True
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def run_cli(self, *argv: str) -> str:
+        args = openwo.build_parser().parse_args(argv)
+        out = io.StringIO()
+        with mock.patch("sys.stdout", out):
+            openwo.run_command(self.conn, args, Path(self.tmp.name) / "openwo.sqlite")
+        return out.getvalue()
+
+    def rows(self, table: str) -> list[tuple]:
+        return [tuple(r) for r in self.conn.execute(f"SELECT * FROM {table} ORDER BY id")]
+
+    def test_undo_restores_rows_and_is_journaled(self):
+        before = self.rows("workoutExercise")
+        self.run_cli("swap", "Day A", "Squat", "Plank", "--execute")
+        self.run_cli("add", "Day A", "Cable Rows", "--position", "1", "--execute")
+        self.run_cli("reorder", "Day A", "--move", "1", "--to", "4", "--execute")
+
+        dry = self.run_cli("undo", "3")
+        self.assertIn("Dry run", dry)
+        self.assertNotEqual(self.rows("workoutExercise"), before)
+
+        self.run_cli("undo", "3", "--execute")
+        # Rows the swap and add inserted are gone; every other row is back as it was
+        self.assertEqual(self.rows("workoutExercise"), before)
+
+        history = self.run_cli("history")
+        self.assertIn("(undone by 4)", history)
+        self.assertIn("Undo 1: Swap in \"Day A\"", history)
+        self.assertIn("Nothing to undo.", self.run_cli("undo"))
+
+    def test_history_shows_row_changes(self):
+        self.run_cli("remove", "Day A", "Squat", "--execute")
+        detail = self.run_cli("history", "1")
+        self.assertIn("~ workoutExercise 2: position 2 → -2, isActive 1 → 0", detail)
+        self.assertIn("~ workoutExercise 3: position 3 → 2", detail)
+
+    def test_undo_refuses_rows_changed_or_logged_since(self):
+        self.run_cli("add", "Day A", "Cable Rows", "--execute")
+        added = self.conn.execute("SELECT MAX(id) FROM workoutExercise").fetchone()[0]
+        sid = self.conn.execute(
+            "INSERT INTO session (sessionType, date, startedAt, durationSeconds) "
+            "VALUES ('dayA', '2024-02-01', '2024-02-01T08:00:00', 600)"
+        ).lastrowid
+        self.conn.execute(
+            "INSERT INTO exerciseLog (sessionId, workoutExerciseId, weight) VALUES (?, ?, 40)",
+            (sid, added),
+        )
+        self.conn.commit()
+        before = self.rows("workoutExercise")
+        with mock.patch("sys.stderr", io.StringIO()) as err, self.assertRaises(SystemExit):
+            self.run_cli("undo", "--execute")
+        self.assertIn(f"workoutExercise {added} is referenced by exerciseLog", err.getvalue())
+        self.assertEqual(self.rows("workoutExercise"), before)
+        self.assertFalse(self.conn.in_transaction)
+
+    def test_undo_import_across_chunks(self):
+        path = Path(self.tmp.name) / "catalog.ndjson"
+        path.write_text("".join(
+            json.dumps({"id": f"ex{i}", "name": f"Exercise {i}", "equipment": "band"}) + "\n"
+            for i in range(5)
+        ) + json.dumps({"name": "Plank", "tip": "Brace", "equipment": "mat"}) + "\n")
+        before = self.rows("exercise")
+        self.run_cli("import-exercises", str(path), "--merge", "--chunk-size", "2", "--execute")
+        self.assertEqual(self.conn.execute("SELECT COUNT(*) FROM operation").fetchone()[0], 1)
+
+        self.run_cli("undo", "--execute")
+        self.assertEqual(self.rows("exercise"), before)
+        self.assertEqual(
+            self.conn.execute("SELECT COUNT(*) FROM exerciseEquipment WHERE equipment IN ('band', 'mat')").fetchone()[0],
+            0,
+        )
+
 
-# ── Combined Operations ──────────────────────────────────────────────
+# ── Combined Operations ───────────────────────────────────────────────
 
 
 class TestCombinedOperations(unittest.TestCase):